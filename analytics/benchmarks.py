@@ -0,0 +1,584 @@
+#!/usr/bin/env python3
+"""
+Benchmarks do módulo de Analytics - Pirata Pizzaria
+
+Cada medição roda em um subprocesso próprio, para que o pico de memória (RSS)
+de uma variante não contamine a outra.
+
+Uso:
+    python benchmarks.py sales-reader               # Leitura completa vs em blocos (dev.db)
+    python benchmarks.py sales-reader --years 3     # Base sintética com 3 anos de pedidos
+    python benchmarks.py concurrency --readers 4    # Latência dos leitores com o pipeline gravando
+    python benchmarks.py horizon                    # Previsão em lote vs dia a dia por horizonte
+    python benchmarks.py backends                   # Estimadores do modelo no dev.db (erro de teste e CV)
+    python benchmarks.py backends --years 3         # Idem em histórico sintético
+    python benchmarks.py incremental --years 3      # Treino incremental vs completo com N dias novos
+    python benchmarks.py lags --years 4             # Motor de lags vs pandas (falha se o motor perder)
+"""
+import argparse
+import io
+import json
+import os
+import pickle
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+
+from config import SQLITE_PATH
+
+
+# DDL de sales_orders igual à gerada pelo Prisma para o SQLite
+SALES_ORDERS_DDL = """
+CREATE TABLE IF NOT EXISTS "sales_orders" (
+    "id" TEXT NOT NULL PRIMARY KEY,
+    "externalId" TEXT NOT NULL,
+    "origin" TEXT NOT NULL,
+    "orderType" TEXT NOT NULL,
+    "itemsCount" INTEGER NOT NULL DEFAULT 0,
+    "amount" DECIMAL NOT NULL,
+    "status" TEXT NOT NULL,
+    "paymentStatus" TEXT NOT NULL DEFAULT 'PAID',
+    "openedAt" DATETIME NOT NULL,
+    "closedAt" DATETIME,
+    "duration" INTEGER,
+    "unit" TEXT NOT NULL DEFAULT 'PIRATA PIZZARIA',
+    "paymentMethod" TEXT,
+    "tableNumber" INTEGER,
+    "isDelivery" BOOLEAN NOT NULL DEFAULT false,
+    "isCounter" BOOLEAN NOT NULL DEFAULT false,
+    "syncedAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "deletedAt" DATETIME,
+    "createdAt" DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" DATETIME NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS "sales_orders_externalId_key" ON "sales_orders"("externalId");
+CREATE INDEX IF NOT EXISTS "sales_orders_openedAt_idx" ON "sales_orders"("openedAt");
+CREATE INDEX IF NOT EXISTS "sales_orders_status_idx" ON "sales_orders"("status");
+CREATE INDEX IF NOT EXISTS "sales_orders_orderType_idx" ON "sales_orders"("orderType");
+CREATE INDEX IF NOT EXISTS "sales_orders_paymentStatus_idx" ON "sales_orders"("paymentStatus");
+"""
+
+
+def create_synthetic_database(path: Path, years: int = 3, orders_per_day: int = 70, seed: int = 42) -> int:
+    """
+    Cria um SQLite com pedidos sintéticos no mesmo formato do Prisma (epoch ms)
+
+    Returns:
+        Número de pedidos gerados
+    """
+    rng = np.random.default_rng(seed)
+    days = 365 * years
+    start_ms = int(time.time() * 1000) - days * 86_400_000
+
+    conn = sqlite3.connect(str(path))
+    conn.executescript(SALES_ORDERS_DDL)
+
+    order_types = ['Balcão', 'Delivery'] + [f'Mesas/Comandas {i}' for i in range(1, 31)]
+    total = 0
+
+    for day in range(days):
+        count = max(1, int(rng.poisson(orders_per_day)))
+        # Pedidos concentrados no almoço (12h) e no jantar (20h)
+        hours = np.where(rng.random(count) < 0.3, rng.normal(12.5, 1.0, count), rng.normal(20.5, 1.5, count))
+        opened = start_ms + day * 86_400_000 + (np.clip(hours, 10, 23.9) * 3_600_000).astype('int64')
+        types = rng.choice(order_types, count)
+        amounts = np.round(rng.gamma(4.0, 30.0, count), 2)
+        durations = rng.integers(600, 5400, count)
+
+        rows = [
+            (
+                f"syn_{total + i}", f"syn_{total + i}", 'PDV', types[i], int(rng.integers(1, 8)),
+                float(amounts[i]), 'Finalizado Pago', 'PAID', int(opened[i]), None, int(durations[i]),
+                'PIRATA PIZZARIA', None, None, types[i] == 'Delivery', types[i] == 'Balcão',
+                int(opened[i]), None, int(opened[i]), int(opened[i]),
+            )
+            for i in range(count)
+        ]
+        conn.executemany(
+            "INSERT INTO sales_orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        total += count
+
+    conn.commit()
+    conn.close()
+    return total
+
+
+def _copy_database(source: Path, target: Path) -> None:
+    """Copia um SQLite de forma consistente (inclui o que ainda está no WAL)"""
+    src, dst = sqlite3.connect(str(source)), sqlite3.connect(str(target))
+    src.backup(dst)
+    dst.execute("PRAGMA journal_mode = DELETE")
+    src.close()
+    dst.close()
+
+
+def _peak_rss_mb() -> float:
+    """Pico de memória residente do processo atual (MB)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _order_level_analysis_full() -> dict:
+    """Duração, mix de canais e curva horária com todos os pedidos em memória"""
+    from database import get_sales_data
+
+    df = get_sales_data()
+    hourly = df.groupby(df['openedAt'].dt.hour).size()
+    mix = df.groupby('orderType', observed=True).size()
+    return {
+        'orders': len(df),
+        'avg_duration': float(df['duration'].mean()),
+        'peak_hour': int(hourly.idxmax()),
+        'channels': int((mix > 0).sum()),
+    }
+
+
+def _order_level_analysis_chunked(chunksize: int) -> dict:
+    """Mesma análise acumulando bloco a bloco"""
+    from database import iter_sales_orders
+
+    orders, duration_sum, duration_count = 0, 0, 0
+    hourly = np.zeros(24, dtype='int64')
+    mix = None
+
+    for chunk in iter_sales_orders(columns=['openedAt', 'duration', 'orderType'], chunksize=chunksize):
+        orders += len(chunk)
+        duration_sum += int(chunk['duration'].sum())
+        duration_count += int(chunk['duration'].count())
+        hourly += np.bincount(chunk['openedAt'].dt.hour.to_numpy(), minlength=24)
+        counts = chunk['orderType'].value_counts(sort=False)
+        mix = counts if mix is None else mix + counts
+
+    return {
+        'orders': orders,
+        'avg_duration': duration_sum / duration_count if duration_count else 0.0,
+        'peak_hour': int(hourly.argmax()),
+        'channels': int((mix > 0).sum()) if mix is not None else 0,
+    }
+
+
+def _api_reader(seconds: float) -> dict:
+    """
+    Simula as rotas do Next.js (/api/sales): conexão comum de leitura/escrita,
+    como a do Prisma, consultando os pedidos dos últimos 30 dias em loop
+    """
+    from config import SQLITE_PATH
+
+    conn = sqlite3.connect(str(SQLITE_PATH), timeout=5)
+    latest = conn.execute("SELECT MAX(openedAt) FROM sales_orders WHERE typeof(openedAt) = 'integer'").fetchone()[0]
+    since = (latest or 0) - 30 * 86_400_000
+
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            conn.execute(
+                "SELECT * FROM sales_orders WHERE deletedAt IS NULL AND openedAt >= ? "
+                "ORDER BY openedAt DESC LIMIT 200", (since,)
+            ).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+        except sqlite3.OperationalError:
+            errors += 1
+        time.sleep(0.005)
+
+    conn.close()
+    return {'latencies_ms': latencies, 'errors': errors}
+
+
+def _pipeline_writer(seconds: float) -> dict:
+    """Repete as gravações do pipeline (sales_metrics + daily_features) até o prazo"""
+    from database import get_daily_sales_summary, save_daily_features
+    from sales_metrics import refresh_sales_metrics
+
+    rounds, rows = 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        refresh_sales_metrics(full=True)
+        rows += save_daily_features(get_daily_sales_summary())
+        rounds += 1
+
+    return {'rounds': rounds, 'rows': rows}
+
+
+def _worker(task: str, options: dict) -> None:
+    """Executa uma variante no subprocesso e imprime o resultado em JSON"""
+    import pandas  # noqa: F401  (importado antes para separar o custo da biblioteca)
+
+    baseline = _peak_rss_mb()
+    start = time.perf_counter()
+
+    if task == 'sales-full':
+        result = _order_level_analysis_full()
+    elif task == 'sales-chunked':
+        result = _order_level_analysis_chunked(options.get('chunksize', 50_000))
+    elif task == 'api-reader':
+        result = _api_reader(options['seconds'])
+    elif task == 'pipeline-writer':
+        result = _pipeline_writer(options['seconds'])
+    else:
+        raise ValueError(f"Tarefa desconhecida: {task}")
+
+    result.update({
+        'seconds': time.perf_counter() - start,
+        'baseline_rss_mb': baseline,
+        'peak_rss_mb': _peak_rss_mb(),
+    })
+    print(json.dumps(result))
+
+
+def _start_isolated(task: str, db_path: Path, mode: str = 'concurrent', **options) -> subprocess.Popen:
+    """Inicia uma tarefa em um subprocesso apontado para o banco informado"""
+    env = dict(os.environ, ANALYTICS_SQLITE_PATH=str(db_path), ANALYTICS_SQLITE_MODE=mode, DATABASE_URL='')
+    return subprocess.Popen(
+        [sys.executable, __file__, '_worker', task, json.dumps(options)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+        cwd=Path(__file__).parent,
+    )
+
+
+def _collect(proc: subprocess.Popen) -> dict:
+    """Espera o subprocesso e lê o resultado (última linha em JSON)"""
+    stdout, stderr = proc.communicate()
+    if proc.returncode != 0:
+        raise RuntimeError(f"Tarefa falhou:\n{stderr}")
+    return json.loads(stdout.strip().splitlines()[-1])
+
+
+def _run_isolated(task: str, db_path: Path, **options) -> dict:
+    """Roda uma tarefa em um subprocesso e espera o resultado"""
+    return _collect(_start_isolated(task, db_path, **options))
+
+
+def bench_sales_reader(db_path: Path, chunksize: int) -> None:
+    """Compara a leitura completa com a leitura em blocos tipados"""
+    print(f"📊 Banco: {db_path}")
+
+    results = {
+        'completa': _run_isolated('sales-full', db_path),
+        f'blocos ({chunksize:,})': _run_isolated('sales-chunked', db_path, chunksize=chunksize),
+    }
+
+    print(f"\n{'Modo':<22} {'Pedidos':>10} {'Tempo (s)':>10} {'RSS base':>10} {'RSS pico':>10} {'Δ RSS':>8}")
+    print("-" * 76)
+    for name, r in results.items():
+        delta = r['peak_rss_mb'] - r['baseline_rss_mb']
+        print(f"{name:<22} {r['orders']:>10,} {r['seconds']:>10.2f} "
+              f"{r['baseline_rss_mb']:>9.0f}M {r['peak_rss_mb']:>9.0f}M {delta:>7.0f}M")
+
+
+def bench_concurrency(db_path: Path, readers: int, seconds: float) -> None:
+    """
+    Latência dos leitores do app (p50/p99) enquanto o pipeline grava no mesmo arquivo
+
+    Compara o modo 'simple' (journal padrão) com o 'concurrent' (WAL, leituras
+    somente leitura e gravações em lotes curtos), cada um em uma cópia do banco.
+    """
+    print(f"📊 Banco: {db_path} | {readers} leitor(es) | {seconds:.0f}s por modo")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('simple', 'concurrent'):
+            copy = Path(tmp) / f"{mode}.db"
+            _copy_database(db_path, copy)
+
+            procs = [_start_isolated('api-reader', copy, mode, seconds=seconds) for _ in range(readers)]
+            writer = _start_isolated('pipeline-writer', copy, mode, seconds=seconds)
+
+            reads = [_collect(p) for p in procs]
+            latencies = np.concatenate([r['latencies_ms'] for r in reads]) if reads else np.array([])
+            results[mode] = {
+                'reads': len(latencies),
+                'errors': sum(r['errors'] for r in reads),
+                'p50': float(np.percentile(latencies, 50)) if len(latencies) else float('nan'),
+                'p99': float(np.percentile(latencies, 99)) if len(latencies) else float('nan'),
+                'max': float(latencies.max()) if len(latencies) else float('nan'),
+                'writer': _collect(writer),
+            }
+
+    print(f"\n{'Modo':<12} {'Leituras':>9} {'Erros':>6} {'p50 (ms)':>9} {'p99 (ms)':>9} {'máx (ms)':>9} {'Rodadas':>8}")
+    print("-" * 68)
+    for mode, r in results.items():
+        print(f"{mode:<12} {r['reads']:>9,} {r['errors']:>6} {r['p50']:>9.1f} {r['p99']:>9.1f} "
+              f"{r['max']:>9.1f} {r['writer']['rounds']:>8}")
+
+
+def bench_horizon(horizons: list, repeats: int) -> None:
+    """
+    Latência da previsão por tamanho do horizonte (mediana de `repeats` execuções)
+
+    Em lote: features de todos os dias + uma chamada ao modelo. Dia a dia: uma
+    chamada por dia, o mínimo que uma previsão recursiva custaria.
+    """
+    from data_context import DataContext
+    from demand_forecaster import DemandForecaster, generate_future_features
+    from feature_engineering import create_feature_dataset
+
+    ctx = DataContext()
+    forecaster = DemandForecaster(horizon=max(horizons))
+    with redirect_stdout(io.StringIO()):
+        df = create_feature_dataset(ctx=ctx, columns=forecaster.required_columns())
+        forecaster.train(df)
+    print(f"📊 Modelo treinado com horizonte de {forecaster.horizon} dias ({len(df)} dias de histórico)")
+
+    def median_ms(run) -> float:
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            times.append((time.perf_counter() - start) * 1000)
+        return float(np.median(times))
+
+    print(f"\n{'Horizonte':>9} {'Features (ms)':>14} {'Lote (ms)':>10} {'Dia a dia (ms)':>15} {'Ganho':>7}")
+    print("-" * 60)
+    for days in horizons:
+        features = generate_future_features(df, days, ctx)
+        rows = [features.iloc[[i]] for i in range(days)]
+
+        build = median_ms(lambda: generate_future_features(df, days, ctx))
+        batched = median_ms(lambda: forecaster.predict(features))
+        per_day = median_ms(lambda: [forecaster.predict(row) for row in rows])
+        print(f"{days:>9} {build:>14.2f} {batched:>10.2f} {per_day:>15.2f} {per_day / batched:>6.1f}x")
+
+
+def synthetic_feature_dataset(years: int, orders_per_day: int = 70, seed: int = 42):
+    """
+    Dataset de features de um histórico diário sintético (sazonalidade semanal e anual + clima)
+
+    Returns:
+        Tupla (dataset, forecaster sem treino que define as colunas)
+    """
+    import pandas as pd
+    from data_context import DataContext
+    from demand_forecaster import DemandForecaster
+    from feature_engineering import compute_features
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=pd.Timestamp.today().normalize(), periods=365 * years, freq='D')
+    season = np.cos(2 * np.pi * (dates.dayofyear.to_numpy() - 15) / 365)
+
+    temp = 24 + 5 * season + rng.normal(0, 2, len(dates))
+    precipitation = rng.gamma(0.6, 6, len(dates))
+    level = orders_per_day * (1 + 0.8 * (dates.dayofweek.to_numpy() >= 4)) * (1 + 0.3 * season)
+    orders = rng.poisson(level * (1 - 0.2 * (precipitation > 5))).astype('float64')
+    revenue = orders * rng.normal(110, 10, len(dates))
+
+    sales = pd.DataFrame({
+        'date': dates, 'orders': orders, 'revenue': revenue,
+        'avg_ticket': revenue / np.maximum(orders, 1),
+    })
+
+    # Clima sintético no lugar da tabela weather_data; feriados continuam vindo do banco
+    ctx = DataContext()
+    ctx.provide('weather', pd.DataFrame({
+        'date': dates, 'tempMin': temp - 4, 'tempMax': temp + 4, 'tempAvg': temp,
+        'precipitation': precipitation, 'condition': None,
+    }))
+
+    forecaster = DemandForecaster()
+    with redirect_stdout(io.StringIO()):
+        df = compute_features(sales, forecaster.required_columns(), ctx)
+    return df, forecaster
+
+
+def bench_backends(years: int, orders_per_day: int) -> None:
+    """
+    Tempo de treino e erro de cada estimador, com 1 thread e com todos os núcleos
+
+    Erro de pedidos no teste do treino (MAE, R²) e na validação cruzada (MAE de
+    todos os folds), no dev.db (years = 0) ou em histórico sintético.
+    """
+    from threadpoolctl import threadpool_limits
+    from cross_validation import cross_validate
+    from demand_forecaster import ESTIMATOR_BACKENDS, DemandForecaster
+    from feature_engineering import create_feature_dataset
+
+    cores = os.cpu_count() or 1
+    if years:
+        df, _ = synthetic_feature_dataset(years, orders_per_day)
+        print(f"📊 {len(df):,} dias sintéticos | {cores} núcleo(s)")
+    else:
+        with redirect_stdout(io.StringIO()):
+            df = create_feature_dataset(columns=DemandForecaster().required_columns())
+        print(f"📊 {len(df):,} dias do dev.db | {cores} núcleo(s)")
+
+    print(f"\n{'Backend':<10} {'Threads':>8} {'Treino (s)':>11} {'Pedidos (s)':>12} {'Receita (s)':>12} "
+          f"{'MAE pedidos':>12} {'R²':>7} {'MAE CV':>8}")
+    print("-" * 88)
+    errors = {}
+    for backend in ESTIMATOR_BACKENDS:
+        with redirect_stdout(io.StringIO()):
+            cv_mae = cross_validate(df, backend=backend)['summary']['orders']['pooled_mae']
+        for threads in sorted({1, cores}):
+            forecaster = DemandForecaster(backend=backend)
+            with threadpool_limits(threads), redirect_stdout(io.StringIO()):
+                metrics = forecaster.train(df)
+            fit = forecaster.fit_seconds
+            print(f"{backend:<10} {threads:>8} {fit['total']:>11.2f} {fit['orders']:>12.2f} "
+                  f"{fit['revenue']:>12.2f} {metrics['orders']['mae']:>12.2f} {metrics['orders']['r2']:>7.3f} "
+                  f"{cv_mae:>8.2f}")
+        errors[backend] = (metrics['orders']['mae'], cv_mae)
+
+    (hist_test, hist_cv), (classic_test, classic_cv) = errors['hist'], errors['classic']
+    status = "✅" if hist_test <= classic_test and hist_cv <= classic_cv else "⚠️ "
+    print(f"\n{status} hist vs classic: MAE teste {hist_test:.2f} vs {classic_test:.2f} | "
+          f"MAE CV {hist_cv:.2f} vs {classic_cv:.2f}")
+
+
+def bench_incremental(years: int, orders_per_day: int, new_days: list) -> None:
+    """
+    Treino completo vs incremental (árvores novas) com N dias novos
+
+    O modelo base treina até `max(new_days) + 14` dias antes do fim; cada variante
+    recebe os dias novos e é avaliada nos 14 dias finais, que nenhuma viu.
+    """
+    import pandas as pd
+    from demand_forecaster import DemandForecaster
+    from retraining import retrain
+
+    full, _ = synthetic_feature_dataset(years, orders_per_day)
+    holdout_start = full['date'].max() - pd.Timedelta(days=13)
+    base_end = holdout_start - pd.Timedelta(days=max(new_days) + 1)
+    print(f"📊 {len(full):,} dias sintéticos | teste: {holdout_start.date()} em diante")
+
+    def holdout_mae(forecaster) -> float:
+        stacked, X = forecaster.prepare_data(full)
+        test = (stacked['date'] >= holdout_start).to_numpy()
+        pred = forecaster.model_orders.predict(forecaster.scaler.transform(X[test]))
+        return float(np.abs(stacked['orders'].to_numpy()[test] - pred).mean())
+
+    base = DemandForecaster()
+    with redirect_stdout(io.StringIO()):
+        base.train(full[full['date'] <= base_end])
+    snapshot = pickle.dumps(base)
+    print(f"\n{'Dias novos':>10} {'Modo':<12} {'Tempo (s)':>10} {'MAE teste':>10}")
+    print("-" * 46)
+    print(f"{0:>10} {'base':<12} {base.fit_seconds['total']:>10.2f} {holdout_mae(base):>10.2f}")
+
+    for days in new_days:
+        df = full[full['date'] <= base_end + pd.Timedelta(days=days)]
+
+        # Mesmo caminho do pipeline (--refit incremental), a partir do modelo base
+        with redirect_stdout(io.StringIO()):
+            incremental, result = retrain(df, mode='incremental', base=pickle.loads(snapshot))
+        assert result['mode'] == 'incremental', f"{days} dia(s) novo(s): {result['reason']}"
+        refit = DemandForecaster()
+        with redirect_stdout(io.StringIO()):
+            refit.train(df)
+
+        for mode, forecaster in (('incremental', incremental), ('completo', refit)):
+            print(f"{days:>10} {mode:<12} {forecaster.fit_seconds['total']:>10.2f} {holdout_mae(forecaster):>10.2f}")
+
+
+def bench_lags(years: int, repeats: int) -> None:
+    """
+    Motor de lags (compute_lags) vs pandas coluna a coluna, com as especificações do modelo
+
+    Mede o melhor de `repeats` execuções em dois casos: as séries do modelo diário
+    e 8 séries empilhadas em 4 grupos (como os canais do modelo hierárquico).
+    Falha (AssertionError) se o motor for mais lento que o pandas em algum caso.
+    """
+    import pandas as pd
+    from feature_engineering import OPERATIONS_LAGS, ORDER_LAGS, REVENUE_LAGS
+    from lag_engine import LagSpec, _pandas_lags, compute_lags
+
+    rng = np.random.default_rng(7)
+    days = 365 * years
+    model_specs = ORDER_LAGS + REVENUE_LAGS + OPERATIONS_LAGS
+    stacked_specs = [
+        LagSpec(f"s{i}", lags=[1, 7, 14, 28], windows=[7, 14, 28], stats=['mean', 'std', 'min', 'max'], spans=[7])
+        for i in range(8)
+    ]
+
+    cases = []
+    model = pd.DataFrame({spec.series: rng.gamma(5, 20, days) for spec in model_specs})
+    cases.append(("séries do modelo", model, model_specs, None))
+    stacked = pd.DataFrame({spec.series: rng.gamma(5, 20, days * 4) for spec in stacked_specs})
+    stacked['group'] = np.repeat(np.arange(4), days)
+    cases.append(("8 séries × 4 grupos", stacked, stacked_specs, 'group'))
+
+    def best(run) -> float:
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+        return min(times) * 1000
+
+    print(f"📊 {days:,} dias ({years} ano(s)) | melhor de {repeats}")
+    print(f"\n{'Caso':<22} {'Colunas':>8} {'Motor (ms)':>11} {'pandas (ms)':>12}")
+    print("-" * 56)
+    slower = []
+    for label, df, specs, group in cases:
+        data = {spec.series: df[spec.series].to_numpy() for spec in specs}
+        groups = df[group].to_numpy() if group else None
+        engine = best(lambda: compute_lags(data, specs, groups))
+        reference = best(lambda: _pandas_lags(df, specs, group))
+        columns = sum(len(spec.columns()) for spec in specs)
+        print(f"{label:<22} {columns:>8} {engine:>11.2f} {reference:>12.2f}")
+        if engine > reference:
+            slower.append(f"{label}: {engine:.2f} ms vs {reference:.2f} ms")
+
+    assert not slower, f"Motor de lags mais lento que o pandas ({'; '.join(slower)})"
+    print("\n   ✅ Motor mais rápido que o pandas em todos os casos")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '_worker':
+        _worker(sys.argv[2], json.loads(sys.argv[3]))
+        return
+
+    parser = argparse.ArgumentParser(description='Benchmarks de Analytics - Pirata Pizzaria')
+    parser.add_argument('benchmark', choices=['sales-reader', 'concurrency', 'horizon', 'backends', 'incremental', 'lags'])
+    parser.add_argument('--years', type=int, default=0, help='Gera base sintética com N anos (0 = dev.db)')
+    parser.add_argument('--orders-per-day', type=int, default=70)
+    parser.add_argument('--chunksize', type=int, default=50_000)
+    parser.add_argument('--readers', type=int, default=4, help='Leitores simultâneos (concurrency)')
+    parser.add_argument('--seconds', type=float, default=10, help='Duração de cada modo (concurrency)')
+    parser.add_argument('--horizons', type=int, nargs='+', default=[1, 7, 14, 28], help='Horizontes (horizon)')
+    parser.add_argument('--repeats', type=int, default=20, help='Repetições por medição (horizon, lags)')
+    parser.add_argument('--new-days', type=int, nargs='+', default=[1, 3, 7], help='Dias novos (incremental)')
+    args = parser.parse_args()
+
+    if args.benchmark == 'horizon':
+        bench_horizon(args.horizons, args.repeats)
+        return
+    if args.benchmark == 'backends':
+        bench_backends(args.years, args.orders_per_day)
+        return
+    if args.benchmark == 'incremental':
+        bench_incremental(args.years or 3, args.orders_per_day, args.new_days)
+        return
+    if args.benchmark == 'lags':
+        bench_lags(args.years or 4, args.repeats)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = SQLITE_PATH
+        if args.years:
+            db_path = Path(tmp) / 'synthetic.db'
+            if args.benchmark == 'concurrency':
+                # O pipeline precisa das demais tabelas do schema: parte de uma cópia do dev.db
+                _copy_database(SQLITE_PATH, db_path)
+            print(f"🔧 Gerando {args.years} ano(s) de pedidos sintéticos...")
+            total = create_synthetic_database(db_path, args.years, args.orders_per_day)
+            print(f"   ✅ {total:,} pedidos")
+
+        if args.benchmark == 'sales-reader':
+            bench_sales_reader(db_path, args.chunksize)
+        elif args.benchmark == 'concurrency':
+            bench_concurrency(db_path, args.readers, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 Configurações do módulo de Analytics
 """
 import os
+from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 
@@ -19,7 +20,16 @@ STATE = "SP"
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
 # Se for SQLite local (desenvolvimento)
-SQLITE_PATH = Path(__file__).parent.parent / "prisma" / "dev.db"
+SQLITE_PATH = Path(os.getenv("ANALYTICS_SQLITE_PATH", Path(__file__).parent.parent / "prisma" / "dev.db"))
+
+# Acesso ao SQLite: "concurrent" (WAL, leituras somente leitura e gravações em
+# transações curtas, sem travar o app Next.js) ou "simple" (journal padrão,
+# para pastas em rede onde o WAL não funciona)
+SQLITE_ACCESS_MODE = os.getenv("ANALYTICS_SQLITE_MODE", "concurrent")
+
+# Fuso da pizzaria para definir o "dia" e a hora de um pedido (SQLite e MySQL
+# guardam DateTime em UTC; Bertioga não tem horário de verão desde 2019)
+DB_TIMEZONE_OFFSET = os.getenv("ANALYTICS_TZ_OFFSET", "-03:00")
 
 # APIs
 OPEN_METEO_BASE_URL = "https://archive-api.open-meteo.com/v1/archive"
@@ -34,7 +44,25 @@ DATA_DIR = ANALYTICS_DIR / "data"
 MODELS_DIR.mkdir(exist_ok=True)
 DATA_DIR.mkdir(exist_ok=True)
 
+# Dimensão de datas (calendário + feriados): anos pré-calculados
+DATE_DIMENSION_START_YEAR = int(os.getenv("ANALYTICS_DATE_DIM_START", "2024"))
+DATE_DIMENSION_END_YEAR = int(os.getenv("ANALYTICS_DATE_DIM_END", str(datetime.now().year + 2)))
+
+# Turnos (mesmos nomes do ShiftConfig/TimeEntry): horas locais [início, fim),
+# o jantar atravessa a meia-noite
+SHIFT_HOURS = {
+    'lunch': (10, 17),
+    'dinner': (17, 4),
+}
+
 # Configurações do modelo
-MODEL_VERSION = "v1.0.0"
+MODEL_VERSION = "v1.1.0"
 FORECAST_DAYS = 14  # Dias para prever
 
+# Estimador do DemandForecaster: "hist" (histogramas, multi-thread) ou "classic"
+MODEL_BACKEND = os.getenv("ANALYTICS_MODEL_BACKEND", "hist")
+
+
+# Serviço de previsão (forecast_service.py): só a máquina local por padrão
+SERVICE_HOST = os.getenv("ANALYTICS_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("ANALYTICS_SERVICE_PORT", "8765"))
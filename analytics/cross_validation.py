@@ -0,0 +1,292 @@
+"""
+Validação cruzada temporal (janela expansiva) do DemandForecaster
+
+Os dias previstos são divididos com TimeSeriesSplit: cada fold usa todos os
+dias anteriores ao seu bloco de teste, como em produção: o modelo treina com
+os primeiros e os últimos CALIBRATION_SIZE deles calibram os intervalos de
+previsão, cuja cobertura é medida no teste. As
+matrizes de cada fold (já normalizadas) ficam em data/cv_folds/ em .npy,
+identificadas pelo snapshot de features e pelos parâmetros do corte; os
+folds rodam em paralelo em processos (joblib), que leem as matrizes via
+memory-map em vez de recebê-las por pickle. Uma nova execução com o mesmo
+dataset reaproveita as matrizes.
+"""
+import hashlib
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.preprocessing import StandardScaler
+
+from config import DATA_DIR, MODEL_BACKEND, MODEL_VERSION, MODELS_DIR
+from demand_forecaster import (
+    ESTIMATOR_BACKENDS, INTERVAL_LEVEL, DemandForecaster, apply_intervals, calibrate_intervals, regression_metrics
+)
+from feature_store import dataset_fingerprint
+
+
+CV_DIR = DATA_DIR / "cv_folds"
+
+# Conjuntos de folds mantidos no disco (os mais antigos são removidos)
+CV_KEEP = 5
+
+TARGETS = ('orders', 'revenue')
+
+# Parte final dos dias de treino de cada fold usada na calibração dos intervalos (como o teste de train())
+CALIBRATION_SIZE = 0.2
+
+# Métricas agregadas no relatório (cobertura em %, largura média do intervalo)
+REPORTED_METRICS = ('mae', 'rmse', 'mape', 'coverage', 'width')
+
+
+def _dataset_id(df: pd.DataFrame) -> str:
+    """Snapshot do feature_store (se houver) ou hash do conteúdo do dataset"""
+    snapshot = df.attrs.get('feature_snapshot')
+    if snapshot:
+        return snapshot
+    return dataset_fingerprint(df)
+
+
+def fold_cache_key(df: pd.DataFrame, forecaster: DemandForecaster, n_splits: int) -> str:
+    """Id das matrizes dos folds: dataset + colunas do modelo + horizonte + número de folds"""
+    payload = {
+        'layout': 'calibration',
+        'dataset': _dataset_id(df),
+        'columns': forecaster.input_columns(),
+        'horizon': forecaster.horizon,
+        'n_splits': n_splits,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def expanding_splits(dates: np.ndarray, n_splits: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Índices de treino e teste de cada fold (janela expansiva sobre os dias previstos)
+
+    Todas as linhas de um mesmo dia ficam do mesmo lado; o treino tem todos os
+    dias anteriores ao bloco de teste.
+
+    Args:
+        dates: Dia previsto de cada linha (pares origem × horizonte)
+        n_splits: Número de folds
+    """
+    days, day_of_row = np.unique(dates, return_inverse=True)
+    if len(days) <= n_splits:
+        raise ValueError(f"Poucos dias ({len(days)}) para {n_splits} folds")
+
+    splits = []
+    for train_days, test_days in TimeSeriesSplit(n_splits=n_splits).split(days):
+        train = np.flatnonzero(day_of_row <= train_days[-1])
+        test = np.flatnonzero((day_of_row >= test_days[0]) & (day_of_row <= test_days[-1]))
+        splits.append((train, test))
+    return splits
+
+
+def _prune_fold_cache(keep: int = CV_KEEP) -> None:
+    dirs = sorted((p for p in CV_DIR.iterdir() if p.is_dir()), key=lambda p: p.stat().st_mtime, reverse=True)
+    for path in dirs[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def build_fold_cache(df: pd.DataFrame, forecaster: DemandForecaster, n_splits: int = 5) -> Path:
+    """
+    Grava as matrizes de cada fold (ou reaproveita as já gravadas)
+
+    Returns:
+        Diretório com fold_0/, fold_1/, ... e folds.json
+    """
+    root = CV_DIR / fold_cache_key(df, forecaster, n_splits)
+    if (root / "folds.json").exists():
+        root.touch()
+        return root
+
+    stacked, X = forecaster.prepare_data(df)
+    dates = stacked['date'].to_numpy()
+    horizons = stacked[forecaster.HORIZON_COLUMN].to_numpy()
+
+    folds = []
+    X = X.to_numpy(dtype='float64')
+    for i, (train, test) in enumerate(expanding_splits(dates, n_splits)):
+        # Últimos dias do treino separados para calibrar os intervalos, como em train()
+        train_days = np.unique(dates[train])
+        split_day = train_days[int(len(train_days) * (1 - CALIBRATION_SIZE))]
+        train, calibration = train[dates[train] < split_day], train[dates[train] >= split_day]
+
+        # Normalização ajustada só no treino do fold, como em train()
+        scaler = StandardScaler().fit(X[train])
+        arrays = {
+            'X_train': scaler.transform(X[train]),
+            'X_calibration': scaler.transform(X[calibration]),
+            'X_test': scaler.transform(X[test]),
+        }
+        for part, rows in (('calibration', calibration), ('test', test)):
+            arrays[f'horizon_{part}'] = horizons[rows]
+            arrays[f'date_{part}'] = dates[rows]
+        for target in TARGETS:
+            values = stacked[target].to_numpy(dtype='float64')
+            arrays[f'{target}_train'] = values[train]
+            arrays[f'{target}_calibration'] = values[calibration]
+            arrays[f'{target}_test'] = values[test]
+
+        fold_dir = root / f"fold_{i}"
+        fold_dir.mkdir(parents=True, exist_ok=True)
+        for name, values in arrays.items():
+            np.save(fold_dir / f"{name}.npy", values)
+
+        folds.append({
+            'fold': i,
+            'train_days': len(np.unique(dates[train])),
+            'calibration_days': len(np.unique(dates[calibration])),
+            'test_start': str(pd.Timestamp(dates[test].min()).date()),
+            'test_end': str(pd.Timestamp(dates[test].max()).date()),
+            'train_rows': len(train),
+            'test_rows': len(test),
+        })
+
+    # Gravado por último: marca o conjunto como completo
+    (root / "folds.json").write_text(json.dumps(folds, indent=2))
+    _prune_fold_cache()
+    return root
+
+
+def _run_fold(fold_dir: Path, backend: str, horizon: int) -> Dict[str, Any]:
+    """Treina, calibra os intervalos e avalia um fold (roda em um processo do joblib)"""
+    def load(name: str) -> np.ndarray:
+        return np.load(fold_dir / f"{name}.npy", mmap_mode='r')
+
+    X_train, X_test = load('X_train'), load('X_test')
+    horizon_test, date_test = load('horizon_test'), load('date_test')
+
+    result: Dict[str, Any] = {'fit_seconds': 0.0}
+    for target in TARGETS:
+        model = ESTIMATOR_BACKENDS[backend]()
+        start = time.perf_counter()
+        model.fit(X_train, load(f'{target}_train'))
+        result['fit_seconds'] += time.perf_counter() - start
+
+        residuals = load(f'{target}_calibration') - model.predict(load('X_calibration'))
+        table = calibrate_intervals(residuals, load('horizon_calibration'), load('date_calibration'), horizon)
+
+        y_test = np.asarray(load(f'{target}_test'))
+        pred = model.predict(X_test)
+        lower, upper = apply_intervals(table, pred, horizon_test, date_test)
+
+        result[target] = regression_metrics(y_test, pred)
+        result[target]['coverage'] = float(np.mean((y_test >= lower) & (y_test <= upper)) * 100)
+        result[target]['width'] = float(np.mean(upper - lower))
+        result[f'{target}_errors'] = np.abs(y_test - pred)
+        result[f'{target}_covered'] = (y_test >= lower) & (y_test <= upper)
+
+    return result
+
+
+def cross_validate(
+    df: pd.DataFrame,
+    n_splits: int = 5,
+    workers: int = -1,
+    backend: str = MODEL_BACKEND
+) -> Dict[str, Any]:
+    """
+    Validação cruzada com janela expansiva, um fold por processo
+
+    Args:
+        df: Dataset de features (create_feature_dataset com required_columns())
+        n_splits: Número de folds
+        workers: Processos em paralelo (-1 = todos os núcleos)
+        backend: Estimador ('hist' ou 'classic')
+
+    Returns:
+        Dicionário com 'folds' (métricas de cada fold), 'summary' (média e
+        desvio entre folds e o erro de todos os testes juntos) e tempos
+    """
+    start = time.perf_counter()
+    forecaster = DemandForecaster(backend=backend)
+    root = build_fold_cache(df, forecaster, n_splits)
+    folds: List[Dict] = json.loads((root / "folds.json").read_text())
+    prepared = time.perf_counter() - start
+
+    results = Parallel(n_jobs=workers)(
+        delayed(_run_fold)(root / f"fold_{fold['fold']}", backend, forecaster.horizon) for fold in folds
+    )
+
+    summary: Dict[str, Dict] = {}
+    for target in TARGETS:
+        summary[target] = {}
+        for metric in REPORTED_METRICS:
+            values = np.array([r[target][metric] for r in results])
+            summary[target][metric] = {'mean': float(values.mean()), 'std': float(values.std())}
+        # Erro e cobertura de todos os dias de teste juntos (folds com tamanhos diferentes pesam pelo tamanho)
+        summary[target]['pooled_mae'] = float(np.concatenate([r[f'{target}_errors'] for r in results]).mean())
+        covered = np.concatenate([r[f'{target}_covered'] for r in results])
+        summary[target]['pooled_coverage'] = float(covered.mean() * 100)
+
+    for fold, result in zip(folds, results):
+        fold['fit_seconds'] = result['fit_seconds']
+        for target in TARGETS:
+            fold[target] = {metric: float(result[target][metric]) for metric in REPORTED_METRICS}
+
+    return {
+        'backend': backend,
+        'n_splits': n_splits,
+        'interval_level': INTERVAL_LEVEL,
+        'dataset': _dataset_id(df),
+        'folds': folds,
+        'summary': summary,
+        'prepare_seconds': prepared,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def print_cv_report(result: Dict[str, Any]) -> None:
+    """Tabela por fold e métricas agregadas"""
+    print(f"\n   {'Fold':<5} {'Teste':<24} {'Treino':>7} {'MAE ped.':>9} {'RMSE ped.':>10} "
+          f"{'MAPE ped.':>10} {'Cobert.':>8} {'MAE receita':>13}")
+    for fold in result['folds']:
+        orders, revenue = fold['orders'], fold['revenue']
+        print(f"   {fold['fold']:<5} {fold['test_start'] + ' a ' + fold['test_end']:<24} "
+              f"{fold['train_days']:>6}d {orders['mae']:>9.2f} {orders['rmse']:>10.2f} "
+              f"{orders['mape']:>9.1f}% {orders['coverage']:>7.1f}% {'R$ ' + format(revenue['mae'], ',.2f'):>13}")
+
+    print()
+    for target, label in (('orders', 'Pedidos'), ('revenue', 'Receita')):
+        s = result['summary'][target]
+        print(f"   {label:<8} MAE {s['mae']['mean']:,.2f} ± {s['mae']['std']:,.2f} | "
+              f"RMSE {s['rmse']['mean']:,.2f} ± {s['rmse']['std']:,.2f} | "
+              f"MAPE {s['mape']['mean']:.1f}% ± {s['mape']['std']:.1f} | "
+              f"MAE geral {s['pooled_mae']:,.2f}")
+        print(f"   {'':<8} Cobertura {s['pooled_coverage']:.1f}% (alvo {result['interval_level']:.0%}) | "
+              f"largura média {s['width']['mean']:,.2f}")
+
+    print(f"\n   ⏱️  {len(result['folds'])} folds em {result['seconds']:.2f}s "
+          f"(matrizes: {result['prepare_seconds']:.2f}s)")
+
+
+def save_cv_results(result: Dict[str, Any], model_version: str = MODEL_VERSION, path: Optional[Path] = None) -> str:
+    """Salva o resultado da validação ao lado dos modelos"""
+    if path is None:
+        path = MODELS_DIR / f"cv_results_{model_version}.json"
+    payload = {**result, 'model_version': model_version, 'evaluated_at': pd.Timestamp.now().isoformat()}
+    path.write_text(json.dumps(payload, indent=2))
+    return str(path)
+
+
+if __name__ == "__main__":
+    from feature_engineering import create_feature_dataset
+
+    print("🔁 Validação cruzada temporal - Pirata Pizzaria")
+    print("=" * 60)
+
+    df = create_feature_dataset(columns=DemandForecaster().required_columns())
+    if df.empty:
+        print("❌ Sem dados para validar")
+        exit(1)
+
+    result = cross_validate(df)
+    print_cv_report(result)
+    print(f"\n💾 Resultado salvo em: {save_cv_results(result)}")
@@ -0,0 +1,203 @@
+"""
+Materialização incremental da tabela daily_features
+
+Em vez de recalcular as features de todo o histórico e regravar todas as
+linhas a cada execução, guarda a marca d'água das fontes (maior updatedAt do
+rollup diário e do clima) e recalcula só os dias novos ou alterados, lendo do
+rollup apenas a janela de dias anteriores que as features precisam
+(feature_window). A reconstrução completa continua disponível (full=True).
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from config import DATA_DIR, DATE_DIMENSION_END_YEAR, DATE_DIMENSION_START_YEAR
+from data_context import DataContext
+from database import (
+    get_connection, load_state, max_datetime_exprs, run_write, save_daily_features,
+    save_state, to_epoch_ms, updated_since
+)
+from date_dimension import calendar_version
+from feature_engineering import compute_features, feature_window
+from sales_metrics import get_daily_sales_rollup, refresh_sales_metrics
+
+
+STATE_PATH = DATA_DIR / "daily_features_state.json"
+
+# Colunas do dataset gravadas por save_daily_features
+MATERIALIZED_COLUMNS = [
+    'isWeekend', 'isHoliday', 'dayOfWeek', 'dayOfMonth', 'month', 'year',
+    'tempMin', 'tempMax', 'tempAvg', 'precipitation',
+    'next_day_orders', 'next_day_revenue',
+]
+
+
+def _max_updated(conn, table: str, where: str = "1 = 1") -> int:
+    """Maior updatedAt de uma tabela em epoch ms (0 se vazia)"""
+    maxima = ", ".join(max_datetime_exprs('updatedAt'))
+    row = conn.execute(text(f"SELECT {maxima} FROM {table} WHERE {where}")).fetchone()
+    stamps = [s for s in (to_epoch_ms(v) for v in row) if s is not None]
+    return max(stamps) if stamps else 0
+
+
+def _day(value) -> pd.Timestamp:
+    """Dia de uma data lida do banco (texto no SQLite, DATETIME no MySQL)"""
+    return pd.Timestamp(value).normalize()
+
+
+def get_source_watermarks(conn, holidays: pd.DataFrame) -> Dict:
+    """
+    Estado atual das fontes das features: rollup diário, clima e calendário
+    """
+    return {
+        'sales': _max_updated(conn, 'sales_metrics', "periodType = 'DAILY'"),
+        'weather': _max_updated(conn, 'weather_data'),
+        'calendar': calendar_version(holidays, DATE_DIMENSION_START_YEAR, DATE_DIMENSION_END_YEAR),
+    }
+
+
+def find_changed_days(conn, state: Dict, last_date: pd.Timestamp) -> List[pd.Timestamp]:
+    """
+    Dias com vendas novas (depois do último dia materializado) ou alteradas
+    após a marca d'água, e dias cujo clima mudou
+    """
+    day_after = (last_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    sales_changed, params = updated_since('updatedAt', state['sales'], 'sales')
+
+    rows = conn.execute(text(f"""
+        SELECT date FROM sales_metrics
+        WHERE periodType = 'DAILY' AND (date >= :day_after OR {sales_changed})
+    """), {'day_after': day_after, **params}).fetchall()
+    days = {_day(r[0]) for r in rows}
+
+    weather_changed, params = updated_since('updatedAt', state['weather'], 'weather')
+    rows = conn.execute(text(f"SELECT date FROM weather_data WHERE {weather_changed}"), params).fetchall()
+    # Clima de dias sem vendas (ex.: previsão dos próximos dias) não entra no dataset
+    days |= {_day(r[0]) for r in rows if _day(r[0]) <= last_date}
+
+    return sorted(days)
+
+
+def _neighbor_days(conn, day: pd.Timestamp, count: int, after: bool = False) -> List[pd.Timestamp]:
+    """
+    Os `count` dias do rollup imediatamente antes (ou depois) de `day`, do mais próximo ao mais distante
+    """
+    if count == 0:
+        return []
+    comparison, order = ("date >= :day", "ASC") if after else ("date < :day", "DESC")
+    rows = conn.execute(text(f"""
+        SELECT date FROM sales_metrics
+        WHERE periodType = 'DAILY' AND {comparison}
+        ORDER BY date {order}
+        LIMIT :count
+    """), {
+        'day': (day + pd.Timedelta(days=1) if after else day).strftime('%Y-%m-%d'),
+        'count': count,
+    }).fetchall()
+    return [_day(r[0]) for r in rows]
+
+
+def _affected_rows(dates: pd.Series, changed: List[pd.Timestamp], lookback: int, lookahead: int) -> np.ndarray:
+    """
+    Linhas cujas features mudam quando os dias em `changed` mudam
+
+    Um dia alterado muda as `lookahead` linhas anteriores (que olham para a
+    frente) e as `lookback` seguintes (que olham para trás).
+    """
+    days = dates.to_numpy(dtype='datetime64[ns]')
+    positions = np.searchsorted(days, np.array(changed, dtype='datetime64[ns]'))
+
+    delta = np.zeros(len(days) + 1, dtype=int)
+    np.add.at(delta, np.clip(positions - lookahead, 0, len(days)), 1)
+    np.add.at(delta, np.clip(positions + lookback + 1, 0, len(days)), -1)
+
+    return np.cumsum(delta)[:-1] > 0
+
+
+def refresh_daily_features(full: bool = False, ctx: Optional[DataContext] = None) -> Dict:
+    """
+    Atualiza daily_features recalculando apenas os dias novos ou alterados
+
+    Cada dia depende de `lookback` linhas anteriores (lags, médias móveis) e de
+    `lookahead` posteriores (target do dia seguinte): o cálculo lê o rollup a
+    partir do primeiro dia alterado menos essas linhas e grava só as linhas
+    afetadas pelos dias alterados.
+
+    Args:
+        full: Força a reconstrução completa (ignora a marca d'água)
+        ctx: Contexto da execução (clima e feriados já carregados)
+
+    Returns:
+        Dicionário com o modo usado, os dias gravados e as linhas lidas do rollup
+    """
+    ctx = ctx or DataContext()
+    lookback, lookahead = feature_window(MATERIALIZED_COLUMNS)
+
+    # O rollup diário precisa estar atualizado antes de comparar as marcas d'água
+    refresh_sales_metrics()
+    state = load_state(STATE_PATH)
+
+    with get_connection(readonly=True) as conn:
+        current = get_source_watermarks(conn, ctx.source('holidays'))
+        last_value = conn.execute(text("SELECT MAX(date) FROM daily_features")).scalar()
+        last_date = _day(last_value) if last_value is not None else None
+
+        rebuild = (
+            full
+            or not state
+            or last_date is None
+            or state.get('calendar') != current['calendar']
+        )
+
+        if not rebuild:
+            # Um dia que saiu do rollup (pedidos apagados) deixaria uma linha órfã
+            day_after = (last_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            materialized = conn.execute(text("SELECT COUNT(*) FROM daily_features")).scalar()
+            expected = conn.execute(text(
+                "SELECT COUNT(*) FROM sales_metrics WHERE periodType = 'DAILY' AND date < :day_after"
+            ), {'day_after': day_after}).scalar()
+            rebuild = materialized != expected
+
+        if rebuild:
+            changed, window_start, window_end = None, None, None
+        else:
+            changed = find_changed_days(conn, state, last_date)
+            if not changed:
+                save_state(STATE_PATH, current)
+                return {'mode': 'unchanged', 'days': 0, 'rows_read': 0}
+
+            # Janela lida: linhas afetadas + as que elas usam, antes e depois
+            before = _neighbor_days(conn, changed[0], lookback + lookahead)
+            after = _neighbor_days(conn, changed[-1], lookback + lookahead, after=True)
+            window_start = before[-1] if before else changed[0]
+            window_end = after[-1] if after else changed[-1]
+
+    sales = get_daily_sales_rollup(
+        start_date=window_start.strftime('%Y-%m-%d') if window_start is not None else None,
+        end_date=window_end.strftime('%Y-%m-%d') if window_end is not None else None,
+        refresh=False
+    )
+    features = compute_features(sales, MATERIALIZED_COLUMNS, ctx)
+    if changed is not None:
+        features = features[_affected_rows(features['date'], changed, lookback, lookahead)]
+
+    def write(conn):
+        if rebuild:
+            conn.execute(text("DELETE FROM daily_features"))
+        return save_daily_features(features, conn=conn)
+
+    # Só a gravação segura o lock (repetida se o banco estiver ocupado)
+    saved = run_write(write)
+    save_state(STATE_PATH, current)
+
+    return {'mode': 'full' if rebuild else 'incremental', 'days': saved, 'rows_read': len(sales)}
+
+
+if __name__ == "__main__":
+    print("🧱 Atualizando daily_features...")
+
+    result = refresh_daily_features()
+    print(f"   ✅ Modo: {result['mode']} | {result['days']} dias gravados | "
+          f"{result['rows_read']} dias lidos do rollup")
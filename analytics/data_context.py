@@ -0,0 +1,79 @@
+"""
+Contexto de dados de uma execução do pipeline
+
+Carrega cada fonte (vendas, clima, feriados) uma única vez, guarda os
+resultados derivados (ex.: o dataset de features) para reuso entre etapas
+e registra o tempo gasto em cada etapa.
+"""
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Hashable, Iterator
+
+import pandas as pd
+
+from snapshot_cache import load_source
+
+
+class DataContext:
+    """
+    Estado compartilhado por uma execução (treino + previsão)
+
+    Os DataFrames devolvidos são compartilhados: as etapas não devem alterá-los.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, pd.DataFrame] = {}
+        self._memo: Dict[Hashable, Any] = {}
+        self.timings: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self.reused: Dict[str, int] = {}
+
+    def source(self, name: str) -> pd.DataFrame:
+        """Fonte de dados ('sales', 'channels', 'weather', 'holidays'), carregada só na primeira vez"""
+        if name in self._sources:
+            self.reused[f"fonte:{name}"] = self.reused.get(f"fonte:{name}", 0) + 1
+            return self._sources[name]
+
+        with self.stage(f"fonte:{name}"):
+            self._sources[name] = load_source(name)
+        return self._sources[name]
+
+    def provide(self, name: str, df: pd.DataFrame) -> None:
+        """Usa um DataFrame já carregado como fonte (ex.: dados sintéticos nos benchmarks)"""
+        self._sources[name] = df
+
+    def memo(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Resultado derivado calculado uma vez por execução"""
+        if key in self._memo:
+            label = key[0] if isinstance(key, tuple) else str(key)
+            self.reused[label] = self.reused.get(label, 0) + 1
+            return self._memo[key]
+
+        self._memo[key] = compute()
+        return self._memo[key]
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Mede o tempo de uma etapa (acumulado se ela rodar mais de uma vez)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def print_timings(self) -> None:
+        """Mostra o tempo por etapa e quantas cargas foram reaproveitadas"""
+        if not self.timings:
+            return
+
+        print("\n⏱️  Tempo por etapa:")
+        for name, seconds in self.timings.items():
+            calls = self.calls.get(name, 1)
+            reused = self.reused.get(name, 0)
+            note = f" | reaproveitado {reused}x" if reused else ""
+            print(f"   {name:<24} {seconds * 1000:>8.1f} ms ({calls}x){note}")
+
+        for name, reused in self.reused.items():
+            if name not in self.timings:
+                print(f"   {name:<24} {'-':>8}    reaproveitado {reused}x")
@@ -1,17 +1,562 @@
 """
 Conexão com banco de dados
 """
+import json
+import re
 import sqlite3
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+import numpy as np
 import pandas as pd
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, Engine, make_url
+from sqlalchemy.exc import OperationalError
 
-from config import SQLITE_PATH, DATABASE_URL
+from config import SQLITE_PATH, SQLITE_ACCESS_MODE, DATABASE_URL, DB_TIMEZONE_OFFSET
 
+T = TypeVar('T')
 
-def get_sqlite_connection():
-    """Conexão SQLite para desenvolvimento"""
-    return sqlite3.connect(str(SQLITE_PATH))
+# Parâmetros da URL que só fazem sentido para o Prisma
+PRISMA_ONLY_PARAMS = ('connection_limit', 'pool_timeout', 'sslaccept', 'schema', 'socket_timeout')
+
+# SQLite: quanto uma conexão espera por um lock antes de "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = 5000
+
+# Gravações em lote: linhas por transação e novas tentativas quando o banco está ocupado
+WRITE_BATCH_SIZE = 500
+WRITE_RETRIES = 5
+WRITE_RETRY_DELAY = 0.05
+
+# Engines únicos por processo (criados sob demanda)
+_engine: Optional[Engine] = None
+_read_engine: Optional[Engine] = None
+
+
+def get_database_url() -> str:
+    """
+    Converte o DATABASE_URL do Prisma para uma URL do SQLAlchemy
+
+    mysql://...  -> mysql+pymysql://... (produção)
+    file:./...   -> SQLite local em prisma/dev.db (desenvolvimento)
+    """
+    if DATABASE_URL.startswith("mysql"):
+        url = make_url(DATABASE_URL).set(drivername="mysql+pymysql")
+        return url.difference_update_query(PRISMA_ONLY_PARAMS).render_as_string(hide_password=False)
+
+    return f"sqlite:///{SQLITE_PATH}"
+
+
+def get_engine() -> Engine:
+    """
+    Retorna o engine com pool de conexões, criado uma única vez por processo
+    """
+    global _engine
+
+    if _engine is None:
+        url = get_database_url()
+        if url.startswith("mysql"):
+            _engine = create_engine(
+                url,
+                pool_size=5,
+                max_overflow=5,
+                pool_recycle=3600,
+                pool_pre_ping=True,
+            )
+        else:
+            _engine = create_engine(url, connect_args={'timeout': SQLITE_BUSY_TIMEOUT_MS / 1000})
+            if SQLITE_ACCESS_MODE == 'concurrent':
+                event.listen(_engine, 'connect', _enable_wal)
+
+    return _engine
+
+
+def _enable_wal(dbapi_conn, _record) -> None:
+    """
+    Ativa o WAL no SQLite: leitores (inclusive as rotas do Next.js) não
+    esperam pelo pipeline enquanto ele grava, e vice-versa
+    """
+    cursor = dbapi_conn.cursor()
+    try:
+        # O modo fica gravado no arquivo; nas próximas conexões é só uma confirmação
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    except sqlite3.OperationalError:
+        # Outro processo segurando o banco: tenta de novo na próxima conexão
+        pass
+    finally:
+        cursor.close()
+
+
+def get_read_engine() -> Engine:
+    """
+    Engine das leituras do analytics
+
+    No SQLite em modo 'concurrent' abre o arquivo como somente leitura (URI
+    mode=ro): a leitura nunca pega lock de escrita. No MySQL, ou no modo
+    'simple', é o mesmo engine das gravações.
+    """
+    global _read_engine
+
+    if is_mysql() or SQLITE_ACCESS_MODE != 'concurrent':
+        return get_engine()
+
+    if _read_engine is None:
+        # Garante o WAL (ativado pela conexão de escrita) antes de abrir as de leitura
+        get_engine().connect().close()
+
+        uri = f"{SQLITE_PATH.resolve().as_uri()}?mode=ro"
+        _read_engine = create_engine(
+            "sqlite://",
+            creator=lambda: sqlite3.connect(
+                uri, uri=True, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False
+            ),
+        )
+
+    return _read_engine
+
+
+def is_mysql() -> bool:
+    """Indica se o banco configurado é MySQL (produção)"""
+    return get_engine().dialect.name == "mysql"
+
+
+def _state_key() -> str:
+    """Identifica o banco no arquivo de estado (sem senha)"""
+    return get_engine().url.render_as_string(hide_password=True)
+
+
+def load_state(path: Path) -> Dict:
+    """
+    Estado de uma atualização incremental (marcas d'água) do banco configurado
+    
+    Cada arquivo guarda um estado por banco, então trocar de banco não
+    reaproveita marcas d'água de outro.
+    """
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text()).get(_state_key(), {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(path: Path, state: Dict) -> None:
+    """Grava o estado do banco configurado, mantendo os dos outros bancos"""
+    try:
+        all_states = json.loads(path.read_text()) if path.exists() else {}
+    except (OSError, ValueError):
+        all_states = {}
+    all_states[_state_key()] = state
+    path.write_text(json.dumps(all_states, indent=2))
+
+
+@contextmanager
+def get_connection(readonly: bool = False) -> Iterator[Connection]:
+    """
+    Empresta uma conexão do pool dentro de uma transação
+
+    Faz commit ao sair normalmente e rollback em caso de exceção.
+    A conexão volta para o pool em vez de ser fechada.
+
+    Args:
+        readonly: Usa o engine somente leitura (consultas do analytics)
+    """
+    engine = get_read_engine() if readonly else get_engine()
+    with engine.begin() as conn:
+        yield conn
+
+
+def _is_lock_error(error: Exception) -> bool:
+    """Erro transitório de concorrência (vale a pena tentar de novo)"""
+    message = str(error).lower()
+    return any(m in message for m in ('database is locked', 'database is busy', 'deadlock', 'lock wait timeout'))
+
+
+def run_write(operation: Callable[[Connection], T], retries: int = WRITE_RETRIES) -> T:
+    """
+    Executa uma transação curta de escrita, repetindo se o banco estiver ocupado
+
+    A operação recebe a conexão e é repetida inteira (deve ser idempotente).
+    """
+    for attempt in range(retries + 1):
+        try:
+            with get_connection() as conn:
+                return operation(conn)
+        except OperationalError as e:
+            if attempt == retries or not _is_lock_error(e):
+                raise
+            time.sleep(WRITE_RETRY_DELAY * 2 ** attempt)
+
+
+def dispose_engine() -> None:
+    """Fecha todas as conexões do pool (fim do processo ou troca de banco)"""
+    global _engine, _read_engine
+
+    if _read_engine is not None:
+        _read_engine.dispose()
+        _read_engine = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+def _utc_offset() -> pd.Timedelta:
+    """Diferença entre o horário local da pizzaria e UTC (ex.: '-03:00' -> -3h)"""
+    match = re.fullmatch(r'([+-])(\d{2}):(\d{2})', DB_TIMEZONE_OFFSET)
+    if not match:
+        raise ValueError(f"ANALYTICS_TZ_OFFSET inválido: {DB_TIMEZONE_OFFSET!r} (use ±HH:MM)")
+    sign = -1 if match.group(1) == '-' else 1
+    return sign * pd.Timedelta(hours=int(match.group(2)), minutes=int(match.group(3)))
+
+
+def _sqlite_offset() -> str:
+    """Modificador de data do SQLite com o fuso da pizzaria (ex.: '-180 minutes'), nunca o do servidor"""
+    return f"{int(_utc_offset() / pd.Timedelta(minutes=1)):+d} minutes"
+
+
+def sales_day_expr(column: str = 'openedAt') -> str:
+    """
+    Expressão SQL do dia local de um DateTime, no dialeto do banco
+    
+    SQLite: o Prisma grava epoch ms, mas importações antigas gravaram texto
+    ISO, então cada linha é tratada no seu formato. MySQL: DATETIME em UTC.
+    Epoch ms, texto ISO (UTC, ou com o próprio sufixo de fuso) e DATETIME são
+    convertidos para o fuso da pizzaria (ANALYTICS_TZ_OFFSET), não para o
+    fuso da máquina que roda o pipeline.
+    """
+    if is_mysql():
+        _utc_offset()  # valida o formato antes de montar o SQL
+        return f"DATE(CONVERT_TZ({column}, '+00:00', '{DB_TIMEZONE_OFFSET}'))"
+    
+    return f"""
+    CASE WHEN typeof({column}) IN ('integer', 'real')
+         THEN date({column} / 1000, 'unixepoch', '{_sqlite_offset()}')
+         ELSE date({column}, '{_sqlite_offset()}') END
+    """
+
+
+def sales_hour_expr(column: str = 'openedAt') -> str:
+    """Expressão SQL da hora local (0-23) de um DateTime, no mesmo fuso de sales_day_expr"""
+    if is_mysql():
+        _utc_offset()  # valida o formato antes de montar o SQL
+        return f"HOUR(CONVERT_TZ({column}, '+00:00', '{DB_TIMEZONE_OFFSET}'))"
+    
+    return f"""
+    CASE WHEN typeof({column}) IN ('integer', 'real')
+         THEN CAST(strftime('%H', {column} / 1000, 'unixepoch', '{_sqlite_offset()}') AS INTEGER)
+         ELSE CAST(strftime('%H', {column}, '{_sqlite_offset()}') AS INTEGER) END
+    """
+
+
+def daily_aggregates() -> str:
+    """Agregações diárias de sales_orders, calculadas no próprio banco"""
+    # DECIMAL já é numérico no MySQL; no SQLite pode vir como texto
+    amount = "amount" if is_mysql() else "CAST(amount AS REAL)"
+    
+    return f"""
+    COUNT(*) as orders,
+    SUM({amount}) as revenue,
+    AVG({amount}) as avg_ticket,
+    SUM(itemsCount) as total_items,
+    AVG(duration) as avg_duration,
+    SUM(CASE WHEN isCounter = 1 THEN 1 ELSE 0 END) as counter_orders,
+    SUM(CASE WHEN isDelivery = 1 THEN 1 ELSE 0 END) as delivery_orders,
+    SUM(CASE WHEN isCounter = 0 AND isDelivery = 0 THEN 1 ELSE 0 END) as table_orders,
+    SUM(CASE WHEN paymentStatus = 'PAID' THEN 1 ELSE 0 END) as paid_orders,
+    SUM(CASE WHEN paymentStatus = 'PENDING' THEN 1 ELSE 0 END) as pending_orders
+    """
+
+
+def _local_midnight_ms(day: pd.Timestamp) -> int:
+    """Meia-noite local do dia em epoch ms (mesmo fuso de sales_day_expr)"""
+    return (day.normalize() - _utc_offset()).value // 1_000_000
+
+
+def _local_midnight_utc(day: pd.Timestamp) -> str:
+    """Meia-noite local do dia em UTC, no formato DATETIME do MySQL (e do datetime() do SQLite)"""
+    return (day.normalize() - _utc_offset()).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _iso_day_bound(day: pd.Timestamp, days: int) -> str:
+    """
+    Dia (texto 'YYYY-MM-DD') da meia-noite local em UTC, deslocado `days` dias
+
+    Limite do ramo ISO no índice: com um dia de folga para cada lado, cobre
+    qualquer separador ('T' ou espaço) e sufixo de fuso do texto gravado.
+    """
+    return (day.normalize() - _utc_offset() + pd.Timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+def opened_at_range(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    column: str = 'openedAt',
+    prefix: str = 'opened'
+) -> Tuple[str, Dict]:
+    """
+    Monta o predicado do intervalo de dias [start_date, end_date] sobre um DateTime
+    
+    A coluna é comparada "crua" (sem date()), então o índice é usado. No SQLite
+    números ordenam antes de qualquer texto: o primeiro ramo do OR só alcança
+    valores em epoch ms e o segundo só valores em texto ISO. Os dois ramos
+    cortam nas meias-noites locais (ANALYTICS_TZ_OFFSET), como sales_day_expr:
+    no ramo ISO o índice percorre os dias com folga e datetime() da coluna
+    (UTC normalizado) faz o corte exato.
+    
+    Returns:
+        Tupla (sql, params) para usar com text()
+    """
+    start = pd.Timestamp(start_date) if start_date else None
+    end = pd.Timestamp(end_date) + pd.Timedelta(days=1) if end_date else None
+    params = {}
+    
+    if is_mysql():
+        # DATETIME nativo em UTC: um único intervalo entre meias-noites locais
+        parts = []
+        if start is not None:
+            parts.append(f"{column} >= :{prefix}_start")
+            params[f'{prefix}_start'] = _local_midnight_utc(start)
+        if end is not None:
+            parts.append(f"{column} < :{prefix}_end")
+            params[f'{prefix}_end'] = _local_midnight_utc(end)
+        return ("(" + " AND ".join(parts) + ")" if parts else "1 = 1"), params
+    
+    # Ramo epoch ms: limite superior '' quando aberto (exclui os textos)
+    ms_parts = [f"{column} < :{prefix}_end_ms"]
+    params[f'{prefix}_end_ms'] = _local_midnight_ms(end) if end is not None else ''
+    if start is not None:
+        ms_parts.insert(0, f"{column} >= :{prefix}_start_ms")
+        params[f'{prefix}_start_ms'] = _local_midnight_ms(start)
+    
+    # Ramo ISO: limite inferior '' quando aberto (exclui os números)
+    iso_parts = [f"{column} >= :{prefix}_start_iso"]
+    params[f'{prefix}_start_iso'] = _iso_day_bound(start, -1) if start is not None else ''
+    if start is not None:
+        iso_parts.append(f"datetime({column}) >= :{prefix}_start_utc")
+        params[f'{prefix}_start_utc'] = _local_midnight_utc(start)
+    if end is not None:
+        iso_parts.append(f"{column} < :{prefix}_end_iso")
+        iso_parts.append(f"datetime({column}) < :{prefix}_end_utc")
+        params[f'{prefix}_end_iso'] = _iso_day_bound(end, 1)
+        params[f'{prefix}_end_utc'] = _local_midnight_utc(end)
+    
+    sql = f"(({' AND '.join(ms_parts)}) OR ({' AND '.join(iso_parts)}))"
+    return sql, params
+
+
+def opened_at_days(days: List[str], column: str = 'openedAt') -> Tuple[str, Dict]:
+    """
+    Predicado para um conjunto de dias, juntando dias consecutivos em um só intervalo
+    """
+    dates = sorted(set(pd.to_datetime(pd.Series(days, dtype=object))))
+    if not dates:
+        return "1 = 0", {}
+    
+    runs = [[dates[0], dates[0]]]
+    for day in dates[1:]:
+        if day - runs[-1][1] == pd.Timedelta(days=1):
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    
+    clauses, params = [], {}
+    for i, (start, end) in enumerate(runs):
+        sql, run_params = opened_at_range(start, end, column, prefix=f'run{i}')
+        clauses.append(sql)
+        params.update(run_params)
+    
+    return "(" + " OR ".join(clauses) + ")", params
+
+
+def max_datetime_exprs(column: str) -> List[str]:
+    """
+    Expressões MAX() para um DateTime que pode misturar epoch ms e texto ISO
+    
+    No SQLite o MAX de uma coluna mista sempre devolve um texto (textos ordenam
+    depois dos números), então cada formato é maximizado separadamente.
+    """
+    if is_mysql():
+        return [f"MAX({column})"]
+    return [
+        f"MAX(CASE WHEN typeof({column}) = 'text' THEN NULL ELSE {column} END)",
+        f"MAX(CASE WHEN typeof({column}) = 'text' THEN {column} END)",
+    ]
+
+
+def to_epoch_ms(value) -> Optional[int]:
+    """Converte um DateTime do Prisma (epoch ms ou ISO) para epoch ms"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize('UTC')
+    return int(ts.timestamp() * 1000)
+
+
+def updated_since(column: str, since_ms: int, prefix: str = 'since') -> Tuple[str, Dict]:
+    """
+    Predicado "coluna alterada depois de since_ms" para um DateTime misto (epoch ms ou texto)
+
+    O texto é comparado no formato do CURRENT_TIMESTAMP (UTC, "YYYY-MM-DD HH:MM:SS").
+    A marca d'água deve ser lida na mesma transação da consulta, para que as
+    linhas do próprio segundo da marca já tenham sido vistas.
+
+    Returns:
+        Tupla (sql, params) para usar com text()
+    """
+    since = pd.Timestamp(since_ms, unit='ms').strftime('%Y-%m-%d %H:%M:%S')
+
+    if is_mysql():
+        return f"{column} > :{prefix}_text", {f'{prefix}_text': since}
+
+    predicate = f"(({column} > :{prefix}_ms AND {column} < '') OR {column} > :{prefix}_text)"
+    return predicate, {f'{prefix}_ms': since_ms, f'{prefix}_text': since}
+
+
+def explain_query_plan(query: str, params: Optional[Dict] = None) -> List[str]:
+    """
+    Plano de execução de uma consulta, para conferir o uso de índices
+    """
+    with get_connection(readonly=True) as conn:
+        if conn.dialect.name == 'mysql':
+            result = conn.execute(text("EXPLAIN " + query), params or {}).mappings().all()
+            return [f"{row['table']}: {row['type']} USING INDEX {row['key']}" for row in result]
+        
+        rows = conn.execute(text("EXPLAIN QUERY PLAN " + query), params or {}).fetchall()
+    return [row[-1] for row in rows]
+
+
+def _to_local_datetime(values: pd.Series) -> pd.Series:
+    """
+    Converte DateTime do Prisma para datetime64 local, aceitando epoch ms e ISO na mesma coluna
+    """
+    if is_mysql():
+        # DATETIME do MySQL vem em UTC
+        return pd.to_datetime(values) + _utc_offset()
+    
+    numeric = pd.to_numeric(values, errors='coerce')
+    is_ms = numeric.notna()
+    
+    result = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    if is_ms.any():
+        # Epoch ms é UTC: mesmo fuso da pizzaria de sales_day_expr
+        result[is_ms] = pd.to_datetime(numeric[is_ms], unit='ms') + _utc_offset()
+    if (~is_ms).any():
+        # Texto ISO também é UTC (ou traz o próprio fuso): mesmo deslocamento
+        utc = pd.to_datetime(values[~is_ms], format='mixed', errors='coerce', utc=True)
+        result[~is_ms] = utc.dt.tz_localize(None) + _utc_offset()
+    
+    return result
+
+
+# Colunas de sales_orders lidas pelo analytics
+SALES_ORDER_COLUMNS = (
+    'id', 'externalId', 'origin', 'orderType', 'itemsCount', 'amount',
+    'status', 'paymentStatus', 'openedAt', 'closedAt', 'duration', 'unit',
+    'tableNumber', 'isCounter', 'isDelivery'
+)
+
+# Colunas de texto com poucos valores distintos (viram categóricas)
+SALES_CATEGORICAL_COLUMNS = ('origin', 'orderType', 'status', 'paymentStatus', 'unit')
+
+
+def get_sales_categories(conn: Connection, columns: List[str]) -> Dict[str, pd.CategoricalDtype]:
+    """
+    Busca os valores distintos das colunas categóricas uma única vez,
+    para que todos os blocos usem as mesmas categorias
+    """
+    dtypes = {}
+    for col in columns:
+        values = conn.execute(text(
+            f"SELECT DISTINCT {col} FROM sales_orders WHERE {col} IS NOT NULL"
+        )).scalars().all()
+        dtypes[col] = pd.CategoricalDtype(sorted(values))
+    return dtypes
+
+
+def _typed_sales_chunk(
+    chunk: pd.DataFrame,
+    categories: Dict[str, pd.CategoricalDtype],
+    amount_in_cents: bool
+) -> pd.DataFrame:
+    """
+    Converte um bloco cru de sales_orders para tipos compactos
+    """
+    typed = {}
+    
+    for col in chunk.columns:
+        values = chunk[col]
+        
+        if col in categories:
+            typed[col] = values.astype(categories[col])
+        elif col in ('openedAt', 'closedAt'):
+            typed[col] = _to_local_datetime(values)
+        elif col == 'amount':
+            amount = pd.to_numeric(values, errors='coerce')
+            typed[col] = (amount * 100).round().astype('int64') if amount_in_cents else amount.astype('float64')
+        elif col == 'itemsCount':
+            typed[col] = pd.to_numeric(values).astype('int32')
+        elif col in ('duration', 'tableNumber'):
+            typed[col] = pd.to_numeric(values, errors='coerce').astype('Int32')
+        elif col in ('isCounter', 'isDelivery'):
+            typed[col] = pd.to_numeric(values).astype(bool)
+        else:
+            typed[col] = values
+    
+    return pd.DataFrame(typed, index=chunk.index)
+
+
+def iter_sales_orders(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+    chunksize: int = 50_000,
+    amount_in_cents: bool = False
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê os pedidos em blocos de tamanho fixo, já com tipos compactos
+    
+    Categóricas para origin/orderType/status/paymentStatus/unit, int32 para
+    contagens, datetime64 para datas e float64 (ou centavos int64) para valores.
+    Análises por pedido em vários anos rodam com memória limitada ao bloco.
+    
+    Args:
+        start_date: Data inicial (YYYY-MM-DD)
+        end_date: Data final (YYYY-MM-DD)
+        columns: Subconjunto de SALES_ORDER_COLUMNS (padrão: todas)
+        chunksize: Linhas por bloco
+        amount_in_cents: Retorna amount como inteiro em centavos
+    
+    Yields:
+        DataFrames com até chunksize linhas, em ordem de openedAt
+    """
+    columns = list(columns or SALES_ORDER_COLUMNS)
+    unknown = set(columns) - set(SALES_ORDER_COLUMNS)
+    if unknown:
+        raise ValueError(f"Colunas desconhecidas: {unknown}")
+    
+    query = f"SELECT {', '.join(columns)} FROM sales_orders WHERE deletedAt IS NULL"
+    params = {}
+    
+    if start_date or end_date:
+        predicate, params = opened_at_range(start_date, end_date)
+        query += f" AND {predicate}"
+    
+    query += " ORDER BY openedAt"
+    
+    with get_connection(readonly=True) as conn:
+        categories = get_sales_categories(conn, [c for c in columns if c in SALES_CATEGORICAL_COLUMNS])
+        
+        # Cursor do lado do servidor no MySQL; no SQLite as linhas já vêm sob demanda
+        stream = conn.execution_options(stream_results=True)
+        for chunk in pd.read_sql_query(text(query), stream, params=params, chunksize=chunksize):
+            yield _typed_sales_chunk(chunk, categories, amount_in_cents)
 
 
 def get_sales_data(start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
@@ -25,113 +570,88 @@ def get_sales_data(start_date: Optional[str] = None, end_date: Optional[str] = N
     Returns:
         DataFrame com os dados de vendas
     """
-    conn = get_sqlite_connection()
+    chunks = list(iter_sales_orders(start_date, end_date))
     
-    query = """
-        SELECT 
-            id,
-            externalId,
-            origin,
-            orderType,
-            itemsCount,
-            amount,
-            status,
-            paymentStatus,
-            openedAt,
-            closedAt,
-            duration,
-            unit,
-            tableNumber,
-            isCounter,
-            isDelivery
+    if not chunks:
+        return pd.DataFrame(columns=list(SALES_ORDER_COLUMNS))
+    
+    df = pd.concat(chunks, ignore_index=True)
+    
+    # Linhas em epoch ms e em ISO vêm em blocos separados pelo ORDER BY
+    return df.sort_values('openedAt', kind='stable').reset_index(drop=True)
+
+
+def get_daily_sales_summary(start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    """
+    Retorna resumo diário de vendas
+    
+    Cada pedido é agrupado pelo dia no seu próprio formato de data, então
+    tabelas com epoch ms e ISO misturados são agregadas corretamente.
+    """
+    query = f"""
+        SELECT {sales_day_expr()} as date, {daily_aggregates()}
         FROM sales_orders
         WHERE deletedAt IS NULL
     """
     
-    params = []
+    params = {}
     
-    if start_date:
-        query += " AND date(openedAt) >= ?"
-        params.append(start_date)
+    if start_date or end_date:
+        predicate, params = opened_at_range(start_date, end_date)
+        query += f" AND {predicate}"
     
-    if end_date:
-        query += " AND date(openedAt) <= ?"
-        params.append(end_date)
+    query += " GROUP BY 1 ORDER BY 1"
     
-    query += " ORDER BY openedAt"
+    with get_connection(readonly=True) as conn:
+        df = pd.read_sql_query(text(query), conn, params=params)
     
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+    if df.empty:
+        return pd.DataFrame()
     
-    # Converter tipos
-    df['openedAt'] = pd.to_datetime(df['openedAt'])
-    df['amount'] = pd.to_numeric(df['amount'])
-    df['itemsCount'] = pd.to_numeric(df['itemsCount'])
+    # Texto no SQLite, date no MySQL
+    df['date'] = pd.to_datetime(df['date'].astype(str), format='%Y-%m-%d')
     
     return df
 
 
-def get_daily_sales_summary() -> pd.DataFrame:
+# Canais de venda: cada pedido cai em um só (delivery, depois balcão, senão mesa)
+SALES_CHANNELS = ('COUNTER', 'TABLE', 'DELIVERY')
+
+
+def sales_channel_expr() -> str:
+    """Expressão SQL do canal de venda de um pedido (um dos SALES_CHANNELS)"""
+    return "CASE WHEN isDelivery = 1 THEN 'DELIVERY' WHEN isCounter = 1 THEN 'COUNTER' ELSE 'TABLE' END"
+
+
+def get_daily_channel_sales(start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
     """
-    Retorna resumo diário de vendas
+    Resumo diário por canal de venda, em formato longo (date, channel, orders, revenue, avg_ticket)
+    
+    Dias sem pedidos em um canal não aparecem.
+    """
+    amount = "amount" if is_mysql() else "CAST(amount AS REAL)"
+    query = f"""
+        SELECT {sales_day_expr()} as date, {sales_channel_expr()} as channel,
+            COUNT(*) as orders,
+            SUM({amount}) as revenue,
+            AVG({amount}) as avg_ticket
+        FROM sales_orders
+        WHERE deletedAt IS NULL
     """
-    conn = get_sqlite_connection()
     
-    # Detectar formato da data (timestamp vs ISO)
-    check_query = "SELECT openedAt FROM sales_orders LIMIT 1"
-    sample = pd.read_sql_query(check_query, conn)
+    params = {}
     
-    if sample.empty:
-        conn.close()
-        return pd.DataFrame()
+    if start_date or end_date:
+        predicate, params = opened_at_range(start_date, end_date)
+        query += f" AND {predicate}"
     
-    sample_value = str(sample['openedAt'].iloc[0])
-    
-    # Se for timestamp (número grande), converter
-    if sample_value.isdigit() and len(sample_value) >= 10:
-        query = """
-            SELECT 
-                date(openedAt / 1000, 'unixepoch', 'localtime') as date,
-                COUNT(*) as orders,
-                SUM(CAST(amount AS REAL)) as revenue,
-                AVG(CAST(amount AS REAL)) as avg_ticket,
-                SUM(itemsCount) as total_items,
-                AVG(duration) as avg_duration,
-                SUM(CASE WHEN isCounter = 1 THEN 1 ELSE 0 END) as counter_orders,
-                SUM(CASE WHEN isDelivery = 1 THEN 1 ELSE 0 END) as delivery_orders,
-                SUM(CASE WHEN isCounter = 0 AND isDelivery = 0 THEN 1 ELSE 0 END) as table_orders,
-                SUM(CASE WHEN paymentStatus = 'PAID' THEN 1 ELSE 0 END) as paid_orders,
-                SUM(CASE WHEN paymentStatus = 'PENDING' THEN 1 ELSE 0 END) as pending_orders
-            FROM sales_orders
-            WHERE deletedAt IS NULL
-            GROUP BY date(openedAt / 1000, 'unixepoch', 'localtime')
-            ORDER BY date
-        """
-    else:
-        # ISO format
-        query = """
-            SELECT 
-                date(openedAt) as date,
-                COUNT(*) as orders,
-                SUM(CAST(amount AS REAL)) as revenue,
-                AVG(CAST(amount AS REAL)) as avg_ticket,
-                SUM(itemsCount) as total_items,
-                AVG(duration) as avg_duration,
-                SUM(CASE WHEN isCounter = 1 THEN 1 ELSE 0 END) as counter_orders,
-                SUM(CASE WHEN isDelivery = 1 THEN 1 ELSE 0 END) as delivery_orders,
-                SUM(CASE WHEN isCounter = 0 AND isDelivery = 0 THEN 1 ELSE 0 END) as table_orders,
-                SUM(CASE WHEN paymentStatus = 'PAID' THEN 1 ELSE 0 END) as paid_orders,
-                SUM(CASE WHEN paymentStatus = 'PENDING' THEN 1 ELSE 0 END) as pending_orders
-            FROM sales_orders
-            WHERE deletedAt IS NULL
-            GROUP BY date(openedAt)
-            ORDER BY date
-        """
-    
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    
-    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    query += " GROUP BY 1, 2 ORDER BY 2, 1"
+    
+    with get_connection(readonly=True) as conn:
+        df = pd.read_sql_query(text(query), conn, params=params)
+    
+    # Texto no SQLite, date no MySQL
+    df['date'] = pd.to_datetime(df['date'].astype(str), format='%Y-%m-%d')
     
     return df
 
@@ -140,28 +660,27 @@ def get_weather_data() -> pd.DataFrame:
     """
     Busca dados meteorológicos do banco
     """
-    conn = get_sqlite_connection()
-    
-    query = """
-        SELECT 
-            date,
-            tempMin,
-            tempMax,
-            tempAvg,
-            precipitation,
-            humidity,
-            condition
-        FROM weather_data
-        ORDER BY date
-    """
-    
     try:
-        df = pd.read_sql_query(query, conn)
+        with get_connection(readonly=True) as conn:
+            # "condition" é palavra reservada no MySQL
+            condition = conn.dialect.identifier_preparer.quote('condition')
+            query = f"""
+                SELECT 
+                    date,
+                    tempMin,
+                    tempMax,
+                    tempAvg,
+                    precipitation,
+                    humidity,
+                    {condition}
+                FROM weather_data
+                ORDER BY date
+            """
+            df = pd.read_sql_query(text(query), conn)
         df['date'] = pd.to_datetime(df['date'])
     except Exception:
         df = pd.DataFrame()
     
-    conn.close()
     return df
 
 
@@ -169,8 +688,6 @@ def get_holidays() -> pd.DataFrame:
     """
     Busca feriados do banco
     """
-    conn = get_sqlite_connection()
-    
     query = """
         SELECT 
             date,
@@ -183,91 +700,240 @@ def get_holidays() -> pd.DataFrame:
     """
     
     try:
-        df = pd.read_sql_query(query, conn)
+        with get_connection(readonly=True) as conn:
+            df = pd.read_sql_query(text(query), conn)
         df['date'] = pd.to_datetime(df['date'])
     except Exception:
         df = pd.DataFrame()
     
-    conn.close()
     return df
 
 
+def _numeric_param(df: pd.DataFrame, name: str, dtype: str = 'float64', default=None) -> list:
+    """
+    Converte uma coluna inteira para parâmetros do driver (NaN -> default)
+    """
+    if name not in df.columns:
+        return [default] * len(df)
+    
+    values = pd.to_numeric(df[name], errors='coerce').to_numpy(dtype='float64')
+    missing = np.isnan(values)
+    
+    if dtype == 'int64':
+        values = np.trunc(np.where(missing, 0, values)).astype('int64')
+    elif dtype == 'bool':
+        values = (np.where(missing, 0, values) != 0).astype('int64')
+    
+    params = values.astype(object)
+    params[missing] = default
+    return params.tolist()
+
+
+def _text_param(df: pd.DataFrame, name: str, default=None) -> list:
+    """Converte uma coluna de texto para parâmetros do driver (NaN -> default)"""
+    if name not in df.columns:
+        return [default] * len(df)
+    
+    values = df[name].astype(object)
+    return values.where(values.notna(), default).tolist()
+
+
+def _date_param(df: pd.DataFrame, name: str = 'date', fmt: str = '%Y-%m-%d') -> list:
+    """Formata uma coluna de datas inteira de uma vez"""
+    return pd.to_datetime(df[name]).dt.strftime(fmt).tolist()
+
+
+def _upsert_sql(
+    conn: Connection,
+    table: str,
+    columns: list,
+    conflict_keys: list,
+    stamps: tuple
+) -> str:
+    """
+    Monta um INSERT com upsert no dialeto do banco
+
+    SQLite: ON CONFLICT (chave natural) DO UPDATE, mais um ON CONFLICT (id) /
+    MySQL: ON DUPLICATE KEY UPDATE (qualquer chave única). Um registro que já
+    existe pela chave natural mantém o seu id, como no INSERT OR REPLACE
+    original sem apagar a linha. createdAt só é preenchido na inserção;
+    updatedAt é atualizado sempre.
+    """
+    quote = conn.dialect.identifier_preparer.quote
+    placeholder = '?' if conn.dialect.paramstyle == 'qmark' else '%s'
+    is_mysql_dialect = conn.dialect.name == 'mysql'
+    
+    names = [quote(c) for c in columns] + [quote(c) for c in stamps]
+    values = [placeholder] * len(columns) + ['CURRENT_TIMESTAMP'] * len(stamps)
+    
+    def assignments(skip: list) -> str:
+        updates = []
+        for col in columns:
+            if col in skip or col == 'id':
+                continue
+            source = f"VALUES({quote(col)})" if is_mysql_dialect else f"excluded.{quote(col)}"
+            updates.append(f"{quote(col)} = {source}")
+        if 'updatedAt' in stamps:
+            updates.append(f"{quote('updatedAt')} = CURRENT_TIMESTAMP")
+        return ', '.join(updates)
+    
+    sql = f"INSERT INTO {quote(table)} ({', '.join(names)}) VALUES ({', '.join(values)})"
+    
+    if is_mysql_dialect:
+        return f"{sql} ON DUPLICATE KEY UPDATE {assignments(conflict_keys)}"
+    
+    keys = ', '.join(quote(k) for k in conflict_keys)
+    sql = f"{sql} ON CONFLICT ({keys}) DO UPDATE SET {assignments(conflict_keys)}"
+    if 'id' in columns and list(conflict_keys) != ['id']:
+        # Mesmo id com outra chave natural (ex.: nome do feriado corrigido): atualiza a linha do id
+        sql += f" ON CONFLICT ({quote('id')}) DO UPDATE SET {assignments([])}"
+    return sql
+
+
+def _upsert_batch(
+    conn: Connection,
+    table: str,
+    names: list,
+    conflict_keys: list,
+    stamps: tuple,
+    rows: list,
+    labels: list
+) -> list:
+    """
+    Grava um lote em uma transação; devolve as linhas que falharam (rótulo, erro)
+    
+    Erros de lock são propagados para que o lote inteiro seja repetido.
+    """
+    sql = _upsert_sql(conn, table, names, conflict_keys, stamps)
+    failures = []
+    
+    try:
+        # Caminho rápido: um executemany para o lote inteiro
+        with conn.begin_nested():
+            conn.exec_driver_sql(sql, rows)
+    except Exception as e:
+        if _is_lock_error(e):
+            raise
+        # Algum registro falhou: isolar linha a linha no mesmo lote
+        for label, row in zip(labels, rows):
+            try:
+                with conn.begin_nested():
+                    conn.exec_driver_sql(sql, row)
+            except Exception as row_error:
+                if _is_lock_error(row_error):
+                    raise
+                failures.append((label, row_error))
+    
+    return failures
+
+
+def bulk_upsert(
+    table: str,
+    columns: Dict[str, list],
+    conflict_keys: list,
+    labels: Optional[list] = None,
+    stamps: tuple = ('createdAt', 'updatedAt'),
+    conn: Optional[Connection] = None,
+    batch_size: int = WRITE_BATCH_SIZE
+) -> int:
+    """
+    Grava várias linhas em lotes, cada lote em uma transação curta
+    
+    Lotes pequenos seguram o lock de escrita do SQLite por pouco tempo, e um
+    lote que encontra o banco ocupado é repetido (ver run_write).
+    
+    Args:
+        table: Nome da tabela
+        columns: Dicionário coluna -> lista de valores (já convertidos)
+        conflict_keys: Chave única natural da tabela (ex.: ['date', 'modelVersion']),
+            usada para detectar registros existentes mesmo com outro id
+        labels: Identificação de cada linha para o relatório de erros
+        stamps: Colunas de auditoria preenchidas com CURRENT_TIMESTAMP
+        conn: Conexão de uma transação já aberta (grava tudo nela, sem lotes)
+        batch_size: Linhas por transação
+    
+    Returns:
+        Número de registros gravados
+    """
+    rows = list(zip(*columns.values()))
+    
+    if not rows:
+        return 0
+    
+    labels = labels or [str(i) for i in range(len(rows))]
+    names = list(columns.keys())
+    failures = []
+    
+    if conn is not None:
+        failures = _upsert_batch(conn, table, names, conflict_keys, stamps, rows, labels)
+    else:
+        for start in range(0, len(rows), batch_size):
+            batch, batch_labels = rows[start:start + batch_size], labels[start:start + batch_size]
+            failures += run_write(
+                lambda c: _upsert_batch(c, table, names, conflict_keys, stamps, batch, batch_labels)
+            )
+    
+    if failures:
+        print(f"   ⚠️  {len(failures)} de {len(rows)} registros com erro em {table}:")
+        for label, error in failures[:5]:
+            print(f"      {label}: {str(error).splitlines()[0]}")
+        if len(failures) > 5:
+            print(f"      ... e mais {len(failures) - 5}")
+    
+    return len(rows) - len(failures)
+
+
 def save_weather_data(df: pd.DataFrame) -> int:
     """
     Salva dados meteorológicos no banco
     """
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
+    if df.empty:
+        return 0
     
-    count = 0
-    for _, row in df.iterrows():
-        try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO weather_data 
-                (id, date, tempMin, tempMax, tempAvg, feelsLikeAvg, 
-                 precipitation, humidity, condition, conditionCode,
-                 windSpeed, windDirection, uvIndex, visibility,
-                 source, city, state, createdAt, updatedAt)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-            """, (
-                f"weather_{row['date'].strftime('%Y%m%d')}",
-                row['date'].strftime('%Y-%m-%d'),
-                row.get('tempMin'),
-                row.get('tempMax'),
-                row.get('tempAvg'),
-                row.get('feelsLikeAvg'),
-                row.get('precipitation', 0),
-                row.get('humidity'),
-                row.get('condition'),
-                row.get('conditionCode'),
-                row.get('windSpeed'),
-                row.get('windDirection'),
-                row.get('uvIndex'),
-                row.get('visibility'),
-                'OPEN_METEO',
-                'Bertioga',
-                'SP'
-            ))
-            count += 1
-        except Exception as e:
-            print(f"Erro ao salvar clima {row['date']}: {e}")
-    
-    conn.commit()
-    conn.close()
-    return count
+    dates = pd.to_datetime(df['date'])
+    
+    return bulk_upsert('weather_data', {
+        'id': ('weather_' + dates.dt.strftime('%Y%m%d')).tolist(),
+        'date': dates.dt.strftime('%Y-%m-%d').tolist(),
+        'tempMin': _numeric_param(df, 'tempMin'),
+        'tempMax': _numeric_param(df, 'tempMax'),
+        'tempAvg': _numeric_param(df, 'tempAvg'),
+        'feelsLikeAvg': _numeric_param(df, 'feelsLikeAvg'),
+        'precipitation': _numeric_param(df, 'precipitation', default=0),
+        'humidity': _numeric_param(df, 'humidity'),
+        'condition': _text_param(df, 'condition'),
+        'conditionCode': _numeric_param(df, 'conditionCode', 'int64'),
+        'windSpeed': _numeric_param(df, 'windSpeed'),
+        'windDirection': _text_param(df, 'windDirection'),
+        'uvIndex': _numeric_param(df, 'uvIndex'),
+        'visibility': _numeric_param(df, 'visibility'),
+        'source': ['OPEN_METEO'] * len(df),
+        'city': ['Bertioga'] * len(df),
+        'state': ['SP'] * len(df),
+    }, conflict_keys=['date'], labels=dates.dt.strftime('%Y-%m-%d').tolist())
 
 
 def save_holidays(holidays: list) -> int:
     """
     Salva feriados no banco
     """
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
+    if not holidays:
+        return 0
     
-    count = 0
-    for h in holidays:
-        try:
-            cursor.execute("""
-                INSERT OR REPLACE INTO calendar_events 
-                (id, name, date, eventType, scope, description, impactExpected, recurring, createdAt, updatedAt)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-            """, (
-                f"holiday_{h['date']}_{h['name'][:20].replace(' ', '_')}",
-                h['name'],
-                h['date'],
-                h.get('eventType', 'HOLIDAY'),
-                h.get('scope', 'NATIONAL'),
-                h.get('description'),
-                h.get('impactExpected', 'MEDIUM'),
-                h.get('recurring', True)
-            ))
-            count += 1
-        except Exception as e:
-            print(f"Erro ao salvar feriado {h['name']}: {e}")
-    
-    conn.commit()
-    conn.close()
-    return count
+    df = pd.DataFrame(holidays)
+    names = df['name'].astype(str)
+    ids = 'holiday_' + df['date'].astype(str) + '_' + names.str[:20].str.replace(' ', '_')
+    
+    return bulk_upsert('calendar_events', {
+        'id': ids.tolist(),
+        'name': names.tolist(),
+        'date': df['date'].astype(str).tolist(),
+        'eventType': _text_param(df, 'eventType', 'HOLIDAY'),
+        'scope': _text_param(df, 'scope', 'NATIONAL'),
+        'description': _text_param(df, 'description'),
+        'impactExpected': _text_param(df, 'impactExpected', 'MEDIUM'),
+        'recurring': _numeric_param(df, 'recurring', 'bool', default=1),
+    }, conflict_keys=['date', 'name'], labels=names.tolist())
 
 
 def save_predictions(predictions: list) -> int:
@@ -275,98 +941,160 @@ def save_predictions(predictions: list) -> int:
     Salva previsões no banco
     
     Args:
-        predictions: Lista de dicts com 'date', 'predictedOrders', 'predictedRevenue'
+        predictions: Lista de dicts com 'date', 'predictedOrders', 'predictedRevenue' e,
+            se o modelo tiver intervalos, 'ordersLower', 'ordersUpper', 'revenueLower',
+            'revenueUpper' e 'confidence' (cobertura medida do intervalo)
     
     Returns:
         Número de registros salvos
     """
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
+    if not predictions:
+        return 0
     
-    count = 0
-    for p in predictions:
-        try:
-            date_str = p['date'].strftime('%Y-%m-%d') if hasattr(p['date'], 'strftime') else str(p['date'])[:10]
-            model_version = p.get('version', 'v1.0.0')
-            cursor.execute("""
-                INSERT OR REPLACE INTO predictions 
-                (id, date, modelVersion, predictedOrders, predictedRevenue, confidence, createdAt)
-                VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-            """, (
-                f"pred_{date_str}_{model_version}",
-                date_str,
-                model_version,
-                float(p['predictedOrders']),
-                float(p['predictedRevenue']),
-                0.85  # Confidence padrão
-            ))
-            count += 1
-        except Exception as e:
-            print(f"Erro ao salvar previsão {p['date']}: {e}")
-    
-    conn.commit()
-    conn.close()
-    return count
-
-
-def save_daily_features(df: pd.DataFrame) -> int:
+    df = pd.DataFrame(predictions)
+    dates = _date_param(df)
+    versions = _text_param(df, 'version', 'v1.0.0')
+    
+    return bulk_upsert('predictions', {
+        'id': [f"pred_{d}_{v}" for d, v in zip(dates, versions)],
+        'date': dates,
+        'modelVersion': versions,
+        'predictedOrders': _numeric_param(df, 'predictedOrders'),
+        'predictedRevenue': _numeric_param(df, 'predictedRevenue'),
+        'ordersLower': _numeric_param(df, 'ordersLower'),
+        'ordersUpper': _numeric_param(df, 'ordersUpper'),
+        'revenueLower': _numeric_param(df, 'revenueLower'),
+        'revenueUpper': _numeric_param(df, 'revenueUpper'),
+        'confidence': _numeric_param(df, 'confidence'),
+    }, conflict_keys=['date', 'modelVersion'], labels=dates, stamps=('createdAt',))
+
+
+def save_daily_features(df: pd.DataFrame, conn: Optional[Connection] = None) -> int:
     """
     Salva features diárias no banco
+    
+    Args:
+        df: Dataset de features (uma linha por dia)
+        conn: Conexão com transação aberta (grava junto com outras operações)
     """
-    conn = get_sqlite_connection()
-    cursor = conn.cursor()
+    if df.empty:
+        return 0
     
-    count = 0
-    for _, row in df.iterrows():
-        try:
-            date_str = row['date'].strftime('%Y-%m-%d') if hasattr(row['date'], 'strftime') else str(row['date'])[:10]
-            cursor.execute("""
-                INSERT OR REPLACE INTO daily_features 
-                (id, date, totalOrders, totalRevenue, avgTicket, totalItems, avgDuration,
-                 counterOrders, tableOrders, deliveryOrders, paidOrders, pendingOrders,
-                 isWeekend, isHoliday, dayOfWeek, dayOfMonth, month, year,
-                 tempMin, tempMax, tempAvg, precipitation, 
-                 nextDayOrders, nextDayRevenue, createdAt, updatedAt)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), datetime('now'))
-            """, (
-                f"feat_{date_str}",
-                date_str,
-                int(row.get('orders', 0)),
-                float(row.get('revenue', 0)),
-                float(row.get('avg_ticket', 0)),
-                int(row.get('total_items', 0)),
-                int(row.get('avg_duration', 0)) if pd.notna(row.get('avg_duration')) else 0,
-                int(row.get('counter_orders', 0)),
-                int(row.get('table_orders', 0)),
-                int(row.get('delivery_orders', 0)),
-                int(row.get('paid_orders', 0)),
-                int(row.get('pending_orders', 0)),
-                1 if row.get('isWeekend', 0) else 0,
-                1 if row.get('isHoliday', 0) else 0,
-                int(row.get('dayOfWeek', 0)),
-                int(row.get('dayOfMonth', 1)),
-                int(row.get('month', 1)),
-                int(row.get('year', 2025)),
-                float(row.get('tempMin')) if pd.notna(row.get('tempMin')) else None,
-                float(row.get('tempMax')) if pd.notna(row.get('tempMax')) else None,
-                float(row.get('tempAvg')) if pd.notna(row.get('tempAvg')) else None,
-                float(row.get('precipitation')) if pd.notna(row.get('precipitation')) else None,
-                int(row.get('next_day_orders')) if pd.notna(row.get('next_day_orders')) else None,
-                float(row.get('next_day_revenue')) if pd.notna(row.get('next_day_revenue')) else None
-            ))
-            count += 1
-        except Exception as e:
-            print(f"Erro ao salvar feature {row.get('date')}: {e}")
-    
-    conn.commit()
-    conn.close()
-    return count
+    dates = _date_param(df)
+    
+    return bulk_upsert('daily_features', {
+        'id': [f"feat_{d}" for d in dates],
+        'date': dates,
+        'totalOrders': _numeric_param(df, 'orders', 'int64', 0),
+        'totalRevenue': _numeric_param(df, 'revenue', default=0.0),
+        'avgTicket': _numeric_param(df, 'avg_ticket', default=0.0),
+        'totalItems': _numeric_param(df, 'total_items', 'int64', 0),
+        'avgDuration': _numeric_param(df, 'avg_duration', 'int64', 0),
+        'counterOrders': _numeric_param(df, 'counter_orders', 'int64', 0),
+        'tableOrders': _numeric_param(df, 'table_orders', 'int64', 0),
+        'deliveryOrders': _numeric_param(df, 'delivery_orders', 'int64', 0),
+        'paidOrders': _numeric_param(df, 'paid_orders', 'int64', 0),
+        'pendingOrders': _numeric_param(df, 'pending_orders', 'int64', 0),
+        'isWeekend': _numeric_param(df, 'isWeekend', 'bool', 0),
+        'isHoliday': _numeric_param(df, 'isHoliday', 'bool', 0),
+        'dayOfWeek': _numeric_param(df, 'dayOfWeek', 'int64', 0),
+        'dayOfMonth': _numeric_param(df, 'dayOfMonth', 'int64', 1),
+        'month': _numeric_param(df, 'month', 'int64', 1),
+        'year': _numeric_param(df, 'year', 'int64', 2025),
+        'tempMin': _numeric_param(df, 'tempMin'),
+        'tempMax': _numeric_param(df, 'tempMax'),
+        'tempAvg': _numeric_param(df, 'tempAvg'),
+        'precipitation': _numeric_param(df, 'precipitation'),
+        'nextDayOrders': _numeric_param(df, 'next_day_orders', 'int64'),
+        'nextDayRevenue': _numeric_param(df, 'next_day_revenue'),
+    }, conflict_keys=['date'], labels=dates, conn=conn)
+
+
+def check_mixed_datetimes() -> None:
+    """
+    Confere dia local e filtro por dia numa sales_orders em memória (SQLite)
+
+    Pedidos perto da virada do dia local gravados em epoch ms, em texto ISO
+    UTC (com espaço ou 'T'/'Z') e em ISO com o fuso da pizzaria, em tabelas
+    só epoch, só ISO e misturada. Para cada uma: sales_day_expr, sales_hour_expr,
+    opened_at_range e _to_local_datetime dão o dia/hora local esperado, e o
+    EXPLAIN QUERY PLAN do filtro busca pelo índice de openedAt (SEARCH, não
+    SCAN) em cada ramo do OR.
+
+    Raises:
+        AssertionError: Se algum resultado ou plano não bater
+    """
+    offset = _utc_offset()
+    # Horários locais: véspera, logo depois da meia-noite, antes e depois das 21h, madrugada seguinte
+    local = pd.to_datetime([
+        '2025-03-10 23:30:00', '2025-03-11 00:30:00', '2025-03-11 20:59:00',
+        '2025-03-11 21:30:00', '2025-03-11 23:59:59', '2025-03-12 00:00:01',
+    ])
+    utc = local - offset
+    formats = {
+        'epoch': lambda t, _: int(t.value // 1_000_000),
+        'iso': lambda t, _: t.strftime('%Y-%m-%d %H:%M:%S'),
+        'iso_z': lambda t, _: t.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+        'iso_offset': lambda _, t: t.strftime('%Y-%m-%dT%H:%M:%S') + DB_TIMEZONE_OFFSET,
+    }
+    tables = {
+        'epoch': ['epoch'] * len(local),
+        'iso': ['iso', 'iso_z'] * (len(local) // 2),
+        'mixed': [list(formats)[i % len(formats)] for i in range(len(local))],
+    }
+    expected_days = local.strftime('%Y-%m-%d').tolist()
+
+    for name, kinds in tables.items():
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE TABLE sales_orders (id TEXT PRIMARY KEY, openedAt DATETIME NOT NULL)')
+        conn.execute('CREATE INDEX sales_orders_openedAt_idx ON sales_orders(openedAt)')
+        values = [formats[kind](u, loc) for kind, u, loc in zip(kinds, utc, local)]
+        conn.executemany('INSERT INTO sales_orders VALUES (?, ?)', [(str(i), v) for i, v in enumerate(values)])
+
+        days = [row[0] for row in conn.execute(f"SELECT {sales_day_expr()} FROM sales_orders ORDER BY CAST(id AS INTEGER)")]
+        assert days == expected_days, f"{name}: sales_day_expr {days} != {expected_days}"
+        hours = [row[0] for row in conn.execute(f"SELECT {sales_hour_expr()} FROM sales_orders ORDER BY CAST(id AS INTEGER)")]
+        assert hours == local.hour.tolist(), f"{name}: sales_hour_expr {hours} != {local.hour.tolist()}"
+
+        parsed = _to_local_datetime(pd.Series(values, dtype=object))
+        assert (parsed.dt.floor('s') == local).all(), f"{name}: _to_local_datetime {parsed.tolist()}"
+
+        for start, end in (('2025-03-11', '2025-03-11'), ('2025-03-11', None), (None, '2025-03-11')):
+            predicate, params = opened_at_range(start, end)
+            query = f"SELECT id FROM sales_orders WHERE {predicate}"
+            found = sorted(int(row[0]) for row in conn.execute(query, params))
+            wanted = [i for i, day in enumerate(expected_days)
+                      if (start is None or day >= start) and (end is None or day <= end)]
+            assert found == wanted, f"{name} [{start}, {end}]: {found} != {wanted}"
+
+            plan = [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params)]
+            steps = [step for step in plan if 'sales_orders' in step]
+            assert len(steps) == 2 and all(
+                step.startswith('SEARCH') and 'sales_orders_openedAt_idx' in step for step in steps
+            ), f"{name} [{start}, {end}]: plano sem o índice em cada ramo: {plan}"
+        conn.close()
 
 
 if __name__ == "__main__":
     # Teste
+    if not is_mysql():
+        print("🕛 Conferindo dia local de DateTime em epoch ms, ISO e misturado...")
+        check_mixed_datetimes()
+        print("   ✅ dias, horas, filtro por dia e índice de openedAt")
+    
     print("📊 Testando conexão com banco de dados...")
     
+    print(f"   Banco: {get_engine().dialect.name}")
+    
+    predicate, params = opened_at_range('2025-01-01', '2025-01-31')
+    plan = explain_query_plan(
+        f"SELECT id FROM sales_orders WHERE deletedAt IS NULL AND {predicate}", params
+    )
+    uses_index = all('sales_orders_openedAt_idx' in step for step in plan if 'sales_orders' in step)
+    print(f"\n🔎 Índice de openedAt no filtro por data: {'✅ usado' if uses_index else '❌ não usado'}")
+    for step in plan:
+        print(f"   {step}")
+    
     sales = get_daily_sales_summary()
     print(f"\n📈 Vendas diárias: {len(sales)} dias")
     print(sales.head())
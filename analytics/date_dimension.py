@@ -0,0 +1,257 @@
+"""
+Dimensão de datas pré-calculada (calendário, temporada e feriados)
+
+Uma linha por dia, indexada por um inteiro (dias desde 1970-01-01), com
+todas as colunas de calendário e de feriados em tipos compactos. Histórico
+e dias futuros recebem as features pelo mesmo join por posição, em vez de
+recalcular cada coluna. A tabela é salva em data/ e só é refeita quando o
+calendário de feriados (ou o intervalo de anos) muda.
+"""
+import hashlib
+import json
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from config import DATA_DIR, DATE_DIMENSION_END_YEAR, DATE_DIMENSION_START_YEAR
+
+
+# Mudar quando as colunas ou regras da dimensão mudarem (invalida o arquivo salvo)
+DIMENSION_SCHEMA = 1
+
+CALENDAR_COLUMNS = [
+    'dayOfWeek', 'dayOfMonth', 'month', 'year', 'weekOfYear', 'quarter',
+    'isWeekend', 'isFriday', 'isSaturday', 'isSunday',
+    'isStartOfMonth', 'isEndOfMonth',
+    'isSummer', 'isWinter', 'isHighSeason',
+]
+
+HOLIDAY_COLUMNS = [
+    'isHoliday', 'holidayType', 'holidayScope', 'holidayImpact',
+    'daysToHoliday', 'daysFromHoliday',
+]
+
+IMPACT_MAP = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
+
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+
+def holiday_distances(
+    dates: pd.Series,
+    holiday_dates: pd.Series,
+    missing: int = 99
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dias até o próximo feriado e desde o último para cada data
+
+    Usa busca binária (np.searchsorted) sobre os feriados ordenados: O(n log h)
+    para a coluna inteira, em vez de percorrer todos os feriados a cada dia.
+    O próprio dia do feriado não conta (próximo = depois, último = antes).
+
+    Args:
+        dates: Datas a consultar
+        holiday_dates: Datas dos feriados (em qualquer ordem, com repetições)
+        missing: Valor quando não há feriado antes/depois
+
+    Returns:
+        Tupla (daysToHoliday, daysFromHoliday)
+    """
+    days = pd.to_datetime(pd.Series(dates)).dt.normalize().to_numpy(dtype='datetime64[D]')
+    holidays = np.unique(pd.to_datetime(pd.Series(holiday_dates)).dt.normalize().to_numpy(dtype='datetime64[D]'))
+
+    if len(holidays) == 0:
+        return np.full(len(days), missing), np.full(len(days), missing)
+
+    # Primeiro feriado depois do dia / último feriado antes do dia
+    after = np.searchsorted(holidays, days, side='right')
+    before = np.searchsorted(holidays, days, side='left') - 1
+
+    to_next = (holidays[np.minimum(after, len(holidays) - 1)] - days).astype(int)
+    from_last = (days - holidays[np.maximum(before, 0)]).astype(int)
+
+    return (
+        np.where(after < len(holidays), to_next, missing),
+        np.where(before >= 0, from_last, missing),
+    )
+
+
+def day_keys(dates: pd.Series) -> np.ndarray:
+    """Chave inteira do dia (dias desde 1970-01-01)"""
+    days = pd.to_datetime(pd.Series(dates)).dt.normalize().to_numpy(dtype='datetime64[D]')
+    return (days - EPOCH).astype('int32')
+
+
+def _holidays_by_day(holidays: pd.DataFrame) -> pd.DataFrame:
+    """
+    Um feriado por dia: quando há mais de um evento na mesma data, vale o de maior impacto
+    """
+    if holidays.empty:
+        return pd.DataFrame(columns=['date', 'eventType', 'scope', 'impact'])
+
+    events = holidays[['date', 'eventType', 'scope', 'impactExpected']].assign(
+        date=pd.to_datetime(holidays['date']).dt.normalize(),
+        impact=holidays['impactExpected'].map(IMPACT_MAP).fillna(0),
+    )
+    events = events.sort_values(['date', 'impact'], ascending=[True, False], kind='stable')
+
+    return events.drop_duplicates('date')[['date', 'eventType', 'scope', 'impact']]
+
+
+def build_date_dimension(holidays: pd.DataFrame, start_year: int, end_year: int) -> pd.DataFrame:
+    """
+    Monta a dimensão de datas de start_year a end_year (inclusive)
+
+    Args:
+        holidays: Eventos de calendar_events (date, eventType, scope, impactExpected)
+        start_year: Primeiro ano
+        end_year: Último ano
+
+    Returns:
+        DataFrame com dayKey, date e as colunas de CALENDAR_COLUMNS + HOLIDAY_COLUMNS
+    """
+    dates = pd.Series(pd.date_range(f"{start_year}-01-01", f"{end_year}-12-31", freq='D'))
+
+    day_of_week = dates.dt.dayofweek
+    day_of_month = dates.dt.day
+    month = dates.dt.month
+
+    dim = pd.DataFrame({
+        'dayKey': day_keys(dates),
+        'date': dates,
+        'dayOfWeek': day_of_week.astype('int8'),  # 0=Segunda, 6=Domingo
+        'dayOfMonth': day_of_month.astype('int8'),
+        'month': month.astype('int8'),
+        'year': dates.dt.year.astype('int16'),
+        'weekOfYear': dates.dt.isocalendar().week.astype('int8').to_numpy(),
+        'quarter': dates.dt.quarter.astype('int8'),
+        # Flags úteis
+        'isWeekend': day_of_week.isin([5, 6]).astype('int8'),  # Sáb e Dom
+        'isFriday': (day_of_week == 4).astype('int8'),
+        'isSaturday': (day_of_week == 5).astype('int8'),
+        'isSunday': (day_of_week == 6).astype('int8'),
+        # Início/fim do mês
+        'isStartOfMonth': (day_of_month <= 5).astype('int8'),
+        'isEndOfMonth': (day_of_month >= 25).astype('int8'),
+        # Temporadas (Bertioga - cidade litorânea): verão Dez-Fev, inverno Jun-Ago (férias)
+        'isSummer': month.isin([12, 1, 2]).astype('int8'),
+        'isWinter': month.isin([6, 7, 8]).astype('int8'),
+    })
+    dim['isHighSeason'] = (dim['isSummer'] | dim['isWinter']).astype('int8')
+
+    # Feriados
+    by_day = _holidays_by_day(holidays)
+    matched = dim[['date']].merge(by_day, on='date', how='left')
+
+    dim['isHoliday'] = matched['impact'].notna().astype('int8').to_numpy()
+    dim['holidayType'] = pd.Categorical(matched['eventType'])
+    dim['holidayScope'] = pd.Categorical(matched['scope'])
+    dim['holidayImpact'] = matched['impact'].fillna(0).astype('float32').to_numpy()
+
+    holiday_dates = holidays['date'] if not holidays.empty else pd.Series([], dtype='datetime64[ns]')
+    to_next, from_last = holiday_distances(dates, holiday_dates)
+    dim['daysToHoliday'] = to_next.astype('int16')
+    dim['daysFromHoliday'] = from_last.astype('int16')
+
+    return dim
+
+
+def calendar_version(holidays: pd.DataFrame, start_year: int, end_year: int) -> str:
+    """Versão da dimensão: muda com o calendário de feriados, o intervalo ou o schema"""
+    if holidays.empty:
+        rows = []
+    else:
+        events = holidays[['date', 'name', 'eventType', 'scope', 'impactExpected']].astype(str)
+        rows = sorted(map(tuple, events.to_numpy()))
+
+    payload = json.dumps([DIMENSION_SCHEMA, start_year, end_year, rows])
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def load_date_dimension(
+    holidays: pd.DataFrame,
+    start_year: Optional[int] = None,
+    end_year: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Dimensão de datas do disco (mesma versão do calendário) ou recém-construída
+
+    Args:
+        holidays: Eventos de calendar_events
+        start_year: Primeiro ano (padrão: DATE_DIMENSION_START_YEAR)
+        end_year: Último ano (padrão: DATE_DIMENSION_END_YEAR)
+    """
+    start_year = start_year or DATE_DIMENSION_START_YEAR
+    end_year = end_year or DATE_DIMENSION_END_YEAR
+
+    # Um arquivo por intervalo de anos: quem pede outro intervalo não apaga este
+    version = calendar_version(holidays, start_year, end_year)
+    prefix = f"date_dimension_{start_year}_{end_year}_"
+    path = DATA_DIR / f"{prefix}{version}.feather"
+
+    if path.exists():
+        try:
+            return feather.read_table(path, memory_map=True).to_pandas()
+        except (OSError, pa.ArrowInvalid):
+            pass
+
+    dim = build_date_dimension(holidays, start_year, end_year)
+
+    # Gravação atômica: outro processo lendo o arquivo nunca vê uma tabela pela metade
+    tmp = path.with_suffix('.tmp')
+    feather.write_feather(dim, tmp, compression='uncompressed')
+    os.replace(tmp, path)
+
+    # Versões antigas do calendário no mesmo intervalo não são mais usadas
+    for old in DATA_DIR.glob(f"{prefix}*.feather"):
+        if old != path:
+            old.unlink(missing_ok=True)
+
+    return dim
+
+
+def join_date_dimension(
+    df: pd.DataFrame,
+    dim: pd.DataFrame,
+    columns: Optional[List[str]] = None
+) -> pd.DataFrame:
+    """
+    Adiciona as colunas da dimensão a df pela chave inteira do dia
+
+    A dimensão é contínua e ordenada, então a linha de cada dia é achada por
+    posição (dayKey - primeiro dayKey), sem merge por data.
+
+    Args:
+        df: DataFrame com coluna 'date'
+        dim: Dimensão de datas (load_date_dimension)
+        columns: Colunas a trazer (padrão: calendário + feriados)
+    """
+    columns = columns or CALENDAR_COLUMNS + HOLIDAY_COLUMNS
+    positions = day_keys(df['date']) - int(dim['dayKey'].iat[0])
+
+    if len(positions) and (positions.min() < 0 or positions.max() >= len(dim)):
+        raise ValueError(
+            f"Datas fora da dimensão ({dim['date'].iat[0]:%Y-%m-%d} a {dim['date'].iat[-1]:%Y-%m-%d})"
+        )
+
+    rows = dim[columns].take(positions)
+    rows.index = df.index
+
+    return pd.concat([df.drop(columns=columns, errors='ignore'), rows], axis=1)
+
+
+if __name__ == "__main__":
+    from database import get_holidays
+
+    print("📅 Dimensão de datas...")
+
+    holidays = get_holidays()
+    dim = load_date_dimension(holidays)
+
+    print(f"   ✅ {len(dim)} dias ({dim['date'].iat[0]:%Y-%m-%d} a {dim['date'].iat[-1]:%Y-%m-%d})")
+    print(f"   🎉 {int(dim['isHoliday'].sum())} dias de feriado")
+    print(f"   💾 {dim.memory_usage(deep=True).sum() / 1024:.0f} KB em memória")
+    print(f"   🔖 Versão do calendário: {calendar_version(holidays, DATE_DIMENSION_START_YEAR, DATE_DIMENSION_END_YEAR)}")
@@ -1,63 +1,427 @@
 """
-Modelo de Previsão de Demanda usando Prophet e Ensemble
+Modelo de Previsão de Demanda usando Gradient Boosting
+
+Modelo direto de múltiplos horizontes: cada exemplo de treino é um par (dia
+de origem, horizonte h) com os lags conhecidos na origem, o calendário e o
+clima do dia previsto e o próprio h. Os FORECAST_DAYS dias saem de uma única
+chamada ao modelo, cada um com suas features.
+
+O estimador é plugável (ESTIMATOR_BACKENDS): 'hist' (histogramas, multi-thread,
+padrão) ou 'classic' (GradientBoostingRegressor). Pedidos e receita são
+treinados ao mesmo tempo.
 """
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, Iterable, List
+import os
 import pickle
+import time
 from pathlib import Path
 
 # ML
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+from joblib import Parallel, delayed
+from threadpoolctl import threadpool_info, threadpool_limits
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.inspection import permutation_importance
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import TimeSeriesSplit
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 
-from config import MODELS_DIR, MODEL_VERSION, FORECAST_DAYS
-from feature_engineering import create_feature_dataset, get_feature_columns
+from config import MODELS_DIR, MODEL_BACKEND, MODEL_VERSION, FORECAST_DAYS
+from data_context import DataContext
+from date_dimension import join_date_dimension
+from feature_engineering import (
+    FEATURE_REGISTRY, create_feature_dataset, get_date_dimension, lagged_columns, raw_inputs_fingerprint
+)
+from feature_store import dataset_fingerprint
+from model_registry import open_model, register_model
+
+
+def _hist_booster(**params) -> HistGradientBoostingRegressor:
+    """Boosting por histogramas: usa todos os núcleos (OpenMP) e escala com anos de histórico"""
+    settings = {
+        'max_iter': 100,
+        'max_depth': 2,  # árvores rasas: com poucos meses, mais fundo decora o teste (benchmarks.py backends)
+        'learning_rate': 0.1,
+        'min_samples_leaf': 5,  # padrão (20) é grosso demais para poucos meses de histórico
+        'early_stopping': False,  # a validação interna seria um corte aleatório, não temporal
+        'random_state': 42,
+    }
+    return HistGradientBoostingRegressor(**{**settings, **params})
+
+
+def _classic_booster(**params) -> GradientBoostingRegressor:
+    """Gradient Boosting clássico (uma thread), o modelo original"""
+    settings = {
+        'n_estimators': 100,
+        'max_depth': 5,
+        'learning_rate': 0.1,
+        'random_state': 42,
+    }
+    return GradientBoostingRegressor(**{**settings, **params})
+
+
+# Backend -> função que cria um estimador novo (um por alvo; parâmetros sobrescrevem os padrões)
+ESTIMATOR_BACKENDS = {
+    'hist': _hist_booster,
+    'classic': _classic_booster,
+}
+
+# Parâmetro de cada backend com o número de iterações (árvores) do boosting
+ITERATION_PARAMS = {'hist': 'max_iter', 'classic': 'n_estimators'}
+
+# Treino incremental: dias anteriores aos novos que entram na janela, árvores por dia novo
+# (com teto) e configuração das árvores acrescentadas (rasas, passo menor)
+INCREMENT_WINDOW_DAYS = 28
+TREES_PER_NEW_DAY = 5
+MAX_INCREMENT_TREES = 50
+INCREMENT_PARAMS = {'learning_rate': 0.05, 'max_depth': 3, 'min_samples_leaf': 10}
+
+# Intervalos de previsão (split conformal): cobertura nominal e blocos de dias da
+# validação cruzada que mede a cobertura real da calibração
+INTERVAL_LEVEL = 0.95
+COVERAGE_FOLDS = 5
+
+
+def regression_metrics(y_true, y_pred) -> Dict[str, float]:
+    """MAE, RMSE, R² e MAPE (%) de uma previsão (MAPE ignora dias com valor real zero)"""
+    y_true = np.asarray(y_true, dtype='float64')
+    y_pred = np.asarray(y_pred, dtype='float64')
+    nonzero = y_true != 0
+    
+    return {
+        'mae': mean_absolute_error(y_true, y_pred),
+        'rmse': np.sqrt(mean_squared_error(y_true, y_pred)),
+        'r2': r2_score(y_true, y_pred),
+        'mape': np.mean(np.abs((y_true[nonzero] - y_pred[nonzero]) / y_true[nonzero])) * 100
+    }
+
+
+def _conformal_quantile(errors: np.ndarray, level: float, samples: Optional[int] = None) -> float:
+    """
+    Quantil dos erros absolutos com a correção de amostra finita do split conformal
+    
+    `samples` é o número de amostras independentes entre os erros (padrão: cada
+    erro é uma); a correção usa esse número e o posto é escalado para os erros.
+    """
+    errors = np.sort(errors)
+    samples = samples or len(errors)
+    rank = int(np.ceil((samples + 1) * level))
+    rank = min(-(-rank * len(errors) // samples), len(errors))
+    return float(errors[rank - 1])
+
+
+def calibrate_intervals(
+    residuals: np.ndarray,
+    horizons: np.ndarray,
+    dates: np.ndarray,
+    horizon: int,
+    level: float = INTERVAL_LEVEL
+) -> np.ndarray:
+    """
+    Meia largura do intervalo por horizonte × dia da semana (split conformal normalizado)
+    
+    Os resíduos (real - previsto) vêm de dias que o modelo não viu no treino
+    (calibração). A escala de cada célula é o erro médio do horizonte vezes o
+    peso do dia da semana (erro médio do dia / erro médio geral), estimados
+    com todos os dias de cada margem; o quantil conformal sai dos erros
+    divididos pela escala de todas as células juntas, então usa todos os dias
+    de calibração e a largura ainda varia por horizonte e dia da semana. A
+    correção de amostra finita conta dias, não linhas: as linhas de um mesmo
+    dia (uma por horizonte) erram juntas. Com menos dias que level / (1 -
+    level) (19 com 95%), a tabela é o maior erro em todas as células e a
+    cobertura fica abaixo de `level` (ver interval_coverage).
+    
+    Returns:
+        Array (horizon, 7): previsão ± tabela[h - 1, dia da semana]
+    """
+    errors = np.abs(np.asarray(residuals, dtype='float64'))
+    horizons = np.asarray(horizons, dtype=int)
+    dates = pd.DatetimeIndex(dates)
+    weekdays = dates.dayofweek.to_numpy()
+    days = dates.nunique()
+    overall = errors.mean()
+    if overall == 0:
+        return np.zeros((horizon, 7))
+    
+    # Poucos dias: o quantil já seria o maior erro e as escalas sairiam de um ou dois dias
+    if days < np.ceil(level / (1 - level)):
+        return np.full((horizon, 7), errors.max())
+    
+    # Margens sem erro (ou sem dias) ficam com a escala geral
+    by_horizon = pd.Series(errors).groupby(horizons).mean().reindex(range(1, horizon + 1))
+    by_weekday = pd.Series(errors).groupby(weekdays).mean().reindex(range(7)) / overall
+    scale = np.outer(
+        by_horizon.where(by_horizon > 0, overall).to_numpy(),
+        by_weekday.where(by_weekday > 0, 1.0).to_numpy()
+    )
+    return _conformal_quantile(errors / scale[horizons - 1, weekdays], level, days) * scale
+
+
+def interval_coverage(
+    residuals: np.ndarray,
+    horizons: np.ndarray,
+    dates: np.ndarray,
+    horizon: int,
+    level: float = INTERVAL_LEVEL,
+    folds: int = COVERAGE_FOLDS
+) -> float:
+    """
+    Cobertura real dos intervalos, medida por validação cruzada na calibração
+    
+    Os dias de calibração viram `folds` blocos consecutivos; cada bloco é
+    coberto pela tabela calibrada nos demais. Conta linhas (pares dia ×
+    horizonte), como a cobertura da validação cruzada do modelo.
+    
+    Returns:
+        Fração (0-1) dos valores reais dentro do intervalo
+    """
+    residuals = np.asarray(residuals, dtype='float64')
+    horizons = np.asarray(horizons, dtype=int)
+    dates = np.asarray(dates)
+    days = np.unique(dates)
+    blocks = np.array_split(days, min(folds, len(days)))
+    
+    covered = []
+    for block in blocks:
+        held_out = np.isin(dates, block)
+        table = calibrate_intervals(residuals[~held_out], horizons[~held_out], dates[~held_out], horizon, level)
+        weekdays = pd.DatetimeIndex(dates[held_out]).dayofweek
+        covered.append(np.abs(residuals[held_out]) <= table[horizons[held_out] - 1, weekdays])
+    return float(np.concatenate(covered).mean())
+
+
+def check_interval_coverage(seed: int = 0, trials: int = 50, tolerance: float = 0.02) -> float:
+    """
+    Confere em dados sintéticos que calibrate_intervals atinge o nível nominal
+    
+    Resíduos com escala por horizonte e dia da semana e um choque comum a todas
+    as linhas do mesmo dia previsto (como os erros do modelo). Cada tentativa
+    calibra uma tabela em 120 dias e a avalia em outro ano; a garantia do
+    split conformal vale na média das calibrações, então a média das
+    tentativas precisa ficar acima de INTERVAL_LEVEL - tolerance em cada
+    horizonte e dia da semana (AssertionError se não). interval_coverage, a
+    estimativa gravada no treino, não pode errar a média por mais que tolerance.
+    
+    Returns:
+        Cobertura média nos dias de avaliação
+    """
+    rng = np.random.default_rng(seed)
+    horizon = FORECAST_DAYS
+    
+    def sample(days: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        targets = pd.date_range('2024-01-01', periods=days).to_numpy()
+        horizons = np.tile(np.arange(1, horizon + 1), days)
+        dates = np.repeat(targets, horizon)
+        scale = (1 + 0.15 * horizons) * (1 + 0.5 * (pd.DatetimeIndex(dates).dayofweek >= 4))
+        shock = np.repeat(rng.standard_normal(days), horizon)
+        residuals = scale * (0.7 * shock + 0.7 * rng.standard_normal(len(dates)))
+        return residuals, horizons, dates
+    
+    by_horizon, by_weekday, estimates = [], [], []
+    for _ in range(trials):
+        calibration = sample(120)
+        table = calibrate_intervals(*calibration, horizon)
+        estimates.append(interval_coverage(*calibration, horizon))
+        
+        residuals, horizons, dates = sample(365)
+        weekdays = pd.DatetimeIndex(dates).dayofweek
+        covered = pd.Series(np.abs(residuals) <= table[horizons - 1, weekdays])
+        by_horizon.append(covered.groupby(horizons).mean())
+        by_weekday.append(covered.groupby(weekdays).mean())
+    
+    coverage = np.mean(by_horizon)
+    worst = min(np.mean(by_horizon, axis=0).min(), np.mean(by_weekday, axis=0).min())
+    assert worst >= INTERVAL_LEVEL - tolerance, f"cobertura {worst:.1%} abaixo de {INTERVAL_LEVEL:.0%}"
+    assert abs(np.mean(estimates) - coverage) <= tolerance, \
+        f"cobertura estimada {np.mean(estimates):.1%}, real {coverage:.1%}"
+    return float(coverage)
+
+
+def apply_intervals(
+    table: np.ndarray,
+    predictions: np.ndarray,
+    horizons: np.ndarray,
+    dates: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Limites inferior (>= 0) e superior de cada previsão (uma consulta à tabela por linha)"""
+    weekdays = pd.DatetimeIndex(dates).dayofweek
+    half_width = np.asarray(table)[np.asarray(horizons, dtype=int) - 1, weekdays]
+    return np.maximum(predictions - half_width, 0), predictions + half_width
+
+
+def _openmp_threads() -> int:
+    """Threads OpenMP da thread atual (já com um threadpool_limits de fora, se houver)"""
+    return max(
+        (lib['num_threads'] for lib in threadpool_info() if lib['user_api'] == 'openmp'),
+        default=os.cpu_count() or 1
+    )
+
+
+def _fit_timed(model, X: np.ndarray, y: pd.Series, threads: Optional[int] = None) -> Tuple[Any, float]:
+    """
+    Treina um estimador e mede o tempo (roda em uma thread do joblib)
+    
+    threads limita o OpenMP do treino (None = sem limite): o limite vale só
+    para a thread que treina, então dois treinos simultâneos não disputam
+    os mesmos núcleos.
+    """
+    start = time.perf_counter()
+    with threadpool_limits(limits=threads, user_api='openmp'):
+        model.fit(X, y)
+    return model, time.perf_counter() - start
+
+
+def _importances(model, X: np.ndarray, y: pd.Series) -> np.ndarray:
+    """
+    Importância das features: a do próprio modelo ou, se ele não tiver
+    (boosting por histogramas), a por permutação no conjunto de teste
+    """
+    if hasattr(model, 'feature_importances_'):
+        return model.feature_importances_
+    
+    # Amostra de até 500 linhas: a importância é só um resumo e não deve custar mais que o treino
+    result = permutation_importance(
+        model, X, y, n_repeats=3, max_samples=min(1.0, 500 / max(len(X), 1)), random_state=42
+    )
+    values = np.clip(result.importances_mean, 0, None)
+    total = values.sum()
+    return values / total if total > 0 else values
+
+
+class IncrementalBooster:
+    """
+    Estimador do último treino completo + correções dos treinos incrementais
+    
+    Cada correção é um boosting pequeno ajustado ao resíduo do conjunto na
+    janela recente: é a continuação do boosting (mais árvores) sem refazer as
+    antigas. O warm_start do HistGradientBoosting não serve aqui porque ele
+    refaz a discretização (bins) com os dados novos e calcularia o resíduo das
+    árvores antigas com bins errados.
+    """
+    
+    def __init__(self, base, corrections: Optional[List] = None):
+        self.base = base
+        self.corrections = list(corrections or [])
+    
+    def predict(self, X) -> np.ndarray:
+        pred = self.base.predict(X)
+        for correction in self.corrections:
+            pred = pred + correction.predict(X)
+        return pred
+    
+    def extended(self, correction) -> 'IncrementalBooster':
+        return IncrementalBooster(self.base, self.corrections + [correction])
+
+
+def _artifact_attribute(name: str) -> property:
+    """Atributo lido do registro de modelos só quando é usado (modelo carregado com load())"""
+    private = f"_{name}"
+    
+    def getter(self):
+        if getattr(self, private) is None and self._artifact is not None:
+            setattr(self, private, self._artifact.load(name))
+        return getattr(self, private)
+    
+    def setter(self, value):
+        setattr(self, private, value)
+    
+    return property(getter, setter)
 
 
 class DemandForecaster:
     """
     Modelo de previsão de demanda para pizzaria
-    Combina Prophet para séries temporais + Random Forest para features
+    Gradient Boosting direto de múltiplos horizontes (um modelo por alvo)
     """
     
-    def __init__(self, model_version: str = MODEL_VERSION):
+    # Grupos do registro de features usados pelo modelo e colunas-alvo (valor do dia previsto)
+    FEATURE_GROUPS = ('calendar', 'holiday', 'weather', 'lag_orders', 'lag_revenue')
+    TARGET_COLUMNS = ('orders', 'revenue')
+    
+    # Entrada extra do modelo: dias entre a origem e o dia previsto
+    HORIZON_COLUMN = 'horizon'
+    
+    # Componentes gravados no registro de modelos (carregados sob demanda)
+    ARTIFACT_COMPONENTS = ('scaler', 'model_orders', 'model_revenue')
+    scaler = _artifact_attribute('scaler')
+    model_orders = _artifact_attribute('model_orders')
+    model_revenue = _artifact_attribute('model_revenue')
+    
+    def __init__(
+        self,
+        model_version: str = MODEL_VERSION,
+        horizon: int = FORECAST_DAYS,
+        backend: str = MODEL_BACKEND,
+        params: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        if backend not in ESTIMATOR_BACKENDS:
+            raise ValueError(f"Backend desconhecido: {backend} (opções: {', '.join(ESTIMATOR_BACKENDS)})")
+        
         self.model_version = model_version
+        self.horizon = horizon
+        self.backend = backend
+        # Hiperparâmetros por alvo ('orders', 'revenue'), ex.: os vencedores do tuning
+        self.params = params or {}
+        # Modelo do registro (model_registry.ModelArtifact) de onde vêm os componentes
+        self._artifact = None
+        self.model_id = None
         self.model_orders = None
         self.model_revenue = None
         self.scaler = StandardScaler()
         self.feature_columns = []
         self.metrics = {}
+        # Id do snapshot do feature_store usado no treino (reprodução/re-score)
+        self.feature_snapshot = None
+        # Fingerprint e período dos dados de treino
+        self.training_data = {}
+        # Origem do modelo: treino completo ou incremental, modelo base e dias novos
+        self.lineage = {}
+        # Tempo de treino (s) por alvo e total, e importância das features por alvo
+        self.fit_seconds = {}
+        self.importances = {}
+        # Intervalos de previsão: nível, cobertura medida e tabela de deslocamentos por alvo (calibrate_intervals)
+        self.intervals = {}
         
+    def model_features(self) -> List[str]:
+        """
+        Features de entrada do modelo (fonte única da seleção de features)
+        
+        Modelo carregado: as colunas usadas no treino. Senão: as features dos
+        grupos de FEATURE_GROUPS no registro.
+        """
+        if self.feature_columns:
+            return list(self.feature_columns)
+        return [col for group in self.FEATURE_GROUPS for col in FEATURE_REGISTRY[group].features]
+    
+    def required_columns(self) -> List[str]:
+        """Colunas a pedir para create_feature_dataset (features + alvos)"""
+        return self.model_features() + list(self.TARGET_COLUMNS)
+    
+    def input_columns(self) -> List[str]:
+        """Colunas de entrada do modelo, na ordem do treino (features + horizonte)"""
+        return self.model_features() + [self.HORIZON_COLUMN]
+    
     def prepare_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
         """
-        Prepara dados para treino/teste
+        Prepara dados para treino/teste: um exemplo por dia de origem × horizonte
         """
-        df = df.copy()
         df = df.sort_values('date')
         
-        # Remover linhas com NaN no target
-        df = df.dropna(subset=['next_day_orders', 'next_day_revenue'])
-        
         # Selecionar features
-        feature_cols = get_feature_columns()
+        features = self.model_features()
+        missing = set(features) - set(df.columns)
+        if missing:
+            raise ValueError(f"Features faltando no dataset: {missing}")
         
-        # Usar apenas features disponíveis
-        available_features = []
-        for category in ['calendar', 'holiday', 'weather', 'lag_orders', 'lag_revenue']:
-            for col in feature_cols.get(category, []):
-                if col in df.columns:
-                    available_features.append(col)
+        self.feature_columns = features
         
-        self.feature_columns = available_features
+        stacked = stack_horizons(df, features, list(self.TARGET_COLUMNS), range(1, self.horizon + 1))
         
-        # Remover linhas com NaN nas features
-        df = df.dropna(subset=available_features)
+        # Remover exemplos com NaN nas features ou no target
+        stacked = stacked.dropna(subset=self.input_columns() + list(self.TARGET_COLUMNS))
         
-        return df, df[available_features]
+        return stacked, stacked[self.input_columns()]
     
     def train(self, df: pd.DataFrame, test_size: float = 0.2) -> Dict[str, float]:
         """
@@ -72,77 +436,108 @@ class DemandForecaster:
         """
         print("🎯 Treinando modelos de previsão...")
         
+        # Dataset vindo do feature_store: guardar o id para reproduzir o treino
+        self.feature_snapshot = df.attrs.get('feature_snapshot')
+        self.training_data = describe_training_data(df)
+        self.lineage = {
+            'mode': 'full',
+            'full_refit_end_date': self.training_data['end_date'],
+            'increments': 0,
+        }
+        
         # Preparar dados
         df_clean, X = self.prepare_data(df)
         
-        y_orders = df_clean['next_day_orders']
-        y_revenue = df_clean['next_day_revenue']
+        y_orders = df_clean['orders']
+        y_revenue = df_clean['revenue']
+        
+        # Split temporal (não aleatório!) pelo dia previsto: nenhum alvo do teste entra no treino
+        target_days = np.sort(df_clean['date'].unique())
+        split_day = target_days[int(len(target_days) * (1 - test_size))]
+        train_mask = (df_clean['date'] < split_day).to_numpy()
         
-        # Split temporal (não aleatório!)
-        split_idx = int(len(df_clean) * (1 - test_size))
+        X_train = X[train_mask]
+        X_test = X[~train_mask]
         
-        X_train = X.iloc[:split_idx]
-        X_test = X.iloc[split_idx:]
+        y_orders_train = y_orders[train_mask]
+        y_orders_test = y_orders[~train_mask]
         
-        y_orders_train = y_orders.iloc[:split_idx]
-        y_orders_test = y_orders.iloc[split_idx:]
+        y_revenue_train = y_revenue[train_mask]
+        y_revenue_test = y_revenue[~train_mask]
         
-        y_revenue_train = y_revenue.iloc[:split_idx]
-        y_revenue_test = y_revenue.iloc[split_idx:]
+        horizon_test = df_clean[self.HORIZON_COLUMN].to_numpy()[~train_mask]
+        dates_test = df_clean['date'].to_numpy()[~train_mask]
         
-        print(f"   📊 Treino: {len(X_train)} dias | Teste: {len(X_test)} dias")
+        print(f"   📊 Treino: {(target_days < split_day).sum()} dias ({len(X_train)} pares origem × horizonte) | "
+              f"Teste: {(target_days >= split_day).sum()} dias ({len(X_test)} pares)")
         
         # Normalizar features
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
         
-        # Treinar modelo de pedidos
-        print("   🔧 Treinando modelo de pedidos...")
-        self.model_orders = GradientBoostingRegressor(
-            n_estimators=100,
-            max_depth=5,
-            learning_rate=0.1,
-            random_state=42
+        # Treinar os modelos de pedidos e receita ao mesmo tempo (o treino libera o GIL),
+        # cada um com metade das threads OpenMP (o hist paraleliza cada árvore)
+        print(f"   🔧 Treinando modelos de pedidos e receita ({self.backend})...")
+        start = time.perf_counter()
+        build = ESTIMATOR_BACKENDS[self.backend]
+        threads = max(1, _openmp_threads() // 2)
+        (self.model_orders, orders_seconds), (self.model_revenue, revenue_seconds) = Parallel(
+            n_jobs=2, prefer='threads'
+        )(
+            delayed(_fit_timed)(build(**self.params.get(target, {})), X_train_scaled, y, threads)
+            for target, y in (('orders', y_orders_train), ('revenue', y_revenue_train))
         )
-        self.model_orders.fit(X_train_scaled, y_orders_train)
-        
-        # Treinar modelo de receita
-        print("   🔧 Treinando modelo de receita...")
-        self.model_revenue = GradientBoostingRegressor(
-            n_estimators=100,
-            max_depth=5,
-            learning_rate=0.1,
-            random_state=42
-        )
-        self.model_revenue.fit(X_train_scaled, y_revenue_train)
+        self.fit_seconds = {
+            'orders': orders_seconds,
+            'revenue': revenue_seconds,
+            'total': time.perf_counter() - start,
+        }
+        print(f"   ⏱️  Treino em {self.fit_seconds['total']:.2f}s "
+              f"(pedidos {orders_seconds:.2f}s | receita {revenue_seconds:.2f}s)")
+        
+        self.importances = {
+            'orders': _importances(self.model_orders, X_test_scaled, y_orders_test),
+            'revenue': _importances(self.model_revenue, X_test_scaled, y_revenue_test),
+        }
         
         # Avaliar modelos
         orders_pred = self.model_orders.predict(X_test_scaled)
         revenue_pred = self.model_revenue.predict(X_test_scaled)
         
         self.metrics = {
-            'orders': {
-                'mae': mean_absolute_error(y_orders_test, orders_pred),
-                'rmse': np.sqrt(mean_squared_error(y_orders_test, orders_pred)),
-                'r2': r2_score(y_orders_test, orders_pred),
-                'mape': np.mean(np.abs((y_orders_test - orders_pred) / y_orders_test)) * 100
-            },
-            'revenue': {
-                'mae': mean_absolute_error(y_revenue_test, revenue_pred),
-                'rmse': np.sqrt(mean_squared_error(y_revenue_test, revenue_pred)),
-                'r2': r2_score(y_revenue_test, revenue_pred),
-                'mape': np.mean(np.abs((y_revenue_test - revenue_pred) / y_revenue_test)) * 100
-            },
+            'orders': regression_metrics(y_orders_test, orders_pred),
+            'revenue': regression_metrics(y_revenue_test, revenue_pred),
             'train_size': len(X_train),
             'test_size': len(X_test),
-            'features_used': len(self.feature_columns)
+            'features_used': len(self.feature_columns),
+            'horizon': self.horizon
         }
         
+        # Erro por horizonte (h = 1 ... horizon)
+        for target, y_test, pred in (('orders', y_orders_test, orders_pred), ('revenue', y_revenue_test, revenue_pred)):
+            errors = pd.Series(np.abs(y_test.to_numpy() - pred)).groupby(horizon_test).mean()
+            self.metrics[target]['mae_by_horizon'] = {int(h): float(e) for h, e in errors.items()}
+        
+        # Intervalos: resíduos do teste (dias que o modelo não viu) como calibração do split conformal;
+        # 'coverage' é a cobertura medida (a menor entre os alvos), gravada como confiança das previsões
+        self.intervals = {'level': INTERVAL_LEVEL}
+        coverages = []
+        for target, y_test, pred in (('orders', y_orders_test, orders_pred), ('revenue', y_revenue_test, revenue_pred)):
+            residuals = y_test.to_numpy() - pred
+            self.intervals[target] = calibrate_intervals(residuals, horizon_test, dates_test, self.horizon)
+            coverages.append(interval_coverage(residuals, horizon_test, dates_test, self.horizon))
+        self.intervals['coverage'] = min(coverages)
+        
         print("\n📈 Métricas do modelo (Pedidos):")
         print(f"   MAE: {self.metrics['orders']['mae']:.2f} pedidos")
         print(f"   RMSE: {self.metrics['orders']['rmse']:.2f}")
         print(f"   R²: {self.metrics['orders']['r2']:.3f}")
         print(f"   MAPE: {self.metrics['orders']['mape']:.1f}%")
+        print(f"   Intervalo: ± {self.intervals['orders'].mean():.1f} pedidos (média das células, "
+              f"{self.intervals['orders'].min():.1f} a {self.intervals['orders'].max():.1f}) | "
+              f"cobertura medida {self.intervals['coverage']:.0%} (alvo {INTERVAL_LEVEL:.0%})")
+        by_horizon = self.metrics['orders']['mae_by_horizon']
+        print("   MAE por horizonte: " + " ".join(f"h{h}={e:.0f}" for h, e in by_horizon.items()))
         
         print("\n📈 Métricas do modelo (Receita):")
         print(f"   MAE: R$ {self.metrics['revenue']['mae']:.2f}")
@@ -152,6 +547,98 @@ class DemandForecaster:
         
         return self.metrics
     
+    def _new_data(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame, np.ndarray]:
+        """Pares origem × horizonte do dataset e máscara dos dias previstos depois do treino salvo"""
+        stacked, X = self.prepare_data(df)
+        new = (stacked['date'] > pd.Timestamp(self.training_data['end_date'])).to_numpy()
+        return stacked, X, new
+    
+    def new_data_errors(self, df: pd.DataFrame) -> Optional[Dict[str, float]]:
+        """
+        MAE do modelo nos dias novos (previstos depois do fim do treino, ainda não vistos)
+        
+        Returns:
+            MAE por alvo e 'days' (None se não há dias novos)
+        """
+        stacked, X, new = self._new_data(df)
+        if not new.any():
+            return None
+        
+        X_new = self.scaler.transform(X[new])
+        errors: Dict[str, float] = {'days': int(stacked['date'][new].nunique())}
+        for target in self.TARGET_COLUMNS:
+            pred = getattr(self, f"model_{target}").predict(X_new)
+            errors[target] = float(np.abs(stacked[target].to_numpy()[new] - pred).mean())
+        return errors
+    
+    def update(self, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """
+        Treino incremental: acrescenta árvores ajustadas aos dias novos
+        
+        As árvores novas aprendem o resíduo do modelo atual na janela recente
+        (dias novos + INCREMENT_WINDOW_DAYS anteriores), com o scaler do treino
+        completo; o número de árvores cresce com os dias novos. O custo depende
+        dos dias novos, não do tamanho do histórico. Os intervalos de previsão
+        continuam os calibrados no último treino completo.
+        
+        Returns:
+            Relatório (dias novos, linhas usadas, árvores acrescentadas, tempo) ou
+            None se não há dias novos
+        """
+        stacked, X, new = self._new_data(df)
+        if not new.any():
+            return None
+        
+        dates = stacked['date']
+        new_days = int(dates[new].nunique())
+        window_start = pd.Timestamp(self.training_data['end_date']) - pd.Timedelta(days=INCREMENT_WINDOW_DAYS)
+        window = (dates > window_start).to_numpy()
+        X_window = self.scaler.transform(X[window])
+        
+        trees = min(TREES_PER_NEW_DAY * new_days, MAX_INCREMENT_TREES)
+        settings = {**INCREMENT_PARAMS, ITERATION_PARAMS[self.backend]: trees}
+        
+        start = time.perf_counter()
+        seconds = {}
+        for target in self.TARGET_COLUMNS:
+            model = getattr(self, f"model_{target}")
+            y = stacked[target].to_numpy(dtype='float64')[window]
+            correction, seconds[target] = _fit_timed(
+                ESTIMATOR_BACKENDS[self.backend](**settings), X_window, y - model.predict(X_window)
+            )
+            if not isinstance(model, IncrementalBooster):
+                model = IncrementalBooster(model)
+            setattr(self, f"model_{target}", model.extended(correction))
+        seconds['total'] = time.perf_counter() - start
+        
+        previous = self.lineage
+        report = {
+            'mode': 'incremental',
+            'base_model': self.model_id,
+            # Treino completo de onde a cadeia de incrementais partiu
+            'full_refit_model': previous.get('full_refit_model') if previous.get('mode') == 'incremental' else self.model_id,
+            'full_refit_end_date': previous.get('full_refit_end_date', self.training_data['end_date']),
+            'increments': previous.get('increments', 0) + 1,
+            'data_delta': {
+                'start_date': str(pd.Timestamp(dates[new].min()).date()),
+                'end_date': str(pd.Timestamp(dates[new].max()).date()),
+                'days': new_days,
+                'rows': int(new.sum()),
+                'window_rows': int(window.sum()),
+                'base_fingerprint': self.training_data.get('fingerprint'),
+            },
+            'trees_added': trees,
+        }
+        
+        self.lineage = report
+        self.fit_seconds = seconds
+        self.feature_snapshot = df.attrs.get('feature_snapshot')
+        self.training_data = describe_training_data(df)
+        
+        print(f"   🔧 +{trees} árvores por alvo com {new_days} dia(s) novo(s) "
+              f"({int(window.sum())} pares na janela) em {seconds['total']:.2f}s")
+        return report
+
     def get_feature_importance(self) -> pd.DataFrame:
         """
         Retorna importância das features
@@ -160,9 +647,9 @@ class DemandForecaster:
             return pd.DataFrame()
         
         importance = pd.DataFrame({
-            'feature': self.feature_columns,
-            'importance_orders': self.model_orders.feature_importances_,
-            'importance_revenue': self.model_revenue.feature_importances_
+            'feature': self.input_columns(),
+            'importance_orders': self.importances['orders'],
+            'importance_revenue': self.importances['revenue']
         })
         
         importance['importance_avg'] = (
@@ -171,12 +658,22 @@ class DemandForecaster:
         
         return importance.sort_values('importance_avg', ascending=False)
     
+    def model_name(self) -> str:
+        """Nome do estimador (ex.: 'HistGradientBoosting'), gravado junto das previsões"""
+        if self._model_orders is None and self._artifact is not None:
+            return self._artifact.entry['model']
+        model = self.model_orders
+        if isinstance(model, IncrementalBooster):
+            model = model.base
+        return type(model).__name__.replace('Regressor', '')
+    
     def predict(self, features: pd.DataFrame) -> Dict[str, Any]:
         """
-        Faz previsão para um conjunto de features
+        Faz previsão para um conjunto de features (todo o horizonte em uma chamada)
         
         Args:
-            features: DataFrame com features (mesmas colunas do treino)
+            features: DataFrame com features (mesmas colunas do treino + horizon),
+                ex.: generate_future_features()
         
         Returns:
             Dicionário com previsões
@@ -185,11 +682,14 @@ class DemandForecaster:
             raise ValueError("Modelo não treinado. Execute train() primeiro.")
         
         # Garantir que temos todas as features
-        missing = set(self.feature_columns) - set(features.columns)
+        missing = set(self.input_columns()) - set(features.columns)
         if missing:
             raise ValueError(f"Features faltando: {missing}")
         
-        X = features[self.feature_columns].copy()
+        if features[self.HORIZON_COLUMN].max() > self.horizon:
+            raise ValueError(f"Horizonte além do treinado ({self.horizon} dias)")
+        
+        X = features[self.input_columns()].copy()
         
         # Preencher NaN com 0 ou média (para previsões futuras)
         X = X.fillna(0)
@@ -199,98 +699,285 @@ class DemandForecaster:
         orders_pred = self.model_orders.predict(X_scaled)
         revenue_pred = self.model_revenue.predict(X_scaled)
         
-        return {
+        result = {
             'orders': orders_pred,
             'revenue': revenue_pred,
             'dates': features['date'].values if 'date' in features.columns else None
         }
+        
+        # Limites do intervalo: consulta à tabela calibrada no treino (modelos antigos não têm)
+        if self.intervals and 'date' in features.columns:
+            horizons = features[self.HORIZON_COLUMN].to_numpy()
+            for target, pred in (('orders', orders_pred), ('revenue', revenue_pred)):
+                result[f'{target}_lower'], result[f'{target}_upper'] = apply_intervals(
+                    self.intervals[target], pred, horizons, features['date'].to_numpy()
+                )
+            result['interval_level'] = self.intervals['level']
+            result['interval_coverage'] = self.intervals.get('coverage')
+        
+        return result
     
     def save(self, path: Optional[Path] = None) -> str:
         """
-        Salva o modelo treinado
+        Registra o modelo treinado como novo campeão do registro de modelos
+        
+        Com `path`, grava em vez disso um pickle único (exportação).
+        
+        Returns:
+            Id do modelo no registro (ou o caminho do pickle)
         """
-        if path is None:
-            path = MODELS_DIR / f"demand_model_{self.model_version}.pkl"
+        trained_at = datetime.now().isoformat()
         
-        model_data = {
+        if path is not None:
+            model_data = {
+                'version': self.model_version,
+                'model_orders': self.model_orders,
+                'model_revenue': self.model_revenue,
+                'scaler': self.scaler,
+                'feature_columns': self.feature_columns,
+                'horizon': self.horizon,
+                'backend': self.backend,
+                'params': self.params,
+                'fit_seconds': self.fit_seconds,
+                'importances': self.importances,
+                'metrics': self.metrics,
+                'feature_snapshot': self.feature_snapshot,
+                'training_data': self.training_data,
+                'lineage': self.lineage,
+                'intervals': self.intervals,
+                'trained_at': trained_at
+            }
+            
+            with open(path, 'wb') as f:
+                pickle.dump(model_data, f)
+            
+            print(f"💾 Modelo salvo em: {path}")
+            return str(path)
+        
+        entry = {
             'version': self.model_version,
-            'model_orders': self.model_orders,
-            'model_revenue': self.model_revenue,
-            'scaler': self.scaler,
-            'feature_columns': self.feature_columns,
+            'model': self.model_name(),
+            'backend': self.backend,
+            'horizon': self.horizon,
+            'feature_columns': list(self.feature_columns),
+            'params': self.params,
             'metrics': self.metrics,
-            'trained_at': datetime.now().isoformat()
+            'fit_seconds': self.fit_seconds,
+            'importances': {target: np.asarray(values).tolist() for target, values in self.importances.items()},
+            'feature_snapshot': self.feature_snapshot,
+            'training_data': self.training_data,
+            'lineage': self.lineage,
+            'intervals': {name: np.asarray(value).tolist() for name, value in self.intervals.items()},
+            'trained_at': trained_at,
         }
+        components = {name: getattr(self, name) for name in self.ARTIFACT_COMPONENTS}
+        self.model_id = register_model(components, entry)
         
-        with open(path, 'wb') as f:
-            pickle.dump(model_data, f)
-        
-        print(f"💾 Modelo salvo em: {path}")
-        return str(path)
+        print(f"💾 Modelo registrado: {self.model_id} (current)")
+        if self.feature_snapshot:
+            print(f"   📦 Features do treino: snapshot {self.feature_snapshot}")
+        return self.model_id
     
-    def load(self, path: Optional[Path] = None) -> bool:
+    def load(self, path: Optional[Path] = None, ref: str = 'current') -> bool:
         """
-        Carrega um modelo salvo
+        Carrega um modelo do registro (só os metadados; os estimadores são lidos no primeiro uso)
+        
+        Args:
+            path: Pickle único (save com `path` ou modelos anteriores ao registro)
+            ref: 'current' (campeão), 'previous' ou o id do modelo no registro
         """
         if path is None:
+            artifact = open_model(ref)
+            if artifact is not None:
+                self._load_artifact(artifact)
+                print(f"✅ Modelo carregado: {artifact.model_id}")
+                return True
+            
+            # Registro vazio: modelo salvo antes do registro
             path = MODELS_DIR / f"demand_model_{self.model_version}.pkl"
         
         if not path.exists():
             print(f"❌ Modelo não encontrado: {path}")
             return False
         
-        with open(path, 'rb') as f:
-            model_data = pickle.load(f)
+        # Pickles de outra versão do scikit-learn podem apontar para módulos que não existem mais
+        try:
+            with open(path, 'rb') as f:
+                model_data = pickle.load(f)
+        except (ModuleNotFoundError, AttributeError) as e:
+            print(f"❌ Modelo ilegível com esta versão do scikit-learn ({e}): {path}. Treine de novo com --train")
+            return False
+        
+        # Modelos anteriores à previsão multi-horizonte só preveem o dia seguinte
+        if model_data.get('horizon') is None:
+            print(f"❌ Modelo sem horizonte (anterior à previsão multi-horizonte): {path}. "
+                  f"Treine de novo com --train")
+            return False
         
+        self._artifact = None
+        self.model_id = None
         self.model_version = model_data['version']
         self.model_orders = model_data['model_orders']
         self.model_revenue = model_data['model_revenue']
         self.scaler = model_data['scaler']
         self.feature_columns = model_data['feature_columns']
+        self.horizon = model_data.get('horizon')
+        # Modelos salvos antes dos backends plugáveis usavam o Gradient Boosting clássico
+        self.backend = model_data.get('backend', 'classic')
+        self.params = model_data.get('params', {})
+        self.fit_seconds = model_data.get('fit_seconds', {})
+        self.importances = model_data.get('importances') or {
+            'orders': self.model_orders.feature_importances_,
+            'revenue': self.model_revenue.feature_importances_,
+        }
         self.metrics = model_data['metrics']
+        self.feature_snapshot = model_data.get('feature_snapshot')
+        self.training_data = model_data.get('training_data', {})
+        self.lineage = model_data.get('lineage', {})
+        self.intervals = model_data.get('intervals', {})
         
         print(f"✅ Modelo carregado: v{self.model_version}")
         return True
+    
+    def _load_artifact(self, artifact) -> None:
+        """Metadados do manifesto; scaler e estimadores ficam para o primeiro uso"""
+        entry = artifact.entry
+        
+        self._artifact = artifact
+        self.model_id = artifact.model_id
+        for name in self.ARTIFACT_COMPONENTS:
+            setattr(self, name, None)
+        
+        self.model_version = entry['version']
+        self.feature_columns = entry['feature_columns']
+        self.horizon = entry['horizon']
+        self.backend = entry['backend']
+        self.params = entry['params']
+        self.fit_seconds = entry['fit_seconds']
+        self.importances = {target: np.array(values) for target, values in entry['importances'].items()}
+        self.metrics = entry['metrics']
+        self.feature_snapshot = entry['feature_snapshot']
+        self.training_data = entry['training_data']
+        self.lineage = entry.get('lineage', {})
+        self.intervals = {
+            name: value if name in ('level', 'coverage') else np.array(value)
+            for name, value in entry.get('intervals', {}).items()
+        }
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        # Objetos gravados antes dos componentes sob demanda (ex.: hierarchical_model_*.pkl)
+        for name in self.ARTIFACT_COMPONENTS:
+            if name in state:
+                state[f"_{name}"] = state.pop(name)
+        state.setdefault('_artifact', None)
+        state.setdefault('model_id', None)
+        state.setdefault('training_data', {})
+        state.setdefault('lineage', {})
+        state.setdefault('intervals', {})
+        self.__dict__.update(state)
+
+
+def describe_training_data(df: pd.DataFrame) -> Dict[str, Any]:
+    """Snapshot, fingerprint e período de um dataset de treino (gravados no modelo)"""
+    return {
+        'feature_snapshot': df.attrs.get('feature_snapshot'),
+        'fingerprint': dataset_fingerprint(df),
+        # Só vendas e clima: não muda quando chegam dias novos (ver retraining)
+        'inputs_fingerprint': raw_inputs_fingerprint(df),
+        'rows': len(df),
+        'start_date': str(pd.Timestamp(df['date'].min()).date()),
+        'end_date': str(pd.Timestamp(df['date'].max()).date()),
+    }
+
+
+def stack_horizons(
+    df: pd.DataFrame,
+    features: List[str],
+    targets: List[str],
+    horizons: Iterable[int]
+) -> pd.DataFrame:
+    """
+    Pares (dia de origem, horizonte h) para o modelo direto
+    
+    Para o dia previsto na linha r e cada h, as colunas com lookback (lags,
+    médias móveis) vêm da linha de origem r - h; calendário, clima e os
+    alvos vêm da própria linha r.
+    
+    Args:
+        df: Dataset de features ordenado por data, uma linha por dia
+        features: Colunas de entrada do modelo
+        targets: Colunas-alvo
+        horizons: Horizontes (ex.: range(1, FORECAST_DAYS + 1))
+    
+    Returns:
+        DataFrame com date (dia previsto), horizon, features e alvos
+    """
+    lagged = set(lagged_columns(features))
+    n = len(df)
+    horizons = [h for h in horizons if h < n]
+    
+    # Índices de todos os pares de uma vez; cada coluna é lida com um único take
+    rows = np.concatenate([np.arange(h, n) for h in horizons]) if horizons else np.array([], dtype=int)
+    horizon = np.concatenate([np.full(n - h, h) for h in horizons]) if horizons else np.array([], dtype=int)
+    origins = rows - horizon
+    
+    data = {'date': df['date'].to_numpy()[rows], DemandForecaster.HORIZON_COLUMN: horizon}
+    for col in features:
+        data[col] = df[col].array.take(origins if col in lagged else rows)
+    for col in targets:
+        data[col] = df[col].array.take(rows)
+    
+    return pd.DataFrame(data)
 
 
 def generate_future_features(
     df_historical: pd.DataFrame,
-    days_ahead: int = FORECAST_DAYS
+    days_ahead: int = FORECAST_DAYS,
+    ctx: Optional[DataContext] = None
 ) -> pd.DataFrame:
     """
     Gera features para dias futuros (para previsão)
+    
+    Uma linha por dia previsto: calendário e clima do próprio dia, lags do
+    último dia do histórico (origem) e o horizonte (1 ... days_ahead). O tempo
+    da etapa é registrado no DataContext da execução, se informado.
     """
-    last_date = df_historical['date'].max()
-    future_dates = pd.date_range(
-        start=last_date + timedelta(days=1),
-        periods=days_ahead,
-        freq='D'
-    )
+    ctx = ctx or DataContext()
     
-    future_df = pd.DataFrame({'date': future_dates})
-    
-    # Features de calendário
-    future_df['dayOfWeek'] = future_df['date'].dt.dayofweek
-    future_df['dayOfMonth'] = future_df['date'].dt.day
-    future_df['month'] = future_df['date'].dt.month
-    future_df['year'] = future_df['date'].dt.year
-    future_df['weekOfYear'] = future_df['date'].dt.isocalendar().week
-    future_df['quarter'] = future_df['date'].dt.quarter
-    future_df['isWeekend'] = future_df['dayOfWeek'].isin([5, 6]).astype(int)
-    future_df['isFriday'] = (future_df['dayOfWeek'] == 4).astype(int)
-    future_df['isSaturday'] = (future_df['dayOfWeek'] == 5).astype(int)
-    future_df['isSunday'] = (future_df['dayOfWeek'] == 6).astype(int)
-    future_df['isStartOfMonth'] = (future_df['dayOfMonth'] <= 5).astype(int)
-    future_df['isEndOfMonth'] = (future_df['dayOfMonth'] >= 25).astype(int)
-    future_df['isSummer'] = future_df['month'].isin([12, 1, 2]).astype(int)
-    future_df['isWinter'] = future_df['month'].isin([6, 7, 8]).astype(int)
-    future_df['isHighSeason'] = (future_df['isSummer'] | future_df['isWinter']).astype(int)
-    
-    # Features de feriado (simplificado)
-    future_df['isHoliday'] = 0
-    future_df['holidayImpact'] = 0
-    future_df['daysToHoliday'] = 99
-    future_df['daysFromHoliday'] = 99
+    with ctx.stage('features futuras'):
+        last_date = df_historical['date'].max()
+        future_dates = pd.Series(pd.date_range(
+            start=last_date + timedelta(days=1),
+            periods=days_ahead,
+            freq='D'
+        ))
+        dimension = get_date_dimension(future_dates, ctx)
+        return _build_future_features(df_historical, future_dates, dimension)
+
+
+def derive_weather_flags(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Indicadores de clima a partir de temperatura e chuva (mesmas regras de weather_features)
+    
+    Usado nas features futuras (médias do mês) e nos cenários do forecast_service.
+    """
+    return df.assign(
+        isRainy=(df['precipitation'] > 5).astype(int),
+        isHot=(df['tempMax'] > 30).astype(int),
+        isCold=(df['tempMin'] < 18).astype(int),
+        tempRange=df['tempMax'] - df['tempMin'],
+        isBeachWeather=((df['tempMax'] > 25) & (df['precipitation'] < 2) & (df['isWeekend'] != 0)).astype(int),
+    )
+
+
+def _build_future_features(
+    df_historical: pd.DataFrame,
+    future_dates: pd.Series,
+    dimension: pd.DataFrame
+) -> pd.DataFrame:
+    """Monta o DataFrame de features dos próximos dias"""
+    # Calendário e feriados: mesma dimensão de datas do histórico
+    future_df = join_date_dimension(pd.DataFrame({'date': future_dates}), dimension)
     
     # Features de clima (usar média histórica por mês)
     month_avg = df_historical.groupby('month').agg({
@@ -301,39 +988,16 @@ def generate_future_features(
     }).reset_index()
     
     future_df = future_df.merge(month_avg, on='month', how='left')
-    future_df['isRainy'] = (future_df['precipitation'] > 5).astype(int)
-    future_df['isHot'] = (future_df['tempMax'] > 30).astype(int)
-    future_df['isCold'] = (future_df['tempMin'] < 18).astype(int)
-    future_df['tempRange'] = future_df['tempMax'] - future_df['tempMin']
-    future_df['isBeachWeather'] = 0
-    
-    # Features de lag (usar últimos valores conhecidos)
-    last_orders = df_historical['orders'].iloc[-1] if 'orders' in df_historical.columns else 0
-    last_revenue = df_historical['revenue'].iloc[-1] if 'revenue' in df_historical.columns else 0
-    
-    future_df['orders_lag_1'] = last_orders
-    future_df['orders_lag_7'] = df_historical['orders'].iloc[-7] if len(df_historical) >= 7 else last_orders
-    future_df['orders_lag_14'] = df_historical['orders'].iloc[-14] if len(df_historical) >= 14 else last_orders
-    future_df['orders_lag_28'] = df_historical['orders'].iloc[-28] if len(df_historical) >= 28 else last_orders
     
-    future_df['orders_ma_7'] = df_historical['orders'].tail(7).mean()
-    future_df['orders_ma_14'] = df_historical['orders'].tail(14).mean()
-    future_df['orders_ma_28'] = df_historical['orders'].tail(28).mean()
+    # Mês sem clima no histórico: média das últimas 4 semanas
+    recent = df_historical[['tempMin', 'tempMax', 'tempAvg', 'precipitation']].tail(28).mean()
+    future_df = derive_weather_flags(future_df.fillna(recent.to_dict()))
     
-    future_df['orders_std_7'] = df_historical['orders'].tail(7).std()
-    future_df['orders_std_14'] = df_historical['orders'].tail(14).std()
+    # Lags, médias móveis e tendências: valores conhecidos no dia de origem (último do histórico)
+    origin = df_historical.iloc[-1]
+    future_df = future_df.assign(**{col: origin[col] for col in lagged_columns(df_historical.columns)})
     
-    future_df['orders_same_dow_last_week'] = last_orders
-    future_df['orders_trend_7d'] = 0
-    
-    future_df['revenue_lag_1'] = last_revenue
-    future_df['revenue_lag_7'] = df_historical['revenue'].iloc[-7] if len(df_historical) >= 7 else last_revenue
-    future_df['revenue_ma_7'] = df_historical['revenue'].tail(7).mean()
-    future_df['revenue_ma_14'] = df_historical['revenue'].tail(14).mean()
-    
-    last_ticket = df_historical['avg_ticket'].iloc[-1] if 'avg_ticket' in df_historical.columns else 100
-    future_df['ticket_lag_1'] = last_ticket
-    future_df['ticket_ma_7'] = df_historical['avg_ticket'].tail(7).mean() if 'avg_ticket' in df_historical.columns else last_ticket
+    future_df[DemandForecaster.HORIZON_COLUMN] = np.arange(1, len(future_df) + 1)
     
     return future_df
 
@@ -342,15 +1006,19 @@ if __name__ == "__main__":
     print("🎯 Modelo de Previsão de Demanda - Pirata Pizzaria")
     print("=" * 60)
     
-    # 1. Criar dataset de features
-    df = create_feature_dataset()
+    # 0. Intervalos atingem o nível nominal em dados sintéticos
+    print(f"✅ Cobertura dos intervalos em dados sintéticos: {check_interval_coverage():.1%} "
+          f"(nível {INTERVAL_LEVEL:.0%})")
+    
+    # 1. Criar dataset com as features que o modelo pede
+    forecaster = DemandForecaster()
+    df = create_feature_dataset(columns=forecaster.required_columns())
     
     if df.empty:
         print("❌ Sem dados para treinar")
         exit(1)
     
     # 2. Treinar modelo
-    forecaster = DemandForecaster()
     metrics = forecaster.train(df)
     
     # 3. Mostrar importância das features
@@ -1,288 +1,520 @@
 """
 Feature Engineering para previsão de demanda
 Combina dados de vendas, clima e feriados
+
+Cada grupo de features é registrado com as colunas que lê e as que produz.
+O dataset é montado só com os grupos necessários para as colunas pedidas,
+resolvendo as dependências entre eles; cada grupo grava arrays novos em um
+dicionário de colunas e o DataFrame é montado uma única vez no final.
+
+Datasets calculados ficam no feature_store, identificados pela versão das
+definições (feature_definition_hash) e pelas tabelas de origem.
 """
+import hashlib
+import inspect
+
 import pandas as pd
 import numpy as np
-from typing import Optional
-from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from config import DATE_DIMENSION_END_YEAR, DATE_DIMENSION_START_YEAR
+from data_context import DataContext
+from date_dimension import CALENDAR_COLUMNS, HOLIDAY_COLUMNS, day_keys, load_date_dimension
+from feature_store import dataset_fingerprint, load_snapshot, save_snapshot, snapshot_key
+from lag_engine import LagSpec, compute_lags
+
+
+# Versão das definições das features. O código de cada grupo já entra no hash
+# (feature_definition_hash); incremente ao mudar o que os grupos chamam
+# (lag_engine, date_dimension) para invalidar os snapshots do feature_store.
+FEATURE_SET_VERSION = 3
+
+
+# Colunas do resumo diário de vendas (sempre presentes no dataset)
+SALES_COLUMNS = [
+    'date', 'orders', 'revenue', 'avg_ticket', 'total_items', 'counter_orders',
+    'table_orders', 'delivery_orders', 'avg_duration', 'paid_orders', 'pending_orders',
+]
 
-from database import get_daily_sales_summary, get_weather_data, get_holidays
+# Colunas do clima do dia (weather_data), sem as flags derivadas
+WEATHER_COLUMNS = ['tempMin', 'tempMax', 'tempAvg', 'precipitation']
 
+# Colunas do dataset: nome -> array com uma posição por dia (ordenado por data)
+Columns = Dict[str, np.ndarray]
 
-def create_calendar_features(df: pd.DataFrame) -> pd.DataFrame:
+
+class FeatureGroup:
     """
-    Cria features de calendário a partir das datas
+    Grupo de features: colunas de entrada, colunas produzidas e a função que as calcula
+    
+    features são as colunas usadas pelo modelo; extras são colunas descritivas
+    (ex.: tipo do feriado) produzidas junto, mas fora do treino. lookback e
+    lookahead dizem quantas linhas antes/depois de um dia entram no seu cálculo
+    (ex.: orders_lag_28 olha 28 dias para trás).
     """
-    df = df.copy()
-    
-    # Extrair componentes da data
-    df['dayOfWeek'] = df['date'].dt.dayofweek  # 0=Segunda, 6=Domingo
-    df['dayOfMonth'] = df['date'].dt.day
-    df['month'] = df['date'].dt.month
-    df['year'] = df['date'].dt.year
-    df['weekOfYear'] = df['date'].dt.isocalendar().week
-    df['quarter'] = df['date'].dt.quarter
-    
-    # Flags úteis
-    df['isWeekend'] = df['dayOfWeek'].isin([5, 6]).astype(int)  # Sáb e Dom
-    df['isFriday'] = (df['dayOfWeek'] == 4).astype(int)
-    df['isSaturday'] = (df['dayOfWeek'] == 5).astype(int)
-    df['isSunday'] = (df['dayOfWeek'] == 6).astype(int)
-    
-    # Início/fim do mês
-    df['isStartOfMonth'] = (df['dayOfMonth'] <= 5).astype(int)
-    df['isEndOfMonth'] = (df['dayOfMonth'] >= 25).astype(int)
-    
-    # Temporadas (para Bertioga - cidade litorânea)
-    # Verão: Dez-Fev (alta temporada)
-    # Inverno: Jun-Ago (férias escolares)
-    df['isSummer'] = df['month'].isin([12, 1, 2]).astype(int)
-    df['isWinter'] = df['month'].isin([6, 7, 8]).astype(int)
-    df['isHighSeason'] = (df['isSummer'] | df['isWinter']).astype(int)
     
-    return df
+    def __init__(
+        self,
+        name: str,
+        features: Sequence[str],
+        inputs: Sequence[str],
+        compute: Callable[[Columns, DataContext], Columns],
+        extras: Sequence[str] = (),
+        lookback: int = 0,
+        lookahead: int = 0
+    ):
+        self.name = name
+        self.features = list(features)
+        self.extras = list(extras)
+        self.outputs = self.features + self.extras
+        self.inputs = list(inputs)
+        self.compute = compute
+        self.lookback = lookback
+        self.lookahead = lookahead
 
 
-def add_holiday_features(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Adiciona features de feriados
+# Registro em ordem de declaração (também a ordem das colunas no dataset)
+FEATURE_REGISTRY: Dict[str, FeatureGroup] = {}
+
+
+def register_features(
+    name: str,
+    features: Sequence[str],
+    inputs: Sequence[str],
+    extras: Sequence[str] = (),
+    lookback: int = 0,
+    lookahead: int = 0
+):
+    """Decorator que registra a função de cálculo de um grupo de features"""
+    def decorator(compute):
+        FEATURE_REGISTRY[name] = FeatureGroup(name, features, inputs, compute, extras, lookback, lookahead)
+        return compute
+    return decorator
+
+
+def _producers() -> Dict[str, FeatureGroup]:
+    """Coluna -> grupo que a produz"""
+    return {col: group for group in FEATURE_REGISTRY.values() for col in group.outputs}
+
+
+def resolve_feature_groups(columns: Iterable[str]) -> List[FeatureGroup]:
     """
-    df = df.copy()
-    
-    # Buscar feriados do banco
-    holidays_df = get_holidays()
-    
-    if holidays_df.empty:
-        df['isHoliday'] = 0
-        df['holidayType'] = None
-        df['holidayScope'] = None
-        df['holidayImpact'] = 0
-        df['daysToHoliday'] = 99
-        df['daysFromHoliday'] = 99
-        return df
-    
-    # Normalizar datas
-    holidays_df['date'] = pd.to_datetime(holidays_df['date']).dt.normalize()
-    df['date'] = pd.to_datetime(df['date']).dt.normalize()
-    
-    # Merge com feriados
-    df = df.merge(
-        holidays_df[['date', 'name', 'eventType', 'scope', 'impactExpected']],
-        on='date',
-        how='left'
-    )
-    
-    df['isHoliday'] = df['name'].notna().astype(int)
-    df['holidayType'] = df['eventType']
-    df['holidayScope'] = df['scope']
-    
-    # Converter impacto para numérico
-    impact_map = {'HIGH': 3, 'MEDIUM': 2, 'LOW': 1}
-    df['holidayImpact'] = df['impactExpected'].map(impact_map).fillna(0)
+    Grupos necessários para produzir as colunas pedidas, em ordem de dependência
     
-    # Dias até o próximo feriado / desde o último
-    holiday_dates = holidays_df['date'].unique()
+    Raises:
+        ValueError: Coluna que nenhum grupo produz
+    """
+    producers = _producers()
+    ordered: List[FeatureGroup] = []
+    visiting = set()
+    
+    def visit(col: str):
+        if col in SALES_COLUMNS:
+            return
+        if col not in producers:
+            raise ValueError(f"Coluna desconhecida no registro de features: {col}")
+        
+        group = producers[col]
+        if group in ordered:
+            return
+        if group.name in visiting:
+            raise ValueError(f"Dependência circular no grupo {group.name}")
+        
+        visiting.add(group.name)
+        for dependency in group.inputs:
+            visit(dependency)
+        visiting.discard(group.name)
+        ordered.append(group)
     
-    def days_to_nearest_holiday(row_date, direction='forward'):
-        if direction == 'forward':
-            future = [h for h in holiday_dates if h > row_date]
-            return (min(future) - row_date).days if future else 99
-        else:
-            past = [h for h in holiday_dates if h < row_date]
-            return (row_date - max(past)).days if past else 99
+    for col in columns:
+        visit(col)
     
-    df['daysToHoliday'] = df['date'].apply(lambda x: days_to_nearest_holiday(x, 'forward'))
-    df['daysFromHoliday'] = df['date'].apply(lambda x: days_to_nearest_holiday(x, 'backward'))
+    return ordered
+
+
+def feature_window(columns: Iterable[str]) -> Tuple[int, int]:
+    """
+    Linhas antes e depois de um dia necessárias para calcular suas colunas
     
-    # Limpar colunas temporárias
-    df = df.drop(columns=['name', 'eventType', 'scope', 'impactExpected'], errors='ignore')
+    Returns:
+        Tupla (lookback, lookahead) dos grupos que produzem as colunas
+    """
+    groups = resolve_feature_groups(columns)
+    return (
+        max((g.lookback for g in groups), default=0),
+        max((g.lookahead for g in groups), default=0),
+    )
+
+
+def lagged_columns(columns: Iterable[str]) -> List[str]:
+    """
+    Colunas que dependem de dias anteriores (grupos com lookback), na ordem recebida
     
-    return df
+    Numa previsão para daqui a h dias, elas valem no dia de origem; as demais
+    (calendário, feriados, clima) descrevem o próprio dia previsto.
+    """
+    producers = _producers()
+    return [col for col in columns if col in producers and producers[col].lookback > 0]
 
 
-def add_weather_features(df: pd.DataFrame) -> pd.DataFrame:
+def feature_definition_hash(columns: Iterable[str]) -> str:
     """
-    Adiciona features meteorológicas
+    Versão das definições das colunas pedidas: grupos envolvidos, seu código e os lags configurados
     """
-    df = df.copy()
-    
-    # Buscar dados de clima
-    weather_df = get_weather_data()
+    parts = [f"v{FEATURE_SET_VERSION}"]
+    for group in resolve_feature_groups(columns):
+        parts += [group.name, ",".join(group.outputs), ",".join(group.inputs),
+                  f"{group.lookback}:{group.lookahead}", inspect.getsource(group.compute)]
+    for spec in ORDER_LAGS + REVENUE_LAGS + OPERATIONS_LAGS:
+        parts.append(repr(sorted(vars(spec).items())))
+    return hashlib.sha256("\n".join(parts).encode()).hexdigest()[:16]
+
+
+def raw_inputs_fingerprint(df: pd.DataFrame) -> str:
+    """
+    Hash das entradas brutas de cada dia do dataset (resumo de vendas e clima)
+
+    Lags, médias móveis e alvos de um dia mudam quando chegam dias novos; as
+    entradas brutas só mudam se a origem mudou (ex.: pedido corrigido, clima
+    coletado depois).
+    """
+    columns = [col for col in SALES_COLUMNS + WEATHER_COLUMNS if col in df.columns]
+    return dataset_fingerprint(df[columns])
+
+
+def get_date_dimension(dates: pd.Series, ctx: Optional[DataContext] = None) -> pd.DataFrame:
+    """
+    Dimensão de datas que cobre as datas informadas (uma vez por execução)
     
-    if weather_df.empty:
-        df['tempMin'] = None
-        df['tempMax'] = None
-        df['tempAvg'] = None
-        df['precipitation'] = 0
-        df['isRainy'] = 0
-        df['isHot'] = 0
-        df['isCold'] = 0
-        return df
+    O intervalo padrão de anos é ampliado se as datas caírem fora dele.
+    """
+    ctx = ctx or DataContext()
+    dates = pd.to_datetime(pd.Series(dates))
     
-    # Normalizar datas
-    weather_df['date'] = pd.to_datetime(weather_df['date']).dt.normalize()
-    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+    start_year = min(DATE_DIMENSION_START_YEAR, int(dates.min().year)) if len(dates) else DATE_DIMENSION_START_YEAR
+    end_year = max(DATE_DIMENSION_END_YEAR, int(dates.max().year)) if len(dates) else DATE_DIMENSION_END_YEAR
     
-    # Merge com clima
-    df = df.merge(
-        weather_df[['date', 'tempMin', 'tempMax', 'tempAvg', 'precipitation', 'condition']],
-        on='date',
-        how='left'
+    return ctx.memo(
+        ('dimensão de datas', start_year, end_year),
+        lambda: load_date_dimension(ctx.source('holidays'), start_year, end_year)
     )
-    
-    # Features derivadas
-    df['isRainy'] = (df['precipitation'] > 5).astype(int)  # Chuva significativa
-    df['isHot'] = (df['tempMax'] > 30).astype(int)
-    df['isCold'] = (df['tempMin'] < 18).astype(int)
-    df['tempRange'] = df['tempMax'] - df['tempMin']
+
+
+def _dimension_columns(cols: Columns, ctx: DataContext, names: List[str]) -> Columns:
+    """Busca colunas da dimensão de datas pela posição do dia"""
+    dates = pd.Series(cols['date'])
+    dim = get_date_dimension(dates, ctx)
+    positions = day_keys(dates) - int(dim['dayKey'].iat[0])
+    return {name: dim[name].array.take(positions) for name in names}
+
+
+@register_features('calendar', CALENDAR_COLUMNS, inputs=['date'])
+def calendar_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Dia da semana, mês, temporada (Bertioga - cidade litorânea)"""
+    return _dimension_columns(cols, ctx, CALENDAR_COLUMNS)
+
+
+@register_features(
+    'holiday',
+    ['isHoliday', 'holidayImpact', 'daysToHoliday', 'daysFromHoliday'],
+    inputs=['date'],
+    extras=['holidayType', 'holidayScope']
+)
+def holiday_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Feriado no dia, impacto esperado e distância até o próximo/desde o último"""
+    return _dimension_columns(cols, ctx, HOLIDAY_COLUMNS)
+
+
+@register_features(
+    'weather',
+    ['tempMin', 'tempMax', 'tempAvg', 'precipitation',
+     'isRainy', 'isHot', 'isCold', 'tempRange', 'isBeachWeather'],
+    inputs=['date', 'isWeekend'],
+    extras=['condition']
+)
+def weather_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Clima do dia (carregado uma vez por execução) e flags derivadas"""
+    n = len(cols['date'])
+    weather_df = ctx.source('weather')
+    
+    out = {}
+    if weather_df.empty:
+        for col in ('tempMin', 'tempMax', 'tempAvg'):
+            out[col] = np.full(n, np.nan)
+        out['precipitation'] = np.zeros(n)
+        out['condition'] = np.full(n, None, dtype=object)
+    else:
+        # Posição de cada dia na tabela de clima (-1 = sem registro)
+        weather_df = weather_df.drop_duplicates('date', keep='last')
+        index = pd.Index(day_keys(weather_df['date']))
+        positions = index.get_indexer(day_keys(pd.Series(cols['date'])))
+        found = positions >= 0
+        
+        for col in ('tempMin', 'tempMax', 'tempAvg', 'precipitation'):
+            values = np.full(n, np.nan)
+            values[found] = pd.to_numeric(weather_df[col]).to_numpy(dtype='float64')[positions[found]]
+            out[col] = values
+        out['condition'] = np.where(found, weather_df['condition'].to_numpy(dtype=object)[positions], None)
+    
+    # Features derivadas (comparações com NaN dão 0)
+    out['isRainy'] = (out['precipitation'] > 5).astype(int)  # Chuva significativa
+    out['isHot'] = (out['tempMax'] > 30).astype(int)
+    out['isCold'] = (out['tempMin'] < 18).astype(int)
+    out['tempRange'] = out['tempMax'] - out['tempMin']
     
     # Condições boas para praia
-    df['isBeachWeather'] = (
-        (df['tempMax'] > 25) & 
-        (df['precipitation'] < 2) & 
-        df['isWeekend']
+    out['isBeachWeather'] = (
+        (out['tempMax'] > 25) &
+        (out['precipitation'] < 2) &
+        (np.asarray(cols['isWeekend']) != 0)
     ).astype(int)
     
-    return df
+    return out
 
 
-def add_lag_features(df: pd.DataFrame, target_col: str = 'orders') -> pd.DataFrame:
-    """
-    Adiciona features de lag (valores passados)
+def _shift(values: np.ndarray, periods: int) -> np.ndarray:
+    """Desloca um array (positivo = valores passados), preenchendo com NaN"""
+    out = np.full(len(values), np.nan)
+    if periods > 0:
+        out[periods:] = values[:-periods]
+    elif periods < 0:
+        out[:periods] = values[-periods:]
+    else:
+        out[:] = values
+    return out
+
+
+# Lags e janelas de cada série (calculados juntos pelo lag_engine)
+ORDER_LAGS = [
+    LagSpec('orders', lags=[1, 7, 14, 28], windows=[7, 14, 28], stats=['mean', 'std']),
+]
+REVENUE_LAGS = [
+    LagSpec('revenue', lags=[1, 7], windows=[7, 14]),
+    LagSpec('avg_ticket', lags=[1], windows=[7], prefix='ticket'),
+]
+OPERATIONS_LAGS = [
+    LagSpec('delivery_orders', lags=[1, 7], windows=[7, 28], stats=['mean', 'max']),
+    LagSpec('avg_duration', lags=[1], windows=[7], spans=[7]),
+]
+
+
+def _lookback(specs: Sequence[LagSpec]) -> int:
+    return max(spec.lookback for spec in specs)
+
+
+@register_features(
+    'lag_orders',
+    ['orders_lag_1', 'orders_lag_7', 'orders_lag_14', 'orders_lag_28',
+     'orders_ma_7', 'orders_ma_14', 'orders_ma_28',
+     'orders_std_7', 'orders_std_14',
+     'orders_same_dow_last_week', 'orders_trend_7d'],
+    inputs=['orders'],
+    extras=['orders_std_28'],
+    lookback=_lookback(ORDER_LAGS)
+)
+def order_lag_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Lags, médias móveis e tendência dos pedidos (valores passados)"""
+    out = compute_lags(cols, ORDER_LAGS)
+    out.update(_order_trends(cols, out))
+    return out
+
+
+def _order_trends(cols: Columns, lags: Columns) -> Columns:
+    return {
+        # Mesmo dia da semana na semana anterior
+        'orders_same_dow_last_week': lags['orders_lag_7'],
+        # Tendência (variação vs semana anterior)
+        'orders_trend_7d': np.asarray(cols['orders'], dtype='float64') - lags['orders_lag_7'],
+    }
+
+
+@register_features(
+    'lag_revenue',
+    [col for spec in REVENUE_LAGS for col in spec.columns()],
+    inputs=['revenue', 'avg_ticket'],
+    lookback=_lookback(REVENUE_LAGS)
+)
+def revenue_lag_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Lags e médias móveis de receita e ticket médio"""
+    return compute_lags(cols, REVENUE_LAGS)
+
+
+def stacked_lag_features(cols: Columns, groups: np.ndarray) -> Columns:
     """
-    df = df.copy()
-    df = df.sort_values('date')
-    
-    # Lags do target
-    for lag in [1, 7, 14, 28]:
-        df[f'{target_col}_lag_{lag}'] = df[target_col].shift(lag)
-    
-    # Médias móveis
-    for window in [7, 14, 28]:
-        df[f'{target_col}_ma_{window}'] = df[target_col].rolling(window=window, min_periods=1).mean()
-        df[f'{target_col}_std_{window}'] = df[target_col].rolling(window=window, min_periods=1).std()
+    Colunas de lag_orders e lag_revenue de várias séries empilhadas, em uma passada
     
-    # Mesmo dia da semana na semana anterior
-    df[f'{target_col}_same_dow_last_week'] = df[target_col].shift(7)
-    
-    # Tendência (variação vs semana anterior)
-    df[f'{target_col}_trend_7d'] = df[target_col] - df[target_col].shift(7)
-    
-    return df
+    Args:
+        cols: orders, revenue e avg_ticket com um bloco contíguo por série
+        groups: Rótulo da série de cada linha
+    """
+    out = compute_lags(cols, ORDER_LAGS + REVENUE_LAGS, groups)
+    out.update(_order_trends(cols, out))
+    return out
 
 
-def add_revenue_features(df: pd.DataFrame) -> pd.DataFrame:
+@register_features(
+    'lag_operations',
+    [col for spec in OPERATIONS_LAGS for col in spec.columns()],
+    inputs=['delivery_orders', 'avg_duration'],
+    lookback=_lookback(OPERATIONS_LAGS)
+)
+def operations_lag_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Lags de delivery e do tempo médio de atendimento"""
+    return compute_lags(cols, OPERATIONS_LAGS)
+
+
+@register_features('target', ['next_day_orders', 'next_day_revenue'], inputs=['orders', 'revenue'], lookahead=1)
+def target_features(cols: Columns, ctx: DataContext) -> Columns:
+    """Target do próximo dia (para treino)"""
+    return {
+        'next_day_orders': _shift(np.asarray(cols['orders'], dtype='float64'), -1),
+        'next_day_revenue': _shift(np.asarray(cols['revenue'], dtype='float64'), -1),
+    }
+
+
+def get_feature_columns() -> dict:
     """
-    Adiciona features de receita
+    Retorna lista de colunas de features por categoria (derivada do registro)
     """
-    df = df.copy()
-    df = df.sort_values('date')
-    
-    # Lags de receita
-    for lag in [1, 7]:
-        df[f'revenue_lag_{lag}'] = df['revenue'].shift(lag)
-    
-    # Médias móveis de receita
-    for window in [7, 14]:
-        df[f'revenue_ma_{window}'] = df['revenue'].rolling(window=window, min_periods=1).mean()
-    
-    # Ticket médio
-    df['ticket_lag_1'] = df['avg_ticket'].shift(1)
-    df['ticket_ma_7'] = df['avg_ticket'].rolling(window=7, min_periods=1).mean()
-    
-    return df
+    columns = {name: list(group.features) for name, group in FEATURE_REGISTRY.items()}
+    columns['target'] = ['orders', 'revenue'] + columns['target']
+    return columns
+
+
+def all_feature_columns(include_target_lags: bool = True) -> List[str]:
+    """Todas as colunas registradas (features, extras e targets)"""
+    skip = set() if include_target_lags else {'lag_orders', 'lag_revenue'}
+    return [col for name, group in FEATURE_REGISTRY.items() if name not in skip for col in group.outputs]
 
 
 def create_feature_dataset(
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    include_target_lags: bool = True
+    include_target_lags: bool = True,
+    ctx: Optional[DataContext] = None,
+    columns: Optional[Sequence[str]] = None
 ) -> pd.DataFrame:
     """
-    Cria dataset completo com todas as features
+    Cria o dataset com as features pedidas (padrão: todas as registradas)
+    
+    Só os grupos necessários para as colunas pedidas (e suas dependências)
+    são calculados. Com um DataContext, o dataset é calculado uma vez por
+    execução e reaproveitado nas chamadas seguintes (treino e previsão). Se as
+    definições e as tabelas de origem não mudaram desde uma execução anterior,
+    o snapshot do feature_store é lido em vez de recalcular; o id fica em
+    df.attrs['feature_snapshot'].
+    
+    Args:
+        start_date: Data inicial (YYYY-MM-DD)
+        end_date: Data final (YYYY-MM-DD)
+        include_target_lags: Inclui os lags de pedidos/receita (quando columns não é informado)
+        ctx: Contexto da execução
+        columns: Colunas desejadas (ex.: DemandForecaster.required_columns())
     
     Returns:
-        DataFrame com features prontas para ML
+        DataFrame com features prontas para ML (compartilhado: não alterar)
     """
+    ctx = ctx or DataContext()
+    columns = list(columns) if columns is not None else all_feature_columns(include_target_lags)
+    key = ('dataset', start_date, end_date, tuple(sorted(columns)))
+    
+    return ctx.memo(key, lambda: _stored_feature_dataset(start_date, end_date, columns, ctx))
+
+
+def _stored_feature_dataset(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    columns: List[str],
+    ctx: DataContext
+) -> pd.DataFrame:
+    """Lê o dataset do feature_store ou calcula e salva um novo snapshot"""
+    definition = feature_definition_hash(columns)
+    
+    with ctx.stage('feature store'):
+        snapshot_id = snapshot_key(definition, columns, start_date, end_date)
+        df = load_snapshot(snapshot_id)
+    
+    if df is not None:
+        print(f"📦 Dataset de features do feature store: {snapshot_id} ({len(df)} linhas)")
+        return df
+    
+    df = _build_feature_dataset(start_date, end_date, columns, ctx)
+    
+    # Banco sem impressão digital (ou sem vendas): não dá para identificar o snapshot
+    if snapshot_id and not df.empty:
+        with ctx.stage('feature store'):
+            save_snapshot(snapshot_id, df, {
+                'definition': definition,
+                'start_date': start_date,
+                'end_date': end_date,
+            })
+        df.attrs['feature_snapshot'] = snapshot_id
+    
+    return df
+
+
+def _build_feature_dataset(
+    start_date: Optional[str],
+    end_date: Optional[str],
+    columns: List[str],
+    ctx: DataContext
+) -> pd.DataFrame:
+    """Calcula os grupos necessários registrando o tempo de cada um"""
     print("🔧 Criando dataset de features...")
     
-    # 1. Buscar dados de vendas
+    # 1. Buscar dados de vendas (rollup diário, via cache local)
     print("   📊 Carregando vendas...")
-    df = get_daily_sales_summary()
+    sales = ctx.source('sales')
     
-    if df.empty:
+    if sales.empty:
         print("   ❌ Nenhum dado de vendas encontrado")
         return pd.DataFrame()
     
-    print(f"   ✅ {len(df)} dias de vendas")
+    print(f"   ✅ {len(sales)} dias de vendas")
     
-    # 2. Filtrar por datas se especificado
+    # 2. Filtrar por datas se especificado (o rollup já vem ordenado por data)
+    mask = np.ones(len(sales), dtype=bool)
     if start_date:
-        df = df[df['date'] >= start_date]
+        mask &= (sales['date'] >= start_date).to_numpy()
     if end_date:
-        df = df[df['date'] <= end_date]
-    
-    # 3. Adicionar features de calendário
-    print("   📅 Adicionando features de calendário...")
-    df = create_calendar_features(df)
-    
-    # 4. Adicionar features de feriados
-    print("   🎉 Adicionando features de feriados...")
-    df = add_holiday_features(df)
-    
-    # 5. Adicionar features meteorológicas
-    print("   🌤️  Adicionando features meteorológicas...")
-    df = add_weather_features(df)
+        mask &= (sales['date'] <= end_date).to_numpy()
     
-    # 6. Adicionar features de lag
-    if include_target_lags:
-        print("   ⏮️  Adicionando features de lag...")
-        df = add_lag_features(df, 'orders')
-        df = add_revenue_features(df)
-    
-    # 7. Criar target para próximo dia (para treino)
-    df['next_day_orders'] = df['orders'].shift(-1)
-    df['next_day_revenue'] = df['revenue'].shift(-1)
+    # 3. Calcular só os grupos necessários
+    df = compute_features(sales[mask], columns, ctx)
     
     print(f"   ✅ Dataset criado com {len(df)} linhas e {len(df.columns)} colunas")
     
     return df
 
 
-def get_feature_columns() -> dict:
+def compute_features(sales: pd.DataFrame, columns: Sequence[str], ctx: Optional[DataContext] = None) -> pd.DataFrame:
     """
-    Retorna lista de colunas de features por categoria
+    Calcula as colunas pedidas sobre um resumo diário de vendas (ordenado por data)
+    
+    Lags e médias móveis usam as linhas anteriores do próprio resumo: para
+    calcular só um trecho, passe também as linhas de feature_window() antes dele.
+    
+    Args:
+        sales: Resumo diário (colunas de SALES_COLUMNS)
+        columns: Colunas desejadas
+        ctx: Contexto da execução
     """
-    return {
-        'calendar': [
-            'dayOfWeek', 'dayOfMonth', 'month', 'year', 'weekOfYear', 'quarter',
-            'isWeekend', 'isFriday', 'isSaturday', 'isSunday',
-            'isStartOfMonth', 'isEndOfMonth',
-            'isSummer', 'isWinter', 'isHighSeason'
-        ],
-        'holiday': [
-            'isHoliday', 'holidayImpact', 'daysToHoliday', 'daysFromHoliday'
-        ],
-        'weather': [
-            'tempMin', 'tempMax', 'tempAvg', 'precipitation',
-            'isRainy', 'isHot', 'isCold', 'tempRange', 'isBeachWeather'
-        ],
-        'lag_orders': [
-            'orders_lag_1', 'orders_lag_7', 'orders_lag_14', 'orders_lag_28',
-            'orders_ma_7', 'orders_ma_14', 'orders_ma_28',
-            'orders_std_7', 'orders_std_14',
-            'orders_same_dow_last_week', 'orders_trend_7d'
-        ],
-        'lag_revenue': [
-            'revenue_lag_1', 'revenue_lag_7',
-            'revenue_ma_7', 'revenue_ma_14',
-            'ticket_lag_1', 'ticket_ma_7'
-        ],
-        'target': [
-            'orders', 'revenue', 'next_day_orders', 'next_day_revenue'
-        ]
-    }
+    ctx = ctx or DataContext()
+    cols: Columns = {col: sales[col].to_numpy() for col in SALES_COLUMNS if col in sales.columns}
+    
+    # Só os grupos necessários, na ordem das dependências
+    groups = resolve_feature_groups(columns)
+    print(f"   🧩 Grupos de features: {', '.join(g.name for g in groups)}")
+    
+    for group in groups:
+        with ctx.stage(f"features:{group.name}"):
+            cols.update(group.compute(cols, ctx))
+    
+    # Montar o DataFrame uma única vez (vendas + grupos na ordem do registro)
+    order = [g for g in FEATURE_REGISTRY.values() if g in groups]
+    names = [c for c in SALES_COLUMNS if c in cols] + [c for g in order for c in g.outputs]
+    
+    return pd.DataFrame({name: cols[name] for name in names})
 
 
 if __name__ == "__main__":
@@ -303,4 +535,3 @@ if __name__ == "__main__":
         output_path = "data/features_dataset.csv"
         df.to_csv(output_path, index=False)
         print(f"\n💾 Dataset salvo em: {output_path}")
-
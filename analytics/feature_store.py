@@ -0,0 +1,170 @@
+"""
+Feature store: snapshots versionados do dataset de features
+
+Cada dataset calculado é salvo em data/feature_store/ em Feather, com um id
+derivado do conteúdo que o produziu: a versão das definições das features
+(feature_definition_hash), as impressões digitais das tabelas de origem, as
+colunas e o intervalo de datas. A mesma chave em outra execução (treino,
+previsão ou backtest) lê o snapshot do disco em vez de recalcular; o id fica
+gravado no modelo salvo, e load_snapshot(id) devolve exatamente a matriz usada
+no treino.
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+
+from config import DATA_DIR, DATE_DIMENSION_END_YEAR, DATE_DIMENSION_START_YEAR
+from database import get_engine
+from snapshot_cache import SOURCES, table_fingerprint
+
+
+STORE_DIR = DATA_DIR / "feature_store"
+
+# Snapshots mantidos no disco (os usados há mais tempo são removidos primeiro)
+STORE_KEEP = 30
+
+# Tabelas de origem das features (vendas, clima e feriados)
+INPUT_TABLES = sorted({SOURCES[name][0] for name in ('sales', 'weather', 'holidays')})
+
+
+def input_fingerprints() -> Optional[Dict[str, str]]:
+    """
+    Impressão digital de cada tabela de origem (None se o banco não respondeu)
+    """
+    fingerprints = {table: table_fingerprint(table) for table in INPUT_TABLES}
+    if not all(fingerprints.values()):
+        return None
+    return fingerprints
+
+
+def dataset_fingerprint(df: pd.DataFrame) -> str:
+    """Hash do conteúdo de um dataset (identifica os dados mesmo fora do feature store)"""
+    return format(int(pd.util.hash_pandas_object(df, index=False).sum()) & (2 ** 64 - 1), 'x')
+
+
+def snapshot_key(
+    definition: str,
+    columns: Sequence[str],
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    inputs: Optional[Dict[str, str]] = None
+) -> Optional[str]:
+    """
+    Id do snapshot: hash da definição das features + entradas + colunas + intervalo
+
+    Returns:
+        Id hexadecimal (None quando as entradas não puderam ser identificadas)
+    """
+    inputs = inputs if inputs is not None else input_fingerprints()
+    if inputs is None:
+        return None
+
+    payload = {
+        'definition': definition,
+        'inputs': inputs,
+        'database': get_engine().url.render_as_string(hide_password=True),
+        'calendar_years': [DATE_DIMENSION_START_YEAR, DATE_DIMENSION_END_YEAR],
+        'columns': sorted(columns),
+        'start_date': start_date,
+        'end_date': end_date,
+    }
+    raw = json.dumps(payload, sort_keys=True).encode()
+    return hashlib.sha256(raw).hexdigest()[:20]
+
+
+def _data_path(snapshot_id: str):
+    return STORE_DIR / f"{snapshot_id}.feather"
+
+
+def _meta_path(snapshot_id: str):
+    return STORE_DIR / f"{snapshot_id}.json"
+
+
+def load_snapshot(snapshot_id: Optional[str]) -> Optional[pd.DataFrame]:
+    """
+    Dataset salvo com esse id (None se não existe ou está corrompido)
+    """
+    if not snapshot_id:
+        return None
+
+    path = _data_path(snapshot_id)
+    try:
+        df = feather.read_table(path, memory_map=True).to_pandas()
+    except (OSError, pa.ArrowInvalid):
+        return None
+
+    # Marca o uso: a limpeza remove primeiro os snapshots esquecidos
+    os.utime(path)
+    df.attrs['feature_snapshot'] = snapshot_id
+    return df
+
+
+def save_snapshot(snapshot_id: str, df: pd.DataFrame, meta: Optional[Dict] = None) -> None:
+    """
+    Salva o dataset (gravação atômica) com seus metadados e limpa os snapshots antigos
+    """
+    STORE_DIR.mkdir(parents=True, exist_ok=True)
+
+    tmp = _data_path(snapshot_id).with_suffix('.tmp')
+    feather.write_feather(df.reset_index(drop=True), tmp, compression='uncompressed')
+    os.replace(tmp, _data_path(snapshot_id))
+
+    info = {
+        'id': snapshot_id,
+        'rows': len(df),
+        'columns': list(df.columns),
+        'created_at': pd.Timestamp.now().isoformat(),
+        **(meta or {}),
+    }
+    _meta_path(snapshot_id).write_text(json.dumps(info, indent=2))
+
+    prune_snapshots()
+
+
+def snapshot_info(snapshot_id: str) -> Dict:
+    """Metadados de um snapshot (vazio se não existe)"""
+    try:
+        return json.loads(_meta_path(snapshot_id).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def list_snapshots() -> List[Dict]:
+    """Metadados dos snapshots salvos, do usado mais recentemente ao mais antigo"""
+    if not STORE_DIR.exists():
+        return []
+    paths = sorted(STORE_DIR.glob("*.feather"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [{'id': p.stem, **snapshot_info(p.stem)} for p in paths]
+
+
+def prune_snapshots(keep: int = STORE_KEEP) -> int:
+    """
+    Remove os snapshots usados há mais tempo, mantendo `keep`
+
+    Returns:
+        Número de snapshots removidos
+    """
+    removed = 0
+    for info in list_snapshots()[keep:]:
+        for path in (_data_path(info['id']), _meta_path(info['id'])):
+            if path.exists():
+                path.unlink()
+        removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    print("📦 Feature store")
+
+    snapshots = list_snapshots()
+    if not snapshots:
+        print("   Nenhum snapshot salvo")
+
+    for info in snapshots:
+        print(f"   {info['id']}  {info.get('rows', '?'):>6} linhas  "
+              f"{len(info.get('columns', [])):>3} colunas  {info.get('created_at', '')[:19]}")
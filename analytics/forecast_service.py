@@ -0,0 +1,423 @@
+"""
+Serviço de previsão (FastAPI) com o modelo e as features em memória
+
+Um processo de longa duração mantém o campeão do registro de modelos, o
+histórico de features (com a dimensão de datas no DataContext) e as features
+dos próximos dias já montadas. Cada requisição só recorta, aplica o cenário
+e chama o modelo; as previsões de cada linha ficam em um LRU pela chave
+(modelo, vetor de features), então horizontes e cenários repetidos não
+chamam o modelo de novo.
+
+O serviço recarrega sozinho quando o registro troca de campeão (treino ou
+rollback) e quando as tabelas de origem mudam (conferido a cada
+DATA_CHECK_SECONDS). A latência de cada endpoint fica em /metrics.
+
+Uso:
+    python forecast_service.py                 # 127.0.0.1:8765 (ANALYTICS_SERVICE_HOST/PORT)
+    python forecast_service.py --port 9000
+"""
+import argparse
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from pydantic import BaseModel, Field
+
+from config import FORECAST_DAYS, MODEL_VERSION, SERVICE_HOST, SERVICE_PORT
+from data_context import DataContext
+from demand_forecaster import DemandForecaster, derive_weather_flags, generate_future_features
+from feature_engineering import FEATURE_REGISTRY, create_feature_dataset
+from feature_store import input_fingerprints
+from model_registry import MANIFEST_PATH
+
+
+# Previsões (uma por dia × cenário) mantidas no LRU
+CACHE_SIZE = 4096
+
+# Faixas do histograma de latência (ms) e requisições usadas nos percentis
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+LATENCY_WINDOW = 1000
+
+# Intervalo entre as conferências de dados novos no banco (s)
+DATA_CHECK_SECONDS = 300
+
+# Colunas que um cenário pode alterar; mudar o clima recalcula os indicadores derivados
+WEATHER_INPUTS = ('tempMin', 'tempMax', 'tempAvg', 'precipitation')
+WHAT_IF_COLUMNS = FEATURE_REGISTRY['weather'].features + FEATURE_REGISTRY['holiday'].features
+
+# Valores de cada previsão no cache (chaves de DemandForecaster.predict) e campos dos limites na resposta
+PREDICTION_COLUMNS = ('orders', 'revenue', 'orders_lower', 'orders_upper', 'revenue_lower', 'revenue_upper')
+INTERVAL_FIELDS = ('ordersLower', 'ordersUpper', 'revenueLower', 'revenueUpper')
+
+
+def _interval_fields(row: np.ndarray) -> Dict[str, Optional[float]]:
+    """Limites do intervalo de uma linha de previsões (None se o modelo não tem intervalos)"""
+    return {name: None if np.isnan(value) else float(value) for name, value in zip(INTERVAL_FIELDS, row[2:])}
+
+
+class PredictionCache:
+    """LRU de previsões (pedidos, receita e limites) por (modelo, vetor de features)"""
+
+    def __init__(self, size: int = CACHE_SIZE):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[Tuple[float, ...]]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Tuple, value: Tuple[float, ...]) -> None:
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._items),
+            'capacity': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hitRate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+class LatencyHistogram:
+    """Latência de um endpoint: contagem por faixa e percentis das últimas requisições"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def observe(self, ms: float) -> None:
+        with self._lock:
+            self.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.recent.append(ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = np.array(self.recent)
+            buckets = list(self.buckets)
+        labels = [f"<={limit}ms" for limit in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'count': self.count,
+            'meanMs': self.total_ms / self.count if self.count else 0.0,
+            'p50Ms': float(np.percentile(recent, 50)) if len(recent) else 0.0,
+            'p99Ms': float(np.percentile(recent, 99)) if len(recent) else 0.0,
+            'buckets': dict(zip(labels, buckets)),
+        }
+
+
+def _mtime(path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+class ForecastState:
+    """Campeão do registro, histórico de features e features futuras, mantidos em memória"""
+
+    def __init__(self):
+        self.cache = PredictionCache()
+        self.forecaster: Optional[DemandForecaster] = None
+        self.history: Optional[pd.DataFrame] = None
+        # Features dos próximos `forecaster.horizon` dias (base de todas as requisições)
+        self.future: Optional[pd.DataFrame] = None
+        self.model_key = None
+        self.loaded_at = None
+        self._manifest_mtime = None
+        self._inputs = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+
+    def load(self) -> None:
+        """Carrega o campeão e monta as features (o estado antigo segue valendo até o fim)"""
+        with self._lock:
+            manifest_mtime = _mtime(MANIFEST_PATH)
+            inputs = input_fingerprints()
+
+            forecaster = DemandForecaster()
+            if not forecaster.load():
+                raise RuntimeError("Modelo não encontrado. Execute run_pipeline.py --train")
+
+            ctx = DataContext()
+            history = create_feature_dataset(ctx=ctx, columns=forecaster.required_columns())
+            if history.empty:
+                raise RuntimeError("Sem dados históricos")
+            future = generate_future_features(history, forecaster.horizon, ctx)
+
+            # Carrega scaler e estimadores agora, fora do caminho das requisições
+            forecaster.predict(future.head(1))
+
+            self.forecaster = forecaster
+            self.history = history
+            self.future = future
+            self.model_key = forecaster.model_id or forecaster.model_version
+            self.loaded_at = pd.Timestamp.now()
+            self._manifest_mtime = manifest_mtime
+            self._inputs = inputs
+            self._checked_at = time.monotonic()
+            print(f"✅ Serviço pronto: {self.model_key} | histórico até {history['date'].max().date()}")
+
+    def _is_stale(self) -> bool:
+        """Campeão novo no registro ou dados novos nas tabelas de origem (chamar com o lock)"""
+        if _mtime(MANIFEST_PATH) != self._manifest_mtime:
+            return True
+        if time.monotonic() - self._checked_at < DATA_CHECK_SECONDS:
+            return False
+
+        self._checked_at = time.monotonic()
+        inputs = input_fingerprints()
+        return inputs is not None and inputs != self._inputs
+
+    def refresh_if_stale(self) -> None:
+        """Recarrega com um novo campeão no registro ou com dados novos nas tabelas de origem"""
+        # Atalho sem lock para o caso comum (nada mudou e a conferência de dados não venceu);
+        # a decisão é refeita com o lock, já que outra requisição pode ter acabado de recarregar
+        if (_mtime(MANIFEST_PATH) == self._manifest_mtime
+                and time.monotonic() - self._checked_at < DATA_CHECK_SECONDS):
+            return
+
+        with self._lock:
+            if not self._is_stale():
+                return
+            try:
+                self.load()
+            except RuntimeError as e:
+                # Continua com o modelo em memória; nova tentativa na próxima troca
+                self._manifest_mtime = _mtime(MANIFEST_PATH)
+                print(f"⚠️  Recarga falhou: {e}")
+
+    def _predict(self, features: pd.DataFrame) -> Tuple[np.ndarray, int]:
+        """
+        Previsões (linhas: dias; colunas: PREDICTION_COLUMNS), chamando o modelo só para as linhas fora do cache
+
+        Returns:
+            Matriz de previsões e número de linhas vindas do cache
+        """
+        X = features[self.forecaster.input_columns()].fillna(0).to_numpy(dtype='float64')
+        keys = [(self.model_key, row.tobytes()) for row in X]
+        results = [self.cache.get(key) for key in keys]
+
+        missing = [i for i, value in enumerate(results) if value is None]
+        if missing:
+            predicted = self.forecaster.predict(features.iloc[missing])
+            # Modelos sem intervalos: limites NaN (viram null na resposta)
+            columns = [predicted.get(name, np.full(len(missing), np.nan)) for name in PREDICTION_COLUMNS]
+            for j, i in enumerate(missing):
+                results[i] = tuple(float(values[j]) for values in columns)
+                self.cache.put(keys[i], results[i])
+
+        return np.array(results), len(keys) - len(missing)
+
+    def _horizon(self, days: int) -> pd.DataFrame:
+        if days > self.forecaster.horizon:
+            raise ValueError(f"Horizonte além do treinado ({self.forecaster.horizon} dias)")
+        return self.future.head(days)
+
+    def forecast(self, days: int) -> Dict[str, Any]:
+        """Previsão dos próximos `days` dias"""
+        with self._lock:
+            features = self._horizon(days)
+            values, hits = self._predict(features)
+
+        return {
+            'model': self.model_key,
+            'historyEnd': str(self.history['date'].max().date()),
+            'cacheHits': hits,
+            'predictions': [
+                {
+                    'date': str(day.date()),
+                    'horizon': int(h),
+                    'predictedOrders': row[0],
+                    'predictedRevenue': row[1],
+                    **_interval_fields(row),
+                }
+                for day, h, row in zip(features['date'], features['horizon'], values)
+            ],
+            'confidence': self.forecaster.intervals.get('coverage'),
+            'total': {'orders': float(values[:, 0].sum()), 'revenue': float(values[:, 1].sum())},
+        }
+
+    def what_if(self, days: int, changes: Dict[str, float], dates: Optional[List[date]] = None) -> Dict[str, Any]:
+        """
+        Previsão com um cenário (ex.: {'tempMax': 34, 'precipitation': 0}) ao lado da previsão base
+
+        Args:
+            days: Dias previstos
+            changes: Valores das features de clima/feriado no cenário
+            dates: Dias em que o cenário vale (padrão: todos)
+        """
+        unknown = set(changes) - set(WHAT_IF_COLUMNS)
+        if unknown:
+            raise ValueError(f"Colunas fora do cenário: {sorted(unknown)} (opções: {', '.join(WHAT_IF_COLUMNS)})")
+
+        with self._lock:
+            base = self._horizon(days)
+
+            mask = np.ones(len(base), dtype=bool)
+            if dates:
+                wanted = pd.to_datetime(pd.Series(dates))
+                outside = set(wanted) - set(base['date'])
+                if outside:
+                    raise ValueError(f"Datas fora do horizonte: {sorted(str(d.date()) for d in outside)}")
+                mask = base['date'].isin(wanted).to_numpy()
+
+            # Clima primeiro (recalcula os indicadores), depois os indicadores pedidos explicitamente
+            scenario = base.copy()
+            weather = {col: value for col, value in changes.items() if col in WEATHER_INPUTS}
+            for col, value in weather.items():
+                scenario.loc[mask, col] = value
+            if weather:
+                scenario = derive_weather_flags(scenario)
+            for col, value in changes.items():
+                if col not in weather:
+                    scenario.loc[mask, col] = value
+
+            baseline, base_hits = self._predict(base)
+            values, hits = self._predict(scenario)
+
+        return {
+            'model': self.model_key,
+            'changes': changes,
+            'cacheHits': base_hits + hits,
+            'predictions': [
+                {
+                    'date': str(day.date()),
+                    'horizon': int(h),
+                    'changed': bool(changed),
+                    'predictedOrders': orders,
+                    'predictedRevenue': revenue,
+                    'baselineOrders': base_orders,
+                    'baselineRevenue': base_revenue,
+                }
+                for day, h, changed, (orders, revenue, *_), (base_orders, base_revenue, *_)
+                in zip(scenario['date'], scenario['horizon'], mask, values, baseline)
+            ],
+            'total': {
+                'orders': float(values[:, 0].sum()),
+                'revenue': float(values[:, 1].sum()),
+                'baselineOrders': float(baseline[:, 0].sum()),
+                'baselineRevenue': float(baseline[:, 1].sum()),
+            },
+        }
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            'model': self.model_key,
+            'backend': self.forecaster.backend,
+            'horizon': self.forecaster.horizon,
+            'loadedAt': self.loaded_at.isoformat(),
+            'historyEnd': str(self.history['date'].max().date()),
+            'cache': self.cache.stats(),
+        }
+
+
+class WhatIfRequest(BaseModel):
+    days: int = Field(FORECAST_DAYS, ge=1)
+    changes: Dict[str, float]
+    dates: Optional[List[date]] = None
+
+
+def create_app(state: Optional[ForecastState] = None) -> FastAPI:
+    """App FastAPI sobre um ForecastState (carregado na subida se ainda não foi)"""
+    state = state or ForecastState()
+    latencies: Dict[str, LatencyHistogram] = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        if state.forecaster is None:
+            state.load()
+        yield
+
+    app = FastAPI(title="Pirata Pizzaria - Previsão de demanda", version=MODEL_VERSION, lifespan=lifespan)
+
+    @app.middleware("http")
+    async def measure_latency(request: Request, call_next):
+        start = time.perf_counter()
+        response = await call_next(request)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        # Um histograma por rota (caminhos desconhecidos juntos)
+        route = request.scope.get('route')
+        name = f"{request.method} {route.path}" if route is not None else 'other'
+        latencies.setdefault(name, LatencyHistogram()).observe(elapsed_ms)
+        response.headers['X-Elapsed-Ms'] = f"{elapsed_ms:.2f}"
+        return response
+
+    @app.get("/health")
+    def health():
+        state.refresh_if_stale()
+        return state.health()
+
+    @app.get("/forecast")
+    def forecast(days: int = Query(FORECAST_DAYS, ge=1)):
+        state.refresh_if_stale()
+        try:
+            return state.forecast(days)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.post("/forecast/what-if")
+    def what_if(request: WhatIfRequest):
+        state.refresh_if_stale()
+        try:
+            return state.what_if(request.days, request.changes, request.dates)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    @app.post("/reload")
+    def reload():
+        try:
+            state.load()
+        except RuntimeError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+        return state.health()
+
+    @app.get("/metrics")
+    def metrics():
+        return {
+            'latency': {name: histogram.snapshot() for name, histogram in sorted(latencies.items())},
+            'cache': state.cache.stats(),
+        }
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serviço de previsão de demanda')
+    parser.add_argument('--host', default=SERVICE_HOST, help='Endereço (padrão: ANALYTICS_SERVICE_HOST)')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help='Porta (padrão: ANALYTICS_SERVICE_PORT)')
+    args = parser.parse_args()
+
+    print("🚀 Serviço de previsão - Pirata Pizzaria")
+    uvicorn.run(create_app(), host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == "__main__":
+    main()
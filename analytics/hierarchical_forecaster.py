@@ -0,0 +1,256 @@
+"""
+Previsão hierárquica por canal de venda (balcão, mesa, delivery)
+
+Monta os datasets de todas as séries (total + um por canal) em uma passada:
+calendário, feriados e clima são calculados uma vez por dia e compartilhados,
+e os lags de todas as séries saem de uma única chamada do lag_engine com as
+séries empilhadas. Um DemandForecaster por série é treinado em paralelo
+(joblib) e as previsões são reconciliadas para que os canais somem o total.
+"""
+import io
+import pickle
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from config import FORECAST_DAYS, MODELS_DIR, MODEL_VERSION
+from data_context import DataContext
+from database import SALES_CHANNELS
+from demand_forecaster import DemandForecaster, generate_future_features
+from feature_engineering import FEATURE_REGISTRY, compute_features, stacked_lag_features
+
+
+TOTAL = 'TOTAL'
+
+# Ordem das séries na hierarquia: total primeiro, depois os canais (folhas)
+SERIES = (TOTAL,) + SALES_CHANNELS
+
+# Grupos calculados uma vez por dia e compartilhados por todas as séries
+SHARED_GROUPS = ('calendar', 'holiday', 'weather')
+
+# Colunas próprias de cada série
+SERIES_COLUMNS = ('orders', 'revenue', 'avg_ticket')
+
+TARGETS = ('orders', 'revenue')
+
+
+def summing_matrix(channels: int) -> np.ndarray:
+    """Matriz S da hierarquia: total = soma dos canais, cada canal = ele mesmo"""
+    return np.vstack([np.ones((1, channels)), np.eye(channels)])
+
+
+def reconcile(base: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    Reconcilia previsões (séries × dias) para que os canais somem o total
+
+    Mínimos quadrados ponderados: y = S (Sᵀ W S)⁻¹ Sᵀ W y_base, com W = peso de
+    cada série (inverso do erro quadrático de validação). A diferença entre o
+    total e a soma dos canais é distribuída mais para as séries menos precisas.
+
+    Args:
+        base: Previsões independentes, uma linha por série na ordem de SERIES
+        weights: Peso de cada série
+    """
+    S = summing_matrix(base.shape[0] - 1)
+    W = np.diag(weights)
+    projection = S @ np.linalg.solve(S.T @ W @ S, S.T @ W)
+    return projection @ base
+
+
+def build_series_datasets(ctx: Optional[DataContext] = None) -> Dict[str, pd.DataFrame]:
+    """
+    Datasets de features de todas as séries, com as colunas do DemandForecaster
+
+    Returns:
+        Série ('TOTAL', 'COUNTER', 'TABLE', 'DELIVERY') -> DataFrame
+    """
+    ctx = ctx or DataContext()
+    sales = ctx.source('sales')
+    if sales.empty:
+        return {}
+
+    channels = ctx.source('channels')
+    dates = sales['date'].reset_index(drop=True)
+    n = len(dates)
+
+    # 1. Calendário, feriados e clima: uma linha por dia, para todas as séries
+    shared_columns = [col for name in SHARED_GROUPS for col in FEATURE_REGISTRY[name].outputs]
+    shared = compute_features(sales, shared_columns, ctx)
+
+    with ctx.stage('hierarquia:séries'):
+        # 2. Séries empilhadas nos mesmos dias (canal sem pedidos no dia = 0)
+        grid = pd.MultiIndex.from_product([SALES_CHANNELS, dates], names=['channel', 'date'])
+        by_channel = channels.set_index(['channel', 'date']).reindex(grid)
+
+        stacked = {
+            col: np.concatenate([
+                sales[col].to_numpy(dtype='float64'),
+                by_channel[col].fillna(0).to_numpy(dtype='float64'),
+            ])
+            for col in SERIES_COLUMNS
+        }
+        groups = np.repeat(np.array(SERIES), n)
+
+        # 3. Lags de todas as séries em uma passada, sem atravessar a fronteira entre elas
+        lags = stacked_lag_features(stacked, groups)
+
+        datasets = {}
+        for i, name in enumerate(SERIES):
+            rows = slice(i * n, (i + 1) * n)
+            data = {'date': dates.to_numpy()}
+            data.update({col: stacked[col][rows] for col in SERIES_COLUMNS})
+            data.update({col: shared[col].array for col in shared_columns})
+            data.update({col: values[rows] for col, values in lags.items()})
+            datasets[name] = pd.DataFrame(data)
+
+    return datasets
+
+
+def _fit_series(df: pd.DataFrame, model_version: str) -> DemandForecaster:
+    """Treina o modelo de uma série (roda em um processo do joblib)"""
+    forecaster = DemandForecaster(model_version)
+    with redirect_stdout(io.StringIO()):
+        forecaster.train(df)
+    return forecaster
+
+
+class HierarchicalForecaster:
+    """
+    Um DemandForecaster por série da hierarquia, com previsões reconciliadas
+    """
+
+    def __init__(self, model_version: str = MODEL_VERSION, n_jobs: int = -1):
+        self.model_version = model_version
+        self.n_jobs = n_jobs
+        self.forecasters: Dict[str, DemandForecaster] = {}
+        self.weights: Dict[str, np.ndarray] = {}
+
+    def train(self, datasets: Dict[str, pd.DataFrame]) -> Dict[str, Dict]:
+        """
+        Treina todas as séries em paralelo (um processo por série)
+
+        Returns:
+            Série -> métricas do DemandForecaster
+        """
+        print(f"🎯 Treinando {len(datasets)} séries em paralelo...")
+
+        fitted = Parallel(n_jobs=self.n_jobs)(
+            delayed(_fit_series)(datasets[name], self.model_version) for name in SERIES
+        )
+        self.forecasters = dict(zip(SERIES, fitted))
+
+        # Peso de cada série na reconciliação: inverso do erro quadrático de validação
+        for target in TARGETS:
+            rmse = np.array([self.forecasters[name].metrics[target]['rmse'] for name in SERIES])
+            self.weights[target] = 1 / np.maximum(rmse, 1e-6) ** 2
+
+        print(f"\n   {'Série':<10} {'MAE pedidos':>12} {'MAE receita':>14}")
+        for name in SERIES:
+            metrics = self.forecasters[name].metrics
+            print(f"   {name:<10} {metrics['orders']['mae']:>12.2f} "
+                  f"{'R$ ' + format(metrics['revenue']['mae'], ',.2f'):>14}")
+
+        return {name: forecaster.metrics for name, forecaster in self.forecasters.items()}
+
+    def predict(
+        self,
+        datasets: Dict[str, pd.DataFrame],
+        days_ahead: int = FORECAST_DAYS,
+        ctx: Optional[DataContext] = None
+    ) -> Dict[str, Any]:
+        """
+        Previsões reconciliadas dos próximos dias
+
+        Returns:
+            Dicionário com 'dates', 'orders' e 'revenue' (série -> array reconciliado)
+            e 'base' (previsões antes da reconciliação)
+        """
+        if not self.forecasters:
+            raise ValueError("Modelo não treinado. Execute train() primeiro.")
+
+        ctx = ctx or DataContext()
+        base = {
+            name: self.forecasters[name].predict(generate_future_features(datasets[name], days_ahead, ctx))
+            for name in SERIES
+        }
+
+        result = {'dates': base[TOTAL]['dates'], 'base': base}
+        for target in TARGETS:
+            matrix = np.vstack([base[name][target] for name in SERIES])
+            reconciled = reconcile(matrix, self.weights[target])
+            result[target] = dict(zip(SERIES, reconciled))
+
+        return result
+
+    def save(self, path: Optional[Path] = None) -> str:
+        """
+        Salva os modelos de todas as séries
+        """
+        if path is None:
+            path = MODELS_DIR / f"hierarchical_model_{self.model_version}.pkl"
+
+        model_data = {
+            'version': self.model_version,
+            'forecasters': self.forecasters,
+            'weights': self.weights,
+            'trained_at': datetime.now().isoformat()
+        }
+
+        with open(path, 'wb') as f:
+            pickle.dump(model_data, f)
+
+        print(f"💾 Modelos por canal salvos em: {path}")
+        return str(path)
+
+    def load(self, path: Optional[Path] = None) -> bool:
+        """
+        Carrega os modelos salvos
+        """
+        if path is None:
+            path = MODELS_DIR / f"hierarchical_model_{self.model_version}.pkl"
+
+        if not path.exists():
+            print(f"❌ Modelo não encontrado: {path}")
+            return False
+
+        with open(path, 'rb') as f:
+            model_data = pickle.load(f)
+
+        self.model_version = model_data['version']
+        self.forecasters = model_data['forecasters']
+        self.weights = model_data['weights']
+
+        print(f"✅ Modelos por canal carregados: v{self.model_version}")
+        return True
+
+
+if __name__ == "__main__":
+    print("🧭 Previsão hierárquica por canal - Pirata Pizzaria")
+    print("=" * 60)
+
+    ctx = DataContext()
+    datasets = build_series_datasets(ctx)
+
+    if not datasets:
+        print("❌ Sem dados para treinar")
+        exit(1)
+
+    forecaster = HierarchicalForecaster()
+    forecaster.train(datasets)
+    forecaster.save()
+
+    predictions = forecaster.predict(datasets, ctx=ctx)
+    orders = predictions['orders']
+
+    print(f"\n🔮 Pedidos previstos para os próximos {FORECAST_DAYS} dias:")
+    print(f"   {'Data':<12}" + "".join(f"{name:>10}" for name in SERIES))
+    for i, date in enumerate(predictions['dates']):
+        print(f"   {pd.Timestamp(date):%Y-%m-%d}  " + "".join(f"{orders[name][i]:>10.1f}" for name in SERIES))
+
+    gap = np.abs(orders[TOTAL] - sum(orders[name] for name in SALES_CHANNELS)).max()
+    print(f"\n   ✅ Maior diferença total - soma dos canais: {gap:.2e}")
@@ -0,0 +1,253 @@
+"""
+Demanda por hora e previsão intradiária por turno
+
+A agregação dia × hora roda no próprio banco (GROUP BY) e fica guardada em
+data/ em Feather, com tipos compactos (dayKey int32, hora int8, pedidos
+int16, receita float32) e só as horas que tiveram pedidos. A atualização é
+incremental: usa a marca d'água dos pedidos (a mesma de sales_metrics) e
+reagrega no banco apenas os dias alterados.
+
+O perfil horário recente de cada dia da semana divide a previsão diária em
+pedidos esperados por hora e por turno (SHIFT_HOURS).
+"""
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from sqlalchemy import text
+
+from config import DATA_DIR, SHIFT_HOURS
+from database import (
+    get_connection, is_mysql, load_state, opened_at_days, sales_day_expr, sales_hour_expr, save_state
+)
+from date_dimension import EPOCH, day_keys
+from sales_metrics import find_changed_days, get_change_watermark
+
+
+HOURLY_PATH = DATA_DIR / "sales_hourly.feather"
+STATE_PATH = DATA_DIR / "sales_hourly_state.json"
+
+# Semanas recentes usadas no perfil horário
+PROFILE_WEEKS = 8
+
+# Pedidos "emprestados" do perfil geral por dia da semana (suaviza dias com pouco histórico)
+PROFILE_PRIOR = 50
+
+
+def aggregate_hours(conn, days: Optional[list] = None) -> pd.DataFrame:
+    """
+    Pedidos e receita por dia × hora, agregados no banco (todos os dias ou apenas os informados)
+
+    Returns:
+        DataFrame compacto (dayKey, hour, orders, revenue)
+    """
+    amount = "amount" if is_mysql() else "CAST(amount AS REAL)"
+    query = f"""
+        SELECT {sales_day_expr()} as date, {sales_hour_expr()} as hour,
+            COUNT(*) as orders,
+            SUM({amount}) as revenue
+        FROM sales_orders
+        WHERE deletedAt IS NULL
+    """
+    params = {}
+
+    if days is not None:
+        # Intervalos sobre openedAt "cru" usam o índice em vez de varrer a tabela
+        predicate, params = opened_at_days(days)
+        query += f" AND {predicate}"
+
+    query += " GROUP BY 1, 2 ORDER BY 1, 2"
+
+    df = pd.read_sql_query(text(query), conn, params=params)
+
+    # Texto no SQLite, date no MySQL
+    return pd.DataFrame({
+        'dayKey': day_keys(df['date'].astype(str)),
+        'hour': df['hour'].astype('int8'),
+        'orders': df['orders'].astype('int16'),
+        'revenue': df['revenue'].fillna(0).astype('float32'),
+    })
+
+
+def _empty_hourly() -> pd.DataFrame:
+    return pd.DataFrame({
+        'dayKey': pd.Series(dtype='int32'),
+        'hour': pd.Series(dtype='int8'),
+        'orders': pd.Series(dtype='int16'),
+        'revenue': pd.Series(dtype='float32'),
+    })
+
+
+def load_hourly_sales() -> pd.DataFrame:
+    """Tabela dia × hora salva (vazia se ainda não foi gerada)"""
+    try:
+        return feather.read_table(HOURLY_PATH, memory_map=True).to_pandas()
+    except (OSError, pa.ArrowInvalid):
+        return _empty_hourly()
+
+
+def _write_hourly(table: pd.DataFrame) -> None:
+    """Grava em um arquivo temporário e troca de uma vez (leitores nunca veem um arquivo pela metade)"""
+    tmp = HOURLY_PATH.with_suffix('.tmp')
+    feather.write_feather(table.reset_index(drop=True), tmp, compression='uncompressed')
+    os.replace(tmp, HOURLY_PATH)
+
+
+def refresh_hourly_sales(full: bool = False) -> Dict:
+    """
+    Atualiza a tabela dia × hora reagregando apenas os dias com pedidos alterados
+
+    Args:
+        full: Força a reconstrução completa (ignora a marca d'água)
+
+    Returns:
+        Dicionário com o modo usado, os dias reagregados e o total de linhas
+    """
+    state = load_state(STATE_PATH)
+
+    with get_connection(readonly=True) as conn:
+        current = get_change_watermark(conn)
+
+        # Sem estado, sem arquivo ou com pedidos apagados fisicamente: refazer tudo
+        rebuild = (
+            full
+            or not state
+            or not HOURLY_PATH.exists()
+            or current['orders'] < state.get('orders', 0)
+        )
+
+        if rebuild:
+            days = None
+        elif current['watermark'] <= state.get('watermark', 0):
+            return {'mode': 'unchanged', 'days': 0, 'rows': len(load_hourly_sales())}
+        else:
+            days = find_changed_days(conn, state['watermark'])
+
+        fresh = aggregate_hours(conn, days)
+
+    if rebuild:
+        table = fresh
+    else:
+        # Dias alterados saem inteiros e voltam reagregados (dia sem pedidos some)
+        table = load_hourly_sales()
+        changed = day_keys(pd.Series(days, dtype=object))
+        table = pd.concat([table[~table['dayKey'].isin(changed)], fresh], ignore_index=True)
+        table = table.sort_values(['dayKey', 'hour'], kind='stable')
+
+    _write_hourly(table)
+    save_state(STATE_PATH, current)
+
+    return {
+        'mode': 'full' if rebuild else 'incremental',
+        'days': table['dayKey'].nunique() if rebuild else len(days),
+        'rows': len(table),
+    }
+
+
+def hourly_profile(hourly: pd.DataFrame, weeks: int = PROFILE_WEEKS) -> np.ndarray:
+    """
+    Fração dos pedidos do dia em cada hora, por dia da semana (7 × 24, linhas somam 1)
+
+    Usa as últimas `weeks` semanas. Cada dia da semana é suavizado com
+    PROFILE_PRIOR pedidos do perfil geral, para não depender de poucas semanas.
+    """
+    if hourly.empty:
+        return np.full((7, 24), 1 / 24)
+
+    recent = hourly[hourly['dayKey'] > hourly['dayKey'].max() - weeks * 7]
+    # 1970-01-01 foi uma quinta-feira (0 = segunda, como no pandas)
+    weekday = (recent['dayKey'].to_numpy() + 3) % 7
+
+    counts = np.zeros((7, 24))
+    np.add.at(counts, (weekday, recent['hour'].to_numpy()), recent['orders'].to_numpy())
+
+    overall = counts.sum(axis=0) / counts.sum()
+    return (counts + PROFILE_PRIOR * overall) / (counts.sum(axis=1, keepdims=True) + PROFILE_PRIOR)
+
+
+def shift_of_hour(hours: np.ndarray) -> np.ndarray:
+    """Turno de cada hora ('off' fora dos turnos)"""
+    hours = np.asarray(hours)
+    shifts = np.full(len(hours), 'off', dtype=object)
+    for name, (start, end) in SHIFT_HOURS.items():
+        inside = (hours >= start) & (hours < end) if start < end else (hours >= start) | (hours < end)
+        shifts[inside] = name
+    return shifts
+
+
+def split_daily_forecast(dates, orders, profile: np.ndarray) -> pd.DataFrame:
+    """
+    Divide a previsão diária de pedidos em horas
+
+    As horas depois da meia-noite pertencem ao turno iniciado na véspera
+    (shiftDate = dia anterior), como no registro de ponto do jantar.
+
+    Args:
+        dates: Datas previstas
+        orders: Pedidos previstos por dia
+        profile: Perfil de hourly_profile()
+
+    Returns:
+        DataFrame (date, hour, shift, shiftDate, expectedOrders), uma linha por dia × hora
+    """
+    dates = pd.to_datetime(pd.Series(dates)).dt.normalize()
+    matrix = np.asarray(orders, dtype='float64')[:, None] * profile[dates.dt.dayofweek.to_numpy()]
+
+    hours = np.tile(np.arange(24), len(dates))
+    day = np.repeat(dates.to_numpy(), 24)
+    shifts = shift_of_hour(hours)
+
+    # Turnos que atravessam a meia-noite: a madrugada conta para o dia em que o turno começou
+    overnight = np.zeros(len(hours), dtype=bool)
+    for name, (start, end) in SHIFT_HOURS.items():
+        if start >= end:
+            overnight |= (shifts == name) & (hours < end)
+
+    return pd.DataFrame({
+        'date': day,
+        'hour': hours.astype('int8'),
+        'shift': shifts,
+        'shiftDate': day - overnight * np.timedelta64(1, 'D'),
+        'expectedOrders': matrix.ravel(),
+    })
+
+
+def shift_forecast(intraday: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pedidos esperados por dia de turno × turno
+
+    Só entram dias com o turno completo: o primeiro dia de turno começa na
+    primeira data prevista e, se algum turno atravessa a meia-noite, o último
+    dia previsto fica de fora (falta a madrugada seguinte).
+    """
+    table = intraday[intraday['shift'] != 'off'].pivot_table(
+        index='shiftDate', columns='shift', values='expectedOrders', aggfunc='sum'
+    )
+    table = table[table.index >= intraday['date'].min()]
+    if any(start >= end for start, end in SHIFT_HOURS.values()):
+        table = table[table.index < intraday['date'].max()]
+    return table[[name for name in SHIFT_HOURS if name in table.columns]]
+
+
+if __name__ == "__main__":
+    print("🕐 Atualizando vendas por hora...")
+
+    result = refresh_hourly_sales()
+    print(f"   ✅ Modo: {result['mode']} | {result['days']} dias | {result['rows']} linhas dia × hora")
+
+    hourly = load_hourly_sales()
+    print(f"   💾 {hourly.memory_usage(deep=True).sum() / 1024:.0f} KB em memória")
+
+    profile = hourly_profile(hourly)
+    weekdays_pt = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+    print("\n📈 Hora de pico por dia da semana:")
+    for dow, name in enumerate(weekdays_pt):
+        print(f"   {name}: {int(profile[dow].argmax()):02d}h ({profile[dow].max():.0%} dos pedidos)")
+
+    last_day = EPOCH + np.timedelta64(int(hourly['dayKey'].max()), 'D') if not hourly.empty else np.datetime64('today')
+    dates = pd.date_range(pd.Timestamp(last_day) + pd.Timedelta(days=1), periods=7)
+    print("\n🧑‍🍳 Pedidos por turno para 100 pedidos/dia:")
+    print(shift_forecast(split_daily_forecast(dates, np.full(7, 100.0), profile)).round(1).to_string())
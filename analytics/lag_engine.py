@@ -0,0 +1,431 @@
+"""
+Motor de lags e estatísticas móveis para várias séries de uma vez
+
+Recebe especificações (série × lags × janelas × estatísticas) e calcula tudo
+sobre uma matriz (linhas × séries): cada lag é um único deslocamento da
+matriz inteira, médias/desvios juntam trechos de 2^k linhas (Chan/Welford)
+e mínimos/máximos saem de acumulados por bloco. Cada estatística de janela
+depende só das linhas da janela: o histórico crescer não muda os dias
+anteriores. Com várias séries empilhadas (ex.: um canal de venda por
+bloco), os lags e janelas não atravessam a fronteira de cada grupo.
+
+Mesma semântica do pandas: shift(lag), rolling(janela, min_periods=1) e
+ewm(span, adjust=True), ignorando NaN.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+# Estatísticas de janela -> sufixo do nome da coluna
+WINDOW_STATS = {
+    'mean': 'ma',
+    'std': 'std',
+    'min': 'min',
+    'max': 'max',
+}
+
+# Linhas usadas por uma EWMA, em múltiplos do span: o peso além disso é < e^-20
+EWM_HORIZON = 10
+
+
+class LagSpec:
+    """
+    Lags e estatísticas de uma série
+
+    Nomes gerados: {prefix}_lag_{n}, {prefix}_ma_{n}, {prefix}_std_{n},
+    {prefix}_min_{n}, {prefix}_max_{n} e {prefix}_ewm_{span}.
+    """
+
+    def __init__(
+        self,
+        series: str,
+        lags: Sequence[int] = (),
+        windows: Sequence[int] = (),
+        stats: Sequence[str] = ('mean',),
+        spans: Sequence[int] = (),
+        prefix: Optional[str] = None
+    ):
+        unknown = set(stats) - set(WINDOW_STATS)
+        if unknown:
+            raise ValueError(f"Estatísticas desconhecidas: {', '.join(sorted(unknown))}")
+
+        self.series = series
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.stats = list(stats)
+        self.spans = list(spans)
+        self.prefix = prefix or series
+
+    @property
+    def lookback(self) -> int:
+        """Linhas anteriores necessárias para calcular o último dia"""
+        return max(self.lags + self.windows + [EWM_HORIZON * s for s in self.spans], default=0)
+
+    def columns(self) -> List[str]:
+        """Colunas produzidas, na ordem de cálculo"""
+        names = [f"{self.prefix}_lag_{lag}" for lag in self.lags]
+        for window in self.windows:
+            names += [f"{self.prefix}_{WINDOW_STATS[stat]}_{window}" for stat in self.stats]
+        names += [f"{self.prefix}_ewm_{span}" for span in self.spans]
+        return names
+
+
+def group_positions(groups: Optional[np.ndarray], n: int) -> np.ndarray:
+    """
+    Posição de cada linha dentro do seu grupo (0 na primeira linha do grupo)
+
+    As linhas de um mesmo grupo devem estar contíguas e em ordem de data.
+    """
+    if groups is None:
+        return np.arange(n)
+
+    groups = np.asarray(groups)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = groups[1:] != groups[:-1]
+    first = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    return np.arange(n) - first
+
+
+def _shift(values: np.ndarray, positions: np.ndarray, lag: int) -> np.ndarray:
+    """Desloca todas as colunas de uma vez, com NaN onde o lag sairia do grupo"""
+    out = np.full(values.shape, np.nan)
+    if lag < len(values):
+        out[lag:] = values[:-lag]
+    out[positions < lag] = np.nan
+    return out
+
+
+def _group_spread(positions: np.ndarray, window: int) -> Tuple[np.ndarray, int]:
+    """
+    Linha de cada valor com `window - 1` linhas vazias antes de cada grupo
+
+    Assim as janelas de um grupo não alcançam o grupo anterior.
+
+    Returns:
+        (linha de cada valor, total de linhas)
+    """
+    group = np.cumsum(positions == 0) - 1
+    rows = np.arange(len(positions)) + (group + 1) * (window - 1)
+    length = len(positions) + (int(group[-1]) + 1) * (window - 1) if len(positions) else 0
+    return rows, length
+
+
+def _combine(left: Tuple[np.ndarray, ...], right: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray, ...]:
+    """
+    Contagem, média e soma dos quadrados dos desvios de dois trechos vizinhos juntos
+
+    Fórmula de Chan (Welford em paralelo): estável sem subtrair somas grandes.
+    Trechos vazios têm média 0 e não mudam o outro lado.
+    """
+    count_left, mean_left, squares_left = left
+    count_right, mean_right, squares_right = right
+    count = count_left + count_right
+    step = (mean_right - mean_left) * (count_right / np.maximum(count, 1))
+    squares = squares_left + squares_right
+    squares += step * (mean_right - mean_left) * count_left
+    return count, mean_left + step, squares
+
+
+def _combine_sums(left: Tuple[np.ndarray, ...], right: Tuple[np.ndarray, ...]) -> Tuple[np.ndarray, ...]:
+    """Contagem e soma de dois trechos vizinhos juntos (só médias)"""
+    return tuple(a + b for a, b in zip(left, right))
+
+
+def _moments(
+    values: np.ndarray,
+    positions: np.ndarray,
+    windows: Sequence[int],
+    with_std: bool
+) -> Dict[int, Dict[str, np.ndarray]]:
+    """
+    Média e, com with_std, desvio (ddof=1) de todas as colunas para cada janela, ignorando NaN
+
+    A janela de n linhas junta duas janelas de n / 2 (n par) ou uma de n - 1
+    e a linha seguinte (n ímpar), cada junção uma operação sobre a matriz
+    inteira: O(log n) operações, com os trechos intermediários compartilhados
+    entre as janelas (7, 14 e 28: 6 junções ao todo). Só médias: contagem e
+    soma; com desvio: contagem, média e soma dos quadrados (_combine). A
+    ordem das contas depende só do tamanho da janela: acrescentar dias ao
+    histórico não muda nenhum bit das estatísticas dos dias anteriores, e um
+    cálculo feito só com o fim do histórico (lookback) é idêntico ao do
+    histórico completo.
+
+    Returns:
+        Janela -> {'mean': array} (e 'std' com with_std)
+    """
+    stats = ('mean', 'std') if with_std else ('mean',)
+    if not len(values):
+        return {window: {stat: np.full(values.shape, np.nan) for stat in stats} for window in windows}
+
+    rows, length = _group_spread(positions, max(windows))
+    observed = ~np.isnan(values)
+    count = np.zeros((length, values.shape[1]))
+    filled = np.zeros((length, values.shape[1]))
+    count[rows] = observed
+    filled[rows] = np.where(observed, values, 0.0)
+
+    # Trecho de n linhas começando em cada linha (array i = trecho que começa na linha i):
+    # n par junta duas metades, n ímpar junta n - 1 linhas e a seguinte
+    combine = _combine if with_std else _combine_sums
+    segments = {1: (count, filled, np.zeros_like(filled)) if with_std else (count, filled)}
+
+    def segment(n: int) -> Tuple[np.ndarray, ...]:
+        if n not in segments:
+            size = n // 2 if n % 2 == 0 else n - 1
+            head, tail = segment(size), segment(n - size)
+            starts = length - n + 1
+            segments[n] = combine(
+                tuple(x[:starts] for x in head),
+                tuple(x[size:size + starts] for x in tail)
+            )
+        return segments[n]
+
+    out = {}
+    for window in windows:
+        # Um grupo só: as janelas dos valores são linhas seguidas (fatia em vez de cópia indexada)
+        first = rows[0] - window + 1
+        index = slice(first, first + len(rows)) if rows[-1] - rows[0] == len(rows) - 1 else rows - window + 1
+        total = segment(window)
+        count, center = total[0][index], total[1][index]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if with_std:
+                squares = total[2][index]
+                out[window] = {
+                    'mean': np.where(count > 0, center, np.nan),
+                    'std': np.where(count > 1, np.sqrt(squares / (count - 1)), np.nan),
+                }
+            else:
+                out[window] = {'mean': np.where(count > 0, center / count, np.nan)}
+
+    return out
+
+
+def _sliding_extreme(values: np.ndarray, window: int, op: np.ufunc, fill: float) -> np.ndarray:
+    """
+    Mínimo/máximo das últimas `window` linhas (van Herk/Gil-Werman)
+
+    Acumulados por bloco de `window` linhas, da esquerda e da direita: cada
+    janela junta o fim de um bloco com o começo do seguinte. O(n) para
+    qualquer tamanho de janela.
+    """
+    length, columns = values.shape
+    size = -(-length // window) * window
+    padded = np.full((size, columns), fill)
+    padded[:length] = values
+
+    blocks = padded.reshape(-1, window, columns)
+    prefix = op.accumulate(blocks, axis=1).reshape(size, columns)
+    suffix = op.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape(size, columns)
+
+    out = np.full((length, columns), fill)
+    ends = np.arange(window - 1, length)
+    out[window - 1:] = op(suffix[ends - window + 1], prefix[ends])
+    return out
+
+
+def _extremes(values: np.ndarray, positions: np.ndarray, window: int, stats: set) -> Dict[str, np.ndarray]:
+    """
+    Mínimo e máximo de todas as colunas, ignorando NaN (grupos separados por _group_spread)
+    """
+    rows, length = _group_spread(positions, window)
+    missing = np.isnan(values)
+    out = {}
+
+    for stat in stats:
+        op, fill = (np.minimum, np.inf) if stat == 'min' else (np.maximum, -np.inf)
+        spread = np.full((length, values.shape[1]), fill)
+        spread[rows] = np.where(missing, fill, values)
+        result = _sliding_extreme(spread, window, op, fill)[rows]
+        # Janela sem valores dá NaN, como no pandas
+        out[stat] = np.where(np.isinf(result), np.nan, result)
+
+    return out
+
+
+def _ewm(values: np.ndarray, positions: np.ndarray, span: int) -> np.ndarray:
+    """
+    Média móvel exponencial (adjust=True) de todas as colunas, reiniciada em cada grupo
+
+    Soma ponderada e soma dos pesos por somas acumuladas (x·decay^-i), em blocos
+    curtos o bastante para decay^-i não estourar; cada bloco herda o anterior.
+    """
+    decay = 1 - 2 / (span + 1)
+    observed = ~np.isnan(values)
+    filled = np.where(observed, values, 0.0)
+    out = np.full(values.shape, np.nan)
+
+    block = max(1, int(300 / -np.log(decay)))
+    bounds = list(np.flatnonzero(positions == 0)) + [len(values)]
+
+    for group_start, group_end in zip(bounds[:-1], bounds[1:]):
+        carry_sum = np.zeros(values.shape[1])
+        carry_weight = np.zeros(values.shape[1])
+
+        for start in range(group_start, group_end, block):
+            end = min(start + block, group_end)
+            steps = np.arange(end - start)[:, None]
+            grow, shrink = decay ** -steps, decay ** steps
+            inherited = decay ** (steps + 1)
+
+            weighted = shrink * np.cumsum(filled[start:end] * grow, axis=0) + inherited * carry_sum
+            weights = shrink * np.cumsum(observed[start:end] * grow, axis=0) + inherited * carry_weight
+
+            with np.errstate(invalid='ignore', divide='ignore'):
+                out[start:end] = np.where(weights > 0, weighted / weights, np.nan)
+            carry_sum, carry_weight = weighted[-1], weights[-1]
+
+    return out
+
+
+def compute_lags(
+    data: Dict[str, np.ndarray],
+    specs: Sequence[LagSpec],
+    groups: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Calcula todas as colunas das especificações em uma passada vetorizada
+
+    Args:
+        data: Série -> array (todas com o mesmo tamanho, ordenadas por data)
+        specs: Especificações de lags/janelas/estatísticas
+        groups: Rótulo do grupo de cada linha (várias séries empilhadas)
+
+    Returns:
+        Dicionário coluna -> array
+    """
+    series = list(dict.fromkeys(spec.series for spec in specs))
+    if not series:
+        return {}
+
+    matrix = np.column_stack([np.asarray(data[name], dtype='float64') for name in series])
+    column = {name: i for i, name in enumerate(series)}
+    positions = group_positions(groups, len(matrix))
+    out: Dict[str, np.ndarray] = {}
+
+    # Um deslocamento da matriz inteira por lag distinto
+    for lag in sorted({lag for spec in specs for lag in spec.lags}):
+        shifted = _shift(matrix, positions, lag)
+        for spec in specs:
+            if lag in spec.lags:
+                out[f"{spec.prefix}_lag_{lag}"] = shifted[:, column[spec.series]]
+
+    # Estatísticas de janela, cada cálculo só nas séries que o pedem: médias (só
+    # somas), médias com desvio (todas as janelas juntas) e mínimos/máximos
+    reduced: Dict[Tuple[str, int, str], np.ndarray] = {}
+
+    def series_with(test) -> List[str]:
+        return list(dict.fromkeys(spec.series for spec in specs if spec.windows and test(set(spec.stats))))
+
+    for with_std in (False, True):
+        names = series_with(lambda stats: 'std' in stats if with_std else stats & {'mean', 'std'} == {'mean'})
+        if names:
+            windows = sorted({w for spec in specs if spec.series in names for w in spec.windows})
+            results = _moments(matrix[:, [column[name] for name in names]], positions, windows, with_std)
+            for window, stats in results.items():
+                for stat, values in stats.items():
+                    for i, name in enumerate(names):
+                        reduced[(name, window, stat)] = values[:, i]
+
+    names = series_with(lambda stats: bool(stats & {'min', 'max'}))
+    for window in sorted({w for spec in specs if spec.series in names for w in spec.windows}):
+        wanted = {stat for spec in specs if window in spec.windows for stat in spec.stats} & {'min', 'max'}
+        results = _extremes(matrix[:, [column[name] for name in names]], positions, window, wanted)
+        for stat, values in results.items():
+            for i, name in enumerate(names):
+                reduced[(name, window, stat)] = values[:, i]
+
+    for spec in specs:
+        for window in spec.windows:
+            for stat in spec.stats:
+                out[f"{spec.prefix}_{WINDOW_STATS[stat]}_{window}"] = reduced[(spec.series, window, stat)]
+
+    for span in sorted({s for spec in specs for s in spec.spans}):
+        names = list(dict.fromkeys(spec.series for spec in specs if span in spec.spans))
+        smoothed = _ewm(matrix[:, [column[name] for name in names]], positions, span)
+        for spec in specs:
+            if span in spec.spans:
+                out[f"{spec.prefix}_ewm_{span}"] = smoothed[:, names.index(spec.series)]
+
+    # Ordem das colunas igual à das especificações
+    return {name: out[name] for spec in specs for name in spec.columns()}
+
+
+def _pandas_lags(df: pd.DataFrame, specs: Sequence[LagSpec], group: Optional[str]) -> Dict[str, np.ndarray]:
+    """Mesmo cálculo coluna a coluna com pandas (referência do teste abaixo)"""
+    out = {}
+    for spec in specs:
+        s = df.groupby(group, sort=False)[spec.series] if group else df[spec.series]
+        for lag in spec.lags:
+            out[f"{spec.prefix}_lag_{lag}"] = s.shift(lag).to_numpy()
+        for window in spec.windows:
+            for stat in spec.stats:
+                rolled = getattr(s.rolling(window, min_periods=1), stat)()
+                if group:
+                    rolled = rolled.reset_index(level=0, drop=True).sort_index()
+                out[f"{spec.prefix}_{WINDOW_STATS[stat]}_{window}"] = rolled.to_numpy()
+        for span in spec.spans:
+            smoothed = s.transform(lambda x: x.ewm(span=span).mean()) if group else s.ewm(span=span).mean()
+            out[f"{spec.prefix}_ewm_{span}"] = smoothed.to_numpy()
+    return out
+
+
+if __name__ == "__main__":
+    import time
+
+    print("🧮 Conferindo o motor de lags contra o pandas...")
+
+    rng = np.random.default_rng(7)
+    n = 2000
+    df = pd.DataFrame({
+        'channel': np.repeat(['balcao', 'delivery', 'mesa', 'ifood'], n // 4),
+        'orders': rng.poisson(40, n).astype(float),
+        'revenue': rng.gamma(5, 800, n),
+    })
+    df.loc[rng.choice(n, 40, replace=False), 'revenue'] = np.nan
+
+    specs = [
+        LagSpec('orders', lags=[1, 7, 14, 28], windows=[7, 14, 28], stats=['mean', 'std', 'min', 'max'], spans=[7]),
+        LagSpec('revenue', lags=[1, 7], windows=[7, 14], stats=['mean', 'std'], spans=[14]),
+    ]
+
+    def best_of(run, repeats: int = 5):
+        """Resultado e menor tempo de `repeats` execuções"""
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            result = run()
+            times.append(time.perf_counter() - start)
+        return result, min(times)
+
+    for group in (None, 'channel'):
+        fast, elapsed_fast = best_of(lambda: compute_lags(
+            {c: df[c].to_numpy() for c in ('orders', 'revenue')}, specs, df[group].to_numpy() if group else None
+        ))
+        slow, elapsed_slow = best_of(lambda: _pandas_lags(df, specs, group))
+
+        worst = max(
+            np.nanmax(np.abs(fast[c] - slow[c]), initial=0.0) for c in slow
+        )
+        same_nans = all((np.isnan(fast[c]) == np.isnan(slow[c])).all() for c in slow)
+        status = "✅" if same_nans and worst < 1e-6 and elapsed_fast < elapsed_slow else "❌"
+        label = "por canal" if group else "série única"
+        print(f"   {status} {label}: {len(fast)} colunas | maior diferença {worst:.1e} | "
+              f"{elapsed_fast * 1000:.1f} ms vs {elapsed_slow * 1000:.1f} ms (pandas)")
+
+    print("🧮 Conferindo que acrescentar dias não muda os dias anteriores...")
+
+    # Cada canal perde os seus 50 últimos dias; o resto deve sair idêntico bit a bit
+    shorter = df.groupby('channel', sort=False).head(n // 4 - 50)
+    for group in (None, 'channel'):
+        before = shorter if group else df.head(n - 50)
+        partial = compute_lags({c: before[c].to_numpy() for c in ('orders', 'revenue')}, specs,
+                               before[group].to_numpy() if group else None)
+        full = compute_lags({c: df[c].to_numpy() for c in ('orders', 'revenue')}, specs,
+                            df[group].to_numpy() if group else None)
+        kept = before.index.to_numpy()
+        identical = all(np.array_equal(partial[c], full[c][kept], equal_nan=True) for c in full)
+        label = "por canal" if group else "série única"
+        print(f"   {'✅' if identical else '❌'} {label}: {len(kept)} dias anteriores "
+              f"{'idênticos' if identical else 'diferentes'} com {len(df) - len(kept)} dias a mais")
@@ -0,0 +1,251 @@
+"""
+Registro de modelos: artefatos imutáveis, com checksum, e ponteiros current/previous
+
+Cada modelo registrado ganha um diretório próprio em models/registry/{id}/,
+gravado uma única vez (diretório temporário + rename, arquivos somente
+leitura). Cada componente (scaler, modelo de pedidos, modelo de receita) é
+salvo como pickle protocolo 5 com os arrays do numpy fora do pickle, em um
+único arquivo .bin alinhado: na leitura o .bin é mapeado em memória
+(memory-map) e os arrays apontam direto para ele, sem cópia.
+
+O manifest.json guarda, para cada modelo, métricas, features, fingerprint
+dos dados de treino e o SHA-256 de cada arquivo, além dos ponteiros
+"current" (campeão usado nas previsões) e "previous" (para rollback). Abrir
+o campeão lê só o manifesto; os componentes são carregados (e conferidos
+pelo checksum) na primeira vez em que são usados.
+"""
+import hashlib
+import json
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import MODELS_DIR
+
+
+REGISTRY_DIR = MODELS_DIR / "registry"
+MANIFEST_PATH = REGISTRY_DIR / "manifest.json"
+
+# Modelos mantidos no registro (current e previous nunca são removidos)
+REGISTRY_KEEP = 20
+
+# Alinhamento dos arrays dentro do .bin (bytes)
+BUFFER_ALIGN = 64
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dump_component(obj: Any, directory: Path, name: str) -> None:
+    """
+    Grava um objeto como {name}.pkl (estrutura) + {name}.bin (arrays alinhados)
+
+    O .pkl guarda a posição e o tamanho de cada array dentro do .bin.
+    """
+    buffers: List[pickle.PickleBuffer] = []
+    payload = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+
+    layout = []
+    position = 0
+    with open(directory / f"{name}.bin", 'wb') as f:
+        for buffer in buffers:
+            raw = buffer.raw()
+            padding = -position % BUFFER_ALIGN
+            f.write(b'\0' * padding)
+            position += padding
+            layout.append((position, raw.nbytes))
+            f.write(raw)
+            position += raw.nbytes
+
+    with open(directory / f"{name}.pkl", 'wb') as f:
+        pickle.dump({'layout': layout, 'payload': payload}, f, protocol=5)
+
+
+def load_component(directory: Path, name: str) -> Any:
+    """Lê um componente gravado por dump_component, com os arrays mapeados do .bin"""
+    with open(directory / f"{name}.pkl", 'rb') as f:
+        stored = pickle.load(f)
+
+    buffers = []
+    if stored['layout']:
+        with open(directory / f"{name}.bin", 'rb') as f:
+            view = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        buffers = [view[start:start + size] for start, size in stored['layout']]
+
+    return pickle.loads(stored['payload'], buffers=buffers)
+
+
+def load_manifest() -> Dict[str, Any]:
+    """Manifesto do registro (vazio se nada foi registrado)"""
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except (OSError, ValueError):
+        return {'current': None, 'previous': None, 'models': {}}
+
+
+def _save_manifest(manifest: Dict[str, Any]) -> None:
+    """Gravação atômica: leitores nunca veem um manifesto pela metade"""
+    tmp = MANIFEST_PATH.with_suffix('.tmp')
+    tmp.write_text(json.dumps(manifest, indent=2))
+    os.replace(tmp, MANIFEST_PATH)
+
+
+class ModelArtifact:
+    """Modelo do registro: metadados do manifesto e componentes lidos sob demanda"""
+
+    def __init__(self, model_id: str, entry: Dict[str, Any]):
+        self.model_id = model_id
+        self.entry = entry
+        self.directory = REGISTRY_DIR / model_id
+
+    def load(self, name: str) -> Any:
+        """Carrega um componente conferindo o checksum dos seus arquivos"""
+        for filename in (f"{name}.pkl", f"{name}.bin"):
+            if _sha256(self.directory / filename) != self.entry['files'][filename]:
+                raise ValueError(f"Checksum inválido: {self.model_id}/{filename}")
+        return load_component(self.directory, name)
+
+
+def register_model(components: Dict[str, Any], entry: Dict[str, Any], promote: bool = True) -> str:
+    """
+    Grava os componentes de um modelo como um novo artefato imutável
+
+    Args:
+        components: Objetos a gravar por nome (ex.: {'scaler': ..., 'model_orders': ...})
+        entry: Metadados do manifesto (versão, métricas, features, dados de treino...)
+        promote: Torna o modelo o "current" (o anterior vira "previous")
+
+    Returns:
+        Id do modelo no registro
+    """
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix='.staging-', dir=REGISTRY_DIR))
+
+    try:
+        for name, obj in components.items():
+            dump_component(obj, staging, name)
+
+        files = {path.name: _sha256(path) for path in sorted(staging.iterdir())}
+        for path in staging.iterdir():
+            path.chmod(0o444)
+        staging.chmod(0o755)
+
+        digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode()).hexdigest()
+        model_id = f"{entry.get('version', 'model')}-{datetime.now():%Y%m%d-%H%M%S}-{digest[:8]}"
+        os.replace(staging, REGISTRY_DIR / model_id)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    manifest = load_manifest()
+    manifest['models'][model_id] = {
+        **entry,
+        'id': model_id,
+        'registered_at': datetime.now().isoformat(),
+        'components': list(components),
+        'files': files,
+    }
+    _save_manifest(manifest)
+
+    if promote:
+        promote_model(model_id)
+    prune_models()
+    return model_id
+
+
+def promote_model(model_id: str) -> None:
+    """Torna o modelo o campeão ("current"); o campeão anterior vira "previous" """
+    manifest = load_manifest()
+    if model_id not in manifest['models']:
+        raise ValueError(f"Modelo não registrado: {model_id}")
+    if manifest['current'] != model_id:
+        manifest['previous'] = manifest['current']
+        manifest['current'] = model_id
+    _save_manifest(manifest)
+
+
+def rollback() -> Optional[str]:
+    """
+    Volta ao campeão anterior (troca current e previous)
+
+    Returns:
+        Id do novo campeão (None se não há modelo anterior)
+    """
+    manifest = load_manifest()
+    if not manifest['previous']:
+        return None
+    manifest['current'], manifest['previous'] = manifest['previous'], manifest['current']
+    _save_manifest(manifest)
+    return manifest['current']
+
+
+def open_model(ref: str = 'current') -> Optional[ModelArtifact]:
+    """
+    Modelo do registro sem carregar os componentes
+
+    Args:
+        ref: 'current', 'previous' ou o id do modelo
+
+    Returns:
+        ModelArtifact (None se não existe)
+    """
+    manifest = load_manifest()
+    model_id = manifest.get(ref) if ref in ('current', 'previous') else ref
+    if not model_id or model_id not in manifest['models']:
+        return None
+    return ModelArtifact(model_id, manifest['models'][model_id])
+
+
+def list_models() -> List[Dict[str, Any]]:
+    """Modelos registrados, do mais recente ao mais antigo"""
+    models = load_manifest()['models'].values()
+    return sorted(models, key=lambda entry: entry['registered_at'], reverse=True)
+
+
+def prune_models(keep: int = REGISTRY_KEEP) -> int:
+    """
+    Remove os modelos mais antigos, mantendo `keep` (e sempre current/previous)
+
+    Returns:
+        Número de modelos removidos
+    """
+    manifest = load_manifest()
+    pinned = {manifest['current'], manifest['previous']}
+    stale = [entry['id'] for entry in list_models()[keep:] if entry['id'] not in pinned]
+
+    for model_id in stale:
+        directory = REGISTRY_DIR / model_id
+        if directory.exists():
+            for path in directory.iterdir():
+                path.chmod(0o644)
+            shutil.rmtree(directory)
+        del manifest['models'][model_id]
+
+    if stale:
+        _save_manifest(manifest)
+    return len(stale)
+
+
+if __name__ == "__main__":
+    print("🗂️  Registro de modelos")
+
+    manifest = load_manifest()
+    models = list_models()
+    if not models:
+        print("   Nenhum modelo registrado")
+
+    for entry in models:
+        marker = {manifest['current']: '★ current', manifest['previous']: '↺ previous'}.get(entry['id'], '')
+        orders = entry.get('metrics', {}).get('orders', {})
+        print(f"   {entry['id']:<36} {entry.get('model', ''):<22} "
+              f"MAE {orders.get('mae', float('nan')):>6.2f}  {entry['registered_at'][:19]}  {marker}")
@@ -0,0 +1,156 @@
+"""
+Retreino diário: incremental por padrão, treino completo quando precisa
+
+O campeão do registro de modelos recebe árvores novas ajustadas aos dias
+que chegaram desde o seu treino (DemandForecaster.update): o custo acompanha
+os dias novos, não o tamanho do histórico. O treino completo volta quando:
+
+- não há campeão compatível (backend, hiperparâmetros, features, versão ou
+  horizonte mudaram);
+- dias já treinados mudaram (as vendas e o clima desses dias não batem com
+  os do treino, ex.: pedidos corrigidos ou clima coletado depois);
+- a cada FULL_REFIT_DAYS dias de dados desde o último treino completo;
+- o erro do campeão nos dias novos, que ele ainda não viu, passa do erro de
+  validação do último treino completo em mais de DEGRADATION_TOLERANCE.
+
+Com mode='incremental' só a compatibilidade conta: as três últimas regras
+são do modo 'auto'.
+
+A origem de cada modelo (modelo base, dias novos, motivo) fica em `lineage`.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+from config import FORECAST_DAYS, MODEL_BACKEND, MODEL_VERSION
+from demand_forecaster import DemandForecaster
+from feature_engineering import raw_inputs_fingerprint
+
+
+# Dias de dados entre dois treinos completos
+FULL_REFIT_DAYS = 7
+
+# Quanto o erro nos dias novos pode passar do erro de validação antes do treino completo
+DEGRADATION_TOLERANCE = 0.25
+
+REFIT_MODES = ('auto', 'incremental', 'full')
+
+
+def full_refit_reason(
+    base: DemandForecaster,
+    backend: str,
+    params: Dict[str, Dict[str, Any]]
+) -> Optional[str]:
+    """Por que o campeão não pode ser continuado com treino incremental (None = pode)"""
+    if base.backend != backend:
+        return f"backend mudou ({base.backend} → {backend})"
+    if base.params != params:
+        return "hiperparâmetros mudaram"
+    if base.model_version != MODEL_VERSION:
+        return f"versão do modelo mudou ({base.model_version} → {MODEL_VERSION})"
+    if base.horizon != FORECAST_DAYS:
+        return f"horizonte mudou ({base.horizon} → {FORECAST_DAYS} dias)"
+    if base.feature_columns != DemandForecaster(backend=backend).model_features():
+        return "features do modelo mudaram"
+    if not base.training_data or not base.lineage:
+        return "modelo sem registro dos dados de treino"
+    return None
+
+
+def trained_days_changed(base: DemandForecaster, df: pd.DataFrame) -> bool:
+    """
+    Vendas ou clima de algum dia já treinado mudaram desde o treino do campeão
+
+    Compara só as entradas brutas: as features derivadas dos dias finais
+    (ex.: alvos do dia seguinte) mudam sozinhas quando chegam dias novos.
+    """
+    trained = df[df['date'] <= pd.Timestamp(base.training_data['end_date'])]
+    return raw_inputs_fingerprint(trained) != base.training_data.get('inputs_fingerprint')
+
+
+def retrain(
+    df: pd.DataFrame,
+    backend: str = MODEL_BACKEND,
+    params: Optional[Dict[str, Dict[str, Any]]] = None,
+    mode: str = 'auto',
+    base: Optional[DemandForecaster] = None
+) -> Tuple[Optional[DemandForecaster], Dict[str, Any]]:
+    """
+    Atualiza o campeão com os dias novos ou treina do zero
+
+    Args:
+        df: Dataset de features completo (create_feature_dataset com required_columns())
+        backend: Estimador ('hist' ou 'classic')
+        params: Hiperparâmetros por alvo (ex.: vencedores do tuning)
+        mode: 'auto' (incremental com as regras de treino completo), 'incremental'
+            (continua o campeão compatível, sem checar dias alterados, agenda
+            e degradação) ou 'full'
+        base: Modelo a continuar (padrão: campeão do registro de modelos)
+
+    Returns:
+        (modelo, relatório com 'mode' = 'full' | 'incremental' | 'unchanged' e 'reason').
+        Em 'unchanged' o modelo é o próprio campeão (nada a salvar).
+    """
+    if mode not in REFIT_MODES:
+        raise ValueError(f"Modo de treino desconhecido: {mode} (opções: {', '.join(REFIT_MODES)})")
+    params = params or {}
+
+    if mode == 'full':
+        base, reason = None, "treino completo pedido"
+    else:
+        if base is None:
+            base = DemandForecaster()
+            if not base.load():
+                base = None
+        reason = "nenhum modelo salvo" if base is None else full_refit_reason(base, backend, params)
+
+    errors = None
+    if reason is None:
+        errors = base.new_data_errors(df)
+        if errors is None:
+            return base, {'mode': 'unchanged', 'reason': "sem dias novos desde o treino do campeão"}
+
+    if reason is None and mode == 'auto':
+        since_full = (df['date'].max() - pd.Timestamp(base.lineage['full_refit_end_date'])).days
+        degraded = [
+            f"{target} {errors[target]:,.2f} vs {base.metrics[target]['mae']:,.2f}"
+            for target in DemandForecaster.TARGET_COLUMNS
+            if errors[target] > base.metrics[target]['mae'] * (1 + DEGRADATION_TOLERANCE)
+        ]
+        if trained_days_changed(base, df):
+            reason = "dias já treinados mudaram"
+        elif since_full >= FULL_REFIT_DAYS:
+            reason = f"treino completo agendado ({since_full} dias desde o último)"
+        elif degraded:
+            reason = f"erro nos dias novos subiu ({'; '.join(degraded)})"
+
+    if reason is None:
+        base.update(df)
+        base.lineage['delta_mae'] = {target: errors[target] for target in DemandForecaster.TARGET_COLUMNS}
+        return base, {
+            'mode': 'incremental',
+            'reason': f"{errors['days']} dia(s) novo(s), incremento {base.lineage['increments']} "
+                      f"desde o treino completo",
+        }
+
+    forecaster = DemandForecaster(backend=backend, params=params)
+    forecaster.train(df)
+    forecaster.lineage.update({'base_model': base.model_id if base else None, 'reason': reason})
+    return forecaster, {'mode': 'full', 'reason': reason}
+
+
+if __name__ == "__main__":
+    from feature_engineering import create_feature_dataset
+
+    print("🔄 Retreino - Pirata Pizzaria")
+    print("=" * 60)
+
+    df = create_feature_dataset(columns=DemandForecaster().required_columns())
+    if df.empty:
+        print("❌ Sem dados para treinar")
+        exit(1)
+
+    forecaster, result = retrain(df)
+    print(f"\n   Modo: {result['mode']} | {result['reason']}")
+    if result['mode'] != 'unchanged':
+        forecaster.save()
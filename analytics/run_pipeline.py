@@ -7,8 +7,20 @@ Uso:
     python run_pipeline.py --all           # Executa tudo
     python run_pipeline.py --weather       # Apenas coleta clima
     python run_pipeline.py --holidays      # Apenas coleta feriados
+    python run_pipeline.py --metrics       # Apenas atualiza sales_metrics
+    python run_pipeline.py --features      # Apenas atualiza daily_features
+    python run_pipeline.py --full-rebuild  # Reconstrói sales_metrics e daily_features
     python run_pipeline.py --train         # Apenas treina modelo
+    python run_pipeline.py --train --backend classic  # Treina com outro estimador (hist ou classic)
+    python run_pipeline.py --train --refit full       # Força o treino completo (auto, incremental ou full)
     python run_pipeline.py --predict       # Apenas gera previsões
+    python run_pipeline.py --rollback      # Volta ao modelo campeão anterior
+    python run_pipeline.py --cv            # Validação cruzada temporal
+    python run_pipeline.py --cv --folds 3 --workers 2  # Folds da validação e processos em paralelo
+    python run_pipeline.py --tune          # Busca de hiperparâmetros e treino com os vencedores
+    python run_pipeline.py --tune --candidates 48     # Candidatos novos por busca
+    python run_pipeline.py --hierarchical  # Previsão por canal (balcão, mesa, delivery)
+    python run_pipeline.py --intraday      # Previsão de pedidos por turno
 """
 import argparse
 from datetime import datetime
@@ -48,25 +60,71 @@ def run_holidays_collection():
     print(f"   ✅ {count} feriados salvos")
 
 
-def run_training():
-    """Treina modelo de previsão"""
+def run_sales_metrics(full: bool = False):
+    """Atualiza o rollup de vendas (sales_metrics)"""
+    print("\n" + "=" * 60)
+    print("📊 AGREGAÇÃO DE VENDAS")
+    print("=" * 60)
+    
+    from sales_metrics import refresh_sales_metrics
+    
+    result = refresh_sales_metrics(full=full)
+    if result['mode'] == 'unchanged':
+        print("   ✅ Nenhum pedido alterado desde a última agregação")
+    else:
+        print(f"   ✅ {result['days']} dias recalculados ({result['mode']})")
+
+
+def run_feature_materialization(full: bool = False, ctx=None):
+    """Atualiza as features diárias salvas no banco (daily_features)"""
+    print("\n" + "=" * 60)
+    print("🧱 FEATURES DIÁRIAS")
+    print("=" * 60)
+    
+    from daily_features import refresh_daily_features
+    
+    result = refresh_daily_features(full=full, ctx=ctx)
+    if result['mode'] == 'unchanged':
+        print("   ✅ Nenhum dia novo ou alterado desde a última materialização")
+    else:
+        print(f"   ✅ {result['days']} dias gravados ({result['mode']}, "
+              f"{result['rows_read']} dias lidos do rollup)")
+
+
+def run_training(ctx=None, backend=None, refit='auto'):
+    """
+    Treina modelo de previsão (backend: 'hist' ou 'classic'; padrão do config)
+    
+    refit: 'auto' (incremental sobre o campeão, completo quando precisa), 'incremental' ou 'full'
+    """
     print("\n" + "=" * 60)
     print("🎯 TREINAMENTO DO MODELO")
     print("=" * 60)
     
     from feature_engineering import create_feature_dataset
     from demand_forecaster import DemandForecaster
+    from retraining import retrain
+    from tuning import load_best_params
+    from config import MODEL_BACKEND
     
-    # Criar dataset
-    df = create_feature_dataset()
+    # Hiperparâmetros vencedores da última busca (--tune), se houver
+    backend = backend or MODEL_BACKEND
+    params = load_best_params(backend)
+    if params:
+        print(f"🎛️  Usando hiperparâmetros da última busca ({backend})")
+    
+    # Criar dataset com as features que o modelo pede (fica no contexto para as previsões)
+    df = create_feature_dataset(ctx=ctx, columns=DemandForecaster(backend=backend, params=params).required_columns())
     
     if df.empty:
         print("   ❌ Sem dados para treinar")
         return None
     
-    # Treinar modelo
-    forecaster = DemandForecaster()
-    metrics = forecaster.train(df)
+    # Incremental sobre o campeão ou treino completo
+    forecaster, result = retrain(df, backend, params, refit)
+    print(f"🔄 Treino {result['mode']}: {result['reason']}")
+    if result['mode'] == 'unchanged':
+        return forecaster
     
     # Mostrar importância das features
     print("\n📊 Top 10 Features mais importantes:")
@@ -80,7 +138,80 @@ def run_training():
     return forecaster
 
 
-def run_predictions(forecaster=None):
+def run_cross_validation(ctx=None, folds=5, workers=-1, backend=None):
+    """Validação cruzada temporal com os folds em paralelo"""
+    print("\n" + "=" * 60)
+    print("🔁 VALIDAÇÃO CRUZADA")
+    print("=" * 60)
+    
+    from feature_engineering import create_feature_dataset
+    from demand_forecaster import DemandForecaster
+    from cross_validation import cross_validate, print_cv_report, save_cv_results
+    from config import MODEL_BACKEND
+    
+    backend = backend or MODEL_BACKEND
+    df = create_feature_dataset(ctx=ctx, columns=DemandForecaster(backend=backend).required_columns())
+    
+    if df.empty:
+        print("   ❌ Sem dados para validar")
+        return None
+    
+    print(f"   📊 {folds} folds com janela expansiva | backend {backend} | workers {workers}")
+    result = cross_validate(df, n_splits=folds, workers=workers, backend=backend)
+    print_cv_report(result)
+    print(f"💾 Resultado salvo em: {save_cv_results(result)}")
+    
+    return result
+
+
+def run_tuning(ctx=None, workers=-1, backend=None, candidates=24):
+    """Busca de hiperparâmetros (successive halving) e treino do modelo com os vencedores"""
+    print("\n" + "=" * 60)
+    print("🎛️  BUSCA DE HIPERPARÂMETROS")
+    print("=" * 60)
+    
+    from feature_engineering import create_feature_dataset
+    from demand_forecaster import DemandForecaster
+    from tuning import history_path, tune
+    from config import MODEL_BACKEND
+    
+    backend = backend or MODEL_BACKEND
+    df = create_feature_dataset(ctx=ctx, columns=DemandForecaster(backend=backend).required_columns())
+    
+    if df.empty:
+        print("   ❌ Sem dados para a busca")
+        return None
+    
+    result = tune(df, backend=backend, n_candidates=candidates, workers=workers)
+    print(f"   ⏱️  Busca em {result['seconds']:.1f}s | histórico: {history_path(backend)}")
+    
+    # Modelo final com os vencedores (ficam gravados junto do modelo)
+    forecaster = DemandForecaster(backend=backend, params=result['best_params'])
+    forecaster.train(df)
+    forecaster.save()
+    
+    return forecaster
+
+
+def run_rollback():
+    """Volta ao campeão anterior do registro de modelos"""
+    print("\n" + "=" * 60)
+    print("↩️  ROLLBACK DO MODELO")
+    print("=" * 60)
+    
+    from model_registry import load_manifest, rollback
+    
+    replaced = load_manifest()['current']
+    current = rollback()
+    if current is None:
+        print("   ❌ Nenhum modelo anterior no registro")
+        return None
+    
+    print(f"   ✅ Campeão: {current} (antes: {replaced})")
+    return current
+
+
+def run_predictions(forecaster=None, ctx=None):
     """Gera previsões e salva no banco"""
     print("\n" + "=" * 60)
     print("🔮 PREVISÕES")
@@ -88,7 +219,8 @@ def run_predictions(forecaster=None):
     
     from feature_engineering import create_feature_dataset
     from demand_forecaster import DemandForecaster, generate_future_features
-    from database import save_predictions, save_daily_features
+    from database import save_predictions
+    from daily_features import refresh_daily_features
     from config import FORECAST_DAYS, MODEL_VERSION
     
     # Carregar modelo se não fornecido
@@ -98,19 +230,19 @@ def run_predictions(forecaster=None):
             print("   ❌ Modelo não encontrado. Execute --train primeiro")
             return
     
-    # Criar dataset histórico
-    df = create_feature_dataset()
+    # Criar dataset histórico (reaproveitado do treino quando o contexto é o mesmo)
+    df = create_feature_dataset(ctx=ctx, columns=forecaster.required_columns())
     
     if df.empty:
         print("   ❌ Sem dados históricos")
         return
     
-    # Salvar features históricas no banco
-    features_count = save_daily_features(df)
-    print(f"💾 {features_count} dias de features salvos no banco")
+    # Salvar no banco só as features dos dias novos ou alterados
+    result = refresh_daily_features(ctx=ctx)
+    print(f"💾 {result['days']} dias de features salvos no banco ({result['mode']})")
     
     # Gerar features futuras
-    future_features = generate_future_features(df, FORECAST_DAYS)
+    future_features = generate_future_features(df, FORECAST_DAYS, ctx)
     
     # Fazer previsões
     predictions = forecaster.predict(future_features)
@@ -134,27 +266,119 @@ def run_predictions(forecaster=None):
         total_revenue += revenue
         
         # Preparar para salvar
-        predictions_to_save.append({
+        prediction = {
             'date': date_obj,
             'predictedOrders': orders,
             'predictedRevenue': revenue,
-            'modelUsed': 'GradientBoosting',
+            'modelUsed': forecaster.model_name(),
             'version': MODEL_VERSION
-        })
+        }
+        
+        # Intervalo de previsão (modelos treinados antes dos intervalos não têm)
+        interval = ''
+        if 'interval_level' in predictions:
+            prediction.update({
+                'ordersLower': predictions['orders_lower'][i],
+                'ordersUpper': predictions['orders_upper'][i],
+                'revenueLower': predictions['revenue_lower'][i],
+                'revenueUpper': predictions['revenue_upper'][i],
+                'confidence': predictions.get('interval_coverage'),
+            })
+            interval = f" ({prediction['ordersLower']:.0f}–{prediction['ordersUpper']:.0f})"
+        predictions_to_save.append(prediction)
         
         print(f"   {date_obj.strftime('%d/%m/%Y')} ({weekday}): "
-              f"{orders:>3.0f} pedidos | R$ {revenue:>8,.2f}")
+              f"{orders:>3.0f} pedidos{interval} | R$ {revenue:>8,.2f}")
     
     print("-" * 50)
     print(f"   TOTAL PREVISTO: {total_orders:.0f} pedidos | R$ {total_revenue:,.2f}")
     print(f"   MÉDIA DIÁRIA:   {total_orders/FORECAST_DAYS:.0f} pedidos | R$ {total_revenue/FORECAST_DAYS:,.2f}")
+    if 'interval_level' in predictions:
+        coverage = predictions.get('interval_coverage')
+        measured = f"cobertura medida {coverage:.0%}" if coverage is not None else "cobertura não medida"
+        print(f"   Intervalos entre parênteses (pedidos, {measured}; alvo {predictions['interval_level']:.0%})")
     
     # Salvar previsões no banco
     saved_count = save_predictions(predictions_to_save)
     print(f"\n💾 {saved_count} previsões salvas no banco de dados")
+    
+    return predictions
+
 
+def run_hierarchical_forecast(ctx=None):
+    """Treina um modelo por canal de venda e mostra as previsões reconciliadas"""
+    print("\n" + "=" * 60)
+    print("🧭 PREVISÃO POR CANAL")
+    print("=" * 60)
+    
+    from hierarchical_forecaster import SERIES, HierarchicalForecaster, build_series_datasets
+    from config import FORECAST_DAYS
+    
+    datasets = build_series_datasets(ctx)
+    if not datasets:
+        print("   ❌ Sem dados para treinar")
+        return None
+    
+    forecaster = HierarchicalForecaster()
+    forecaster.train(datasets)
+    forecaster.save()
+    
+    predictions = forecaster.predict(datasets, FORECAST_DAYS, ctx)
+    
+    print(f"\n📅 Total previsto nos próximos {FORECAST_DAYS} dias (canais somam o total):")
+    for name in SERIES:
+        print(f"   {name:<10} {predictions['orders'][name].sum():>6.0f} pedidos | "
+              f"R$ {predictions['revenue'][name].sum():>10,.2f}")
+    
+    return forecaster
 
-def run_full_pipeline():
+
+def run_intraday_forecast(predictions=None, ctx=None, full=False):
+    """Divide a previsão diária de pedidos por turno (escala da equipe)"""
+    print("\n" + "=" * 60)
+    print("🕐 PREVISÃO POR TURNO")
+    print("=" * 60)
+    
+    from hourly_demand import (
+        hourly_profile, load_hourly_sales, refresh_hourly_sales, shift_forecast, split_daily_forecast
+    )
+    
+    result = refresh_hourly_sales(full=full)
+    print(f"💾 Vendas por hora: {result['days']} dias agregados ({result['mode']}), {result['rows']} linhas")
+    
+    # Sem previsões da execução atual: usar o modelo salvo
+    if predictions is None:
+        from feature_engineering import create_feature_dataset
+        from demand_forecaster import DemandForecaster, generate_future_features
+        from config import FORECAST_DAYS
+        
+        forecaster = DemandForecaster()
+        if not forecaster.load():
+            print("   ❌ Modelo não encontrado. Execute --train primeiro")
+            return None
+        
+        df = create_feature_dataset(ctx=ctx, columns=forecaster.required_columns())
+        if df.empty:
+            print("   ❌ Sem dados históricos")
+            return None
+        
+        predictions = forecaster.predict(generate_future_features(df, FORECAST_DAYS, ctx))
+    
+    intraday = split_daily_forecast(predictions['dates'], predictions['orders'], hourly_profile(load_hourly_sales()))
+    shifts = shift_forecast(intraday)
+    peaks = intraday.loc[intraday.groupby('date')['expectedOrders'].idxmax()].set_index('date')['hour']
+    
+    weekdays_pt = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+    
+    print(f"\n   {'Dia':<16}" + "".join(f"{name:>10}" for name in shifts.columns) + f"{'Pico':>8}")
+    for day, row in shifts.iterrows():
+        print(f"   {day.strftime('%d/%m/%Y')} ({weekdays_pt[day.weekday()]})"
+              + "".join(f"{value:>10.0f}" for value in row) + f"{peaks[day]:>6d}h")
+    
+    return intraday
+
+
+def run_full_pipeline(ctx=None, backend=None):
     """Executa pipeline completo"""
     print("🏴‍☠️ PIRATA PIZZARIA - ANALYTICS PIPELINE")
     print("=" * 60)
@@ -166,12 +390,19 @@ def run_full_pipeline():
     # 2. Coletar feriados
     run_holidays_collection()
     
-    # 3. Treinar modelo
-    forecaster = run_training()
+    # 3. Atualizar rollup de vendas
+    run_sales_metrics()
+    
+    # 4. Treinar modelo
+    forecaster = run_training(ctx, backend)
     
-    # 4. Gerar previsões
+    # 5. Gerar previsões
     if forecaster:
-        run_predictions(forecaster)
+        predictions = run_predictions(forecaster, ctx)
+        
+        # 6. Dividir por turno
+        if predictions:
+            run_intraday_forecast(predictions, ctx)
     
     print("\n" + "=" * 60)
     print("✅ PIPELINE CONCLUÍDO")
@@ -183,27 +414,69 @@ def main():
     parser.add_argument('--all', action='store_true', help='Executa pipeline completo')
     parser.add_argument('--weather', action='store_true', help='Coleta dados meteorológicos')
     parser.add_argument('--holidays', action='store_true', help='Coleta feriados')
+    parser.add_argument('--metrics', action='store_true', help='Atualiza o rollup sales_metrics')
+    parser.add_argument('--features', action='store_true', help='Atualiza daily_features (só dias novos ou alterados)')
+    parser.add_argument('--full-rebuild', action='store_true', help='Reconstrói sales_metrics e daily_features do zero')
     parser.add_argument('--train', action='store_true', help='Treina modelo de previsão')
     parser.add_argument('--predict', action='store_true', help='Gera previsões')
+    parser.add_argument('--rollback', action='store_true', help='Volta ao modelo campeão anterior do registro')
+    parser.add_argument('--backend', choices=['hist', 'classic'], help='Estimador do treino (padrão: ANALYTICS_MODEL_BACKEND)')
+    parser.add_argument('--refit', choices=['auto', 'incremental', 'full'], default='auto',
+                        help='Treino incremental sobre o campeão ou completo (padrão: auto)')
+    parser.add_argument('--cv', action='store_true', help='Validação cruzada temporal (folds em paralelo)')
+    parser.add_argument('--folds', type=int, default=5, help='Folds da validação cruzada')
+    parser.add_argument('--workers', type=int, default=-1, help='Processos da validação cruzada e da busca (-1 = todos os núcleos)')
+    parser.add_argument('--tune', action='store_true', help='Busca de hiperparâmetros e treino com os vencedores')
+    parser.add_argument('--candidates', type=int, default=24, help='Candidatos novos por busca (--tune)')
+    parser.add_argument('--hierarchical', action='store_true', help='Previsão por canal com reconciliação')
+    parser.add_argument('--intraday', action='store_true', help='Previsão de pedidos por turno')
     
     args = parser.parse_args()
     
-    # Se nenhum argumento, mostrar help
-    if not any(vars(args).values()):
+    # Se nenhuma etapa foi pedida, mostrar help (opções como --folds têm valor padrão)
+    if not any(value is True for value in vars(args).values()):
         parser.print_help()
         return
     
-    if args.all:
-        run_full_pipeline()
-    else:
-        if args.weather:
-            run_weather_collection()
-        if args.holidays:
-            run_holidays_collection()
-        if args.train:
-            run_training()
-        if args.predict:
-            run_predictions()
+    from data_context import DataContext
+    from database import dispose_engine
+    from snapshot_cache import print_cache_report
+    
+    # Um contexto por execução: cada fonte é carregada uma única vez
+    ctx = DataContext()
+    
+    try:
+        if args.all:
+            run_full_pipeline(ctx, args.backend)
+        else:
+            if args.weather:
+                run_weather_collection()
+            if args.holidays:
+                run_holidays_collection()
+            if args.metrics or args.full_rebuild:
+                run_sales_metrics(full=args.full_rebuild)
+            if args.features or args.full_rebuild:
+                run_feature_materialization(full=args.full_rebuild, ctx=ctx)
+            if args.cv:
+                run_cross_validation(ctx, args.folds, args.workers, args.backend)
+            if args.tune:
+                run_tuning(ctx, args.workers, args.backend, args.candidates)
+            if args.train:
+                run_training(ctx, args.backend, args.refit)
+            if args.rollback:
+                run_rollback()
+            predictions = None
+            if args.predict:
+                predictions = run_predictions(ctx=ctx)
+            if args.hierarchical:
+                run_hierarchical_forecast(ctx)
+            if args.intraday:
+                run_intraday_forecast(predictions, ctx, full=args.full_rebuild)
+    finally:
+        ctx.print_timings()
+        print_cache_report()
+        # Fechar as conexões do pool compartilhado
+        dispose_engine()
 
 
 if __name__ == "__main__":
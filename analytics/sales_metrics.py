@@ -0,0 +1,331 @@
+"""
+Agregação incremental de vendas na tabela sales_metrics
+
+Em vez de refazer o GROUP BY de todos os pedidos a cada execução, guarda uma
+marca d'água (maior syncedAt/updatedAt/deletedAt já processado) e recalcula
+apenas os dias que tiveram pedidos alterados desde então.
+"""
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+from config import DATA_DIR
+from database import (
+    bulk_upsert, daily_aggregates, get_connection, load_state, max_datetime_exprs,
+    opened_at_days, run_write, sales_day_expr, save_state, to_epoch_ms
+)
+
+
+STATE_PATH = DATA_DIR / "sales_metrics_state.json"
+
+# Colunas que mudam quando um pedido é criado, sincronizado, alterado ou excluído
+CHANGE_COLUMNS = ('updatedAt', 'syncedAt', 'deletedAt')
+
+# Colunas do resumo diário -> colunas de sales_metrics
+METRIC_COLUMNS = {
+    'orders': 'totalOrders',
+    'revenue': 'totalAmount',
+    'avg_ticket': 'avgOrderValue',
+    'total_items': 'totalItems',
+    'counter_orders': 'counterOrders',
+    'table_orders': 'tableOrders',
+    'delivery_orders': 'deliveryOrders',
+    'avg_duration': 'avgDuration',
+    'paid_orders': 'paidOrders',
+    'pending_orders': 'pendingOrders',
+}
+
+
+def get_change_watermark(conn) -> Dict:
+    """
+    Retorna a maior data de alteração dos pedidos e o total de linhas
+    """
+    maxima = [expr for col in CHANGE_COLUMNS for expr in max_datetime_exprs(col)]
+    row = conn.execute(text(f"SELECT {', '.join(maxima)}, COUNT(*) FROM sales_orders")).fetchone()
+
+    stamps = [to_epoch_ms(v) for v in row[:-1]]
+    stamps = [s for s in stamps if s is not None]
+
+    return {
+        'watermark': max(stamps) if stamps else 0,
+        'orders': int(row[-1]),
+    }
+
+
+def find_changed_days(conn, since_ms: int) -> List[str]:
+    """
+    Dias (YYYY-MM-DD) com pedidos criados, alterados ou excluídos após a marca d'água
+    """
+    since = datetime.fromtimestamp(since_ms / 1000, tz=timezone.utc)
+
+    if conn.dialect.name == 'mysql':
+        # DATETIME em UTC: comparação direta com a marca d'água
+        changed = " OR ".join(f"{col} > :since" for col in CHANGE_COLUMNS)
+        params = {'since': since.strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]}
+    else:
+        # No SQLite todo número é menor que qualquer texto: "< ''" isola os valores
+        # em epoch ms e a comparação com a data ISO cobre os valores em texto
+        # (recalcula o dia inteiro da marca d'água, o que é seguro)
+        changed = " OR ".join(
+            f"(({col} > :since_ms AND {col} < '') OR {col} >= :since_iso)"
+            for col in CHANGE_COLUMNS
+        )
+        params = {'since_ms': since_ms, 'since_iso': since.strftime('%Y-%m-%d')}
+
+    query = f"""
+        SELECT DISTINCT {sales_day_expr()} as date
+        FROM sales_orders
+        WHERE {changed}
+    """
+    rows = conn.execute(text(query), params)
+    # Texto no SQLite, date no MySQL
+    return sorted(str(r[0]) for r in rows if r[0] is not None)
+
+
+def aggregate_days(conn, days: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Agrega os pedidos por dia (todos os dias ou apenas os informados)
+    """
+    query = f"""
+        SELECT {sales_day_expr()} as date, {daily_aggregates()}
+        FROM sales_orders
+        WHERE deletedAt IS NULL
+    """
+    params = {}
+
+    if days is not None:
+        # Intervalos sobre openedAt "cru" usam o índice em vez de varrer a tabela
+        predicate, params = opened_at_days(days)
+        query += f" AND {predicate}"
+
+    query += " GROUP BY 1 ORDER BY 1"
+
+    df = pd.read_sql_query(text(query), conn, params=params)
+    # Texto no SQLite, date no MySQL
+    df['date'] = df['date'].astype(str)
+
+    return df
+
+
+def _period_start_expr(conn, period_type: str) -> str:
+    """Primeiro dia da semana (segunda) ou do mês da coluna date, no dialeto do banco"""
+    if conn.dialect.name == 'mysql':
+        if period_type == 'WEEKLY':
+            return "DATE_SUB(DATE(date), INTERVAL WEEKDAY(date) DAY)"
+        return "DATE_SUB(DATE(date), INTERVAL DAYOFMONTH(date) - 1 DAY)"
+
+    if period_type == 'WEEKLY':
+        return "date(date, '-' || ((CAST(strftime('%w', date) AS INTEGER) + 6) % 7) || ' days')"
+    return "date(date, 'start of month')"
+
+
+def _rollup_periods(conn, period_type: str, start_date: str, end_date: str) -> pd.DataFrame:
+    """
+    Consolida as linhas diárias em semanas (início na segunda) ou meses no próprio banco
+
+    Só as linhas já agregadas por período trafegam pela rede.
+    """
+    query = f"""
+        SELECT
+            {_period_start_expr(conn, period_type)} as date,
+            SUM(totalOrders) as orders,
+            SUM(totalAmount) as revenue,
+            SUM(totalAmount) * 1.0 / SUM(totalOrders) as avg_ticket,
+            SUM(totalItems) as total_items,
+            SUM(counterOrders) as counter_orders,
+            SUM(tableOrders) as table_orders,
+            SUM(deliveryOrders) as delivery_orders,
+            SUM(paidOrders) as paid_orders,
+            SUM(pendingOrders) as pending_orders,
+            -- Duração média ponderada pelo número de pedidos de cada dia
+            SUM(COALESCE(avgDuration, 0) * totalOrders) * 1.0 / SUM(totalOrders) as avg_duration
+        FROM sales_metrics
+        WHERE periodType = 'DAILY' AND date >= :start_date AND date <= :end_date
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+    params = {'start_date': start_date, 'end_date': end_date}
+    df = pd.read_sql_query(text(query), conn, params=params)
+    df['date'] = df['date'].astype(str)
+
+    return df
+
+
+def _save_metrics(conn, df: pd.DataFrame, period_type: str) -> int:
+    """Grava as métricas de um tipo de período em sales_metrics"""
+    if df.empty:
+        return 0
+
+    prefix = period_type.lower()
+    columns = {
+        'id': [f"{prefix}_{d}" for d in df['date']],
+        'date': df['date'].tolist(),
+        'periodType': [period_type] * len(df),
+    }
+    for source, target in METRIC_COLUMNS.items():
+        values = pd.to_numeric(df[source], errors='coerce').fillna(0)
+        if target in ('totalAmount', 'avgOrderValue'):
+            columns[target] = values.round(2).astype(float).tolist()
+        else:
+            columns[target] = values.round().astype(int).tolist()
+
+    return bulk_upsert(
+        'sales_metrics', columns, conflict_keys=['date', 'periodType'], labels=df['date'].tolist(), conn=conn
+    )
+
+
+def _delete_metrics(conn, period_type: str, dates: List[str]) -> None:
+    """Remove períodos que ficaram sem pedidos (ex.: todos excluídos)"""
+    if not dates:
+        return
+    prefix = period_type.lower()
+    stmt = text("DELETE FROM sales_metrics WHERE id IN :ids").bindparams(
+        bindparam('ids', expanding=True)
+    )
+    conn.execute(stmt, {'ids': [f"{prefix}_{d}" for d in dates]})
+
+
+def _period_starts(days: pd.Series, period_type: str) -> pd.Series:
+    """Primeiro dia da semana (segunda) ou do mês de cada data"""
+    if period_type == 'WEEKLY':
+        return days - pd.to_timedelta(days.dt.dayofweek, unit='D')
+    return days.dt.to_period('M').dt.start_time
+
+
+def _refresh_periods(conn, period_type: str, touched_days: pd.Series) -> None:
+    """
+    Recalcula as semanas/meses que contêm os dias alterados a partir do rollup diário
+    """
+    starts = _period_starts(touched_days, period_type)
+    if period_type == 'WEEKLY':
+        end = starts.max() + pd.Timedelta(days=6)
+    else:
+        end = starts.max() + pd.offsets.MonthEnd(0)
+
+    # O intervalo começa e termina em limites de período: todos ficam completos
+    periods = _rollup_periods(conn, period_type, starts.min().strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+
+    expected = set(starts.dt.strftime('%Y-%m-%d'))
+    _delete_metrics(conn, period_type, sorted(expected - set(periods['date'])))
+    _save_metrics(conn, periods, period_type)
+
+
+def refresh_sales_metrics(full: bool = False) -> Dict:
+    """
+    Atualiza sales_metrics recalculando apenas os dias alterados
+
+    Args:
+        full: Força a reconstrução completa (ignora a marca d'água)
+
+    Returns:
+        Dicionário com o modo usado e quantos dias foram recalculados
+    """
+    state = load_state(STATE_PATH)
+
+    # Leitura e agregação fora da transação de escrita (conexão somente leitura)
+    with get_connection(readonly=True) as conn:
+        current = get_change_watermark(conn)
+        has_rollup = conn.execute(text(
+            "SELECT COUNT(*) FROM sales_metrics WHERE periodType = 'DAILY'"
+        )).scalar() > 0
+
+        # Sem estado, sem rollup ou com pedidos apagados fisicamente: refazer tudo
+        rebuild = (
+            full
+            or not state
+            or not has_rollup
+            or current['orders'] < state.get('orders', 0)
+        )
+
+        if rebuild:
+            days = None
+        elif current['watermark'] <= state.get('watermark', 0):
+            return {'mode': 'unchanged', 'days': 0}
+        else:
+            days = find_changed_days(conn, state['watermark'])
+
+        daily = aggregate_days(conn, days)
+
+    touched = pd.to_datetime(pd.Series(daily['date'] if rebuild else days, dtype=object))
+
+    def write(conn):
+        if rebuild:
+            conn.execute(text("DELETE FROM sales_metrics"))
+        else:
+            _delete_metrics(conn, 'DAILY', sorted(set(days) - set(daily['date'])))
+
+        _save_metrics(conn, daily, 'DAILY')
+
+        # Semanas e meses afetados são refeitos a partir do rollup diário
+        if not touched.empty:
+            for period_type in ('WEEKLY', 'MONTHLY'):
+                _refresh_periods(conn, period_type, touched)
+
+    # Só a gravação segura o lock (repetida se o banco estiver ocupado)
+    run_write(write)
+    save_state(STATE_PATH, current)
+
+    return {'mode': 'full' if rebuild else 'incremental', 'days': len(touched)}
+
+
+def _read_daily_rollup(conn, start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+    """Lê as linhas DAILY de sales_metrics com os nomes do resumo diário"""
+    select = ", ".join(f"{target} as {source}" for source, target in METRIC_COLUMNS.items())
+    query = f"""
+        SELECT date, {select}
+        FROM sales_metrics
+        WHERE periodType = 'DAILY'
+    """
+    params = {}
+
+    if start_date:
+        query += " AND date >= :start_date"
+        params['start_date'] = start_date
+    if end_date:
+        # date vem com hora (texto "YYYY-MM-DD 00:00:00" no SQLite): fim exclusivo no dia seguinte
+        query += " AND date < :end_date"
+        params['end_date'] = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+    query += " ORDER BY date"
+
+    df = pd.read_sql_query(text(query), conn, params=params)
+    # Texto no SQLite, DATETIME no MySQL
+    df['date'] = pd.to_datetime(df['date']).dt.normalize()
+
+    return df
+
+
+def get_daily_sales_rollup(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    refresh: bool = True
+) -> pd.DataFrame:
+    """
+    Resumo diário de vendas lido do rollup (mesmas colunas de get_daily_sales_summary)
+
+    Custa O(dias) em vez de O(pedidos).
+
+    Args:
+        start_date: Data inicial (YYYY-MM-DD)
+        end_date: Data final (YYYY-MM-DD)
+        refresh: Atualiza o rollup incrementalmente antes de ler
+    """
+    if refresh:
+        refresh_sales_metrics()
+
+    with get_connection(readonly=True) as conn:
+        return _read_daily_rollup(conn, start_date, end_date)
+
+
+if __name__ == "__main__":
+    print("📊 Atualizando sales_metrics...")
+
+    result = refresh_sales_metrics()
+    print(f"   ✅ Modo: {result['mode']} | {result['days']} dias recalculados")
+
+    daily = get_daily_sales_rollup(refresh=False)
+    print(f"\n📈 Rollup diário: {len(daily)} dias")
+    print(daily.tail())
@@ -0,0 +1,164 @@
+"""
+Cache local em formato colunar (Feather) das fontes do feature engineering
+
+Cada fonte (vendas diárias, vendas por canal, clima e feriados) é salva em data/snapshots/
+junto com uma impressão digital barata da tabela de origem (total de linhas
++ maior updatedAt). Se a tabela não mudou, o arquivo é lido via memory-map
+e o banco não é consultado; só as fontes alteradas são buscadas de novo.
+"""
+import json
+import time
+from typing import Callable, Dict
+
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from sqlalchemy import text
+
+from config import DATA_DIR
+from database import (
+    get_connection, get_daily_channel_sales, get_engine, get_holidays, get_weather_data, max_datetime_exprs
+)
+from sales_metrics import CHANGE_COLUMNS, get_daily_sales_rollup
+
+
+SNAPSHOT_DIR = DATA_DIR / "snapshots"
+MANIFEST_PATH = SNAPSHOT_DIR / "manifest.json"
+
+# Fonte -> (tabela usada na impressão digital, função que busca no banco)
+SOURCES: Dict[str, tuple] = {
+    'sales': ('sales_orders', get_daily_sales_rollup),
+    'channels': ('sales_orders', get_daily_channel_sales),
+    'weather': ('weather_data', get_weather_data),
+    'holidays': ('calendar_events', get_holidays),
+}
+
+# Estatísticas da execução atual
+_stats = {'hits': 0, 'misses': 0, 'sources': {}}
+
+
+def table_fingerprint(table: str) -> str:
+    """
+    Impressão digital barata de uma tabela: total de linhas e maior updatedAt
+
+    Em sales_orders também entram syncedAt e deletedAt (sincronização e exclusão).
+    """
+    columns = CHANGE_COLUMNS if table == 'sales_orders' else ('updatedAt',)
+    maxima = [expr for col in columns for expr in max_datetime_exprs(col)]
+
+    try:
+        with get_connection(readonly=True) as conn:
+            row = conn.execute(text(f"SELECT COUNT(*), {', '.join(maxima)} FROM {table}")).fetchone()
+    except Exception:
+        return ""
+
+    return ":".join(str(v) for v in row)
+
+
+def _load_manifest() -> Dict:
+    if not MANIFEST_PATH.exists():
+        return {}
+    try:
+        return json.loads(MANIFEST_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(manifest: Dict) -> None:
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2))
+
+
+def _snapshot_path(name: str):
+    return SNAPSHOT_DIR / f"{name}.feather"
+
+
+def load_source(name: str, loader: Callable[[], pd.DataFrame] = None) -> pd.DataFrame:
+    """
+    Carrega uma fonte do cache local ou do banco (se a tabela mudou)
+
+    Args:
+        name: 'sales', 'channels', 'weather' ou 'holidays'
+        loader: Função alternativa de leitura no banco
+
+    Returns:
+        DataFrame da fonte
+    """
+    table, default_loader = SOURCES[name]
+    loader = loader or default_loader
+
+    start = time.perf_counter()
+    SNAPSHOT_DIR.mkdir(exist_ok=True)
+
+    db_key = get_engine().url.render_as_string(hide_password=True)
+    fingerprint = table_fingerprint(table)
+    entry = _load_manifest().get(name, {})
+    path = _snapshot_path(name)
+
+    hit = (
+        fingerprint != ""
+        and entry.get('fingerprint') == fingerprint
+        and entry.get('database') == db_key
+        and path.exists()
+    )
+
+    df = None
+    if hit:
+        try:
+            # Feather sem compressão: colunas numéricas mapeadas direto do disco
+            df = feather.read_table(path, memory_map=True).to_pandas()
+        except (OSError, pa.ArrowInvalid):
+            hit = False
+
+    if not hit:
+        df = loader()
+        if fingerprint:
+            feather.write_feather(df.reset_index(drop=True), path, compression='uncompressed')
+            manifest = _load_manifest()
+            manifest[name] = {
+                'fingerprint': fingerprint,
+                'database': db_key,
+                'rows': len(df),
+                'saved_at': pd.Timestamp.now().isoformat(),
+            }
+            _save_manifest(manifest)
+
+    elapsed = time.perf_counter() - start
+    _stats['hits' if hit else 'misses'] += 1
+    _stats['sources'][name] = {'hit': hit, 'seconds': elapsed, 'rows': len(df)}
+
+    return df
+
+
+def get_cache_stats() -> Dict:
+    """Acertos, falhas e tempos de carga do cache nesta execução"""
+    return _stats
+
+
+def print_cache_report() -> None:
+    """Mostra acertos/falhas e tempos de carga de cada fonte"""
+    if not _stats['sources']:
+        return
+
+    print(f"\n🗃️  Cache de snapshots: {_stats['hits']} acerto(s), {_stats['misses']} falha(s)")
+    for name, info in _stats['sources'].items():
+        status = "cache" if info['hit'] else "banco"
+        print(f"   {name:<10} {status:<6} {info['rows']:>6} linhas em {info['seconds'] * 1000:.0f} ms")
+
+
+def clear_snapshots() -> None:
+    """Remove todos os snapshots (força a releitura do banco)"""
+    if SNAPSHOT_DIR.exists():
+        for path in SNAPSHOT_DIR.glob("*.feather"):
+            path.unlink()
+        if MANIFEST_PATH.exists():
+            MANIFEST_PATH.unlink()
+
+
+if __name__ == "__main__":
+    print("🗃️  Testando cache de snapshots...")
+
+    for _ in range(2):
+        for source in SOURCES:
+            load_source(source)
+
+    print_cache_report()
@@ -0,0 +1,227 @@
+"""
+Busca de hiperparâmetros do DemandForecaster com successive halving
+
+Cada alvo (pedidos, receita) tem sua busca: os candidatos são avaliados em
+folds temporais (janela expansiva, como na validação cruzada) primeiro com
+poucas iterações de boosting; só o terço melhor segue para a rodada seguinte,
+com o triplo de iterações. Os candidatos rodam em paralelo (joblib).
+
+O histórico das buscas fica em models/tuning_history_{backend}.json: os
+melhores candidatos das buscas anteriores entram de novo na próxima
+(warm start), e o vencedor mais recente é usado por padrão no treino.
+"""
+import json
+import time
+import warnings
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from scipy.stats import loguniform
+from sklearn.exceptions import ConvergenceWarning
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import HalvingGridSearchCV, ParameterSampler
+
+from config import MODEL_BACKEND, MODELS_DIR
+from cross_validation import TARGETS, expanding_splits
+from demand_forecaster import ESTIMATOR_BACKENDS, ITERATION_PARAMS, DemandForecaster
+
+
+# Espaço de busca de cada backend (a quantidade de iterações é o orçamento do halving)
+SEARCH_SPACES: Dict[str, Dict[str, Any]] = {
+    'hist': {
+        'learning_rate': loguniform(0.02, 0.3),
+        'max_depth': [3, 4, 5, 6, 8, None],
+        'min_samples_leaf': [5, 10, 20, 40],
+        'max_leaf_nodes': [15, 31, 63],
+        'l2_regularization': loguniform(1e-3, 10),
+    },
+    'classic': {
+        'learning_rate': loguniform(0.02, 0.3),
+        'max_depth': [2, 3, 4, 5, 6],
+        'min_samples_leaf': [1, 5, 10, 20],
+        'subsample': [0.6, 0.8, 1.0],
+    },
+}
+
+# Parâmetro que recebe o orçamento de cada rodada (número de árvores)
+BUDGET_PARAMS = ITERATION_PARAMS
+
+# Iterações da primeira e da última rodada; a cada rodada sobra 1/HALVING_FACTOR dos candidatos
+MIN_BUDGET = 30
+MAX_BUDGET = 300
+HALVING_FACTOR = 3
+
+# Candidatos vindos das buscas anteriores e buscas mantidas no histórico
+WARM_START_CANDIDATES = 5
+HISTORY_KEEP = 10
+
+
+def history_path(backend: str) -> Path:
+    return MODELS_DIR / f"tuning_history_{backend}.json"
+
+
+def load_history(backend: str) -> List[Dict]:
+    """Buscas anteriores do backend, da mais antiga à mais recente"""
+    path = history_path(backend)
+    if not path.exists():
+        return []
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return []
+
+
+def _save_history(backend: str, history: List[Dict]) -> None:
+    history_path(backend).write_text(json.dumps(history[-HISTORY_KEEP:], indent=2))
+
+
+def load_best_params(backend: str = MODEL_BACKEND) -> Dict[str, Dict[str, Any]]:
+    """Hiperparâmetros vencedores da busca mais recente (vazio se nunca houve busca)"""
+    history = load_history(backend)
+    return history[-1]['best_params'] if history else {}
+
+
+def _plain(value: Any) -> Any:
+    """Valor pronto para JSON (tipos do numpy viram tipos do Python)"""
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def warm_start_candidates(history: List[Dict], target: str, count: int = WARM_START_CANDIDATES) -> List[Dict]:
+    """Melhores configurações das buscas anteriores (as que chegaram à última rodada)"""
+    finalists = [c for search in history for c in search['candidates'].get(target, []) if c['finalist']]
+    finalists.sort(key=lambda c: c['mae'])
+
+    chosen, seen = [], set()
+    for candidate in finalists:
+        key = json.dumps(candidate['params'], sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            chosen.append(candidate['params'])
+        if len(chosen) == count:
+            break
+    return chosen
+
+
+def _search_target(
+    X: np.ndarray,
+    y: np.ndarray,
+    splits: list,
+    candidates: List[Dict],
+    backend: str,
+    workers: int
+) -> HalvingGridSearchCV:
+    """Successive halving sobre uma lista fechada de candidatos"""
+    search = HalvingGridSearchCV(
+        ESTIMATOR_BACKENDS[backend](),
+        [{name: [value] for name, value in params.items()} for params in candidates],
+        factor=HALVING_FACTOR,
+        resource=BUDGET_PARAMS[backend],
+        min_resources=MIN_BUDGET,
+        max_resources=MAX_BUDGET,
+        cv=splits,
+        scoring='neg_mean_absolute_error',
+        refit=False,
+        n_jobs=workers,
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', ConvergenceWarning)
+        search.fit(X, y)
+    return search
+
+
+def tune(
+    df: pd.DataFrame,
+    backend: str = MODEL_BACKEND,
+    n_candidates: int = 24,
+    n_splits: int = 4,
+    workers: int = -1
+) -> Dict[str, Any]:
+    """
+    Busca os hiperparâmetros de cada alvo e grava a busca no histórico
+
+    Args:
+        df: Dataset de features (create_feature_dataset com required_columns())
+        backend: Estimador ('hist' ou 'classic')
+        n_candidates: Candidatos novos sorteados (além dos do warm start)
+        n_splits: Folds temporais usados em cada avaliação
+        workers: Processos em paralelo (-1 = todos os núcleos)
+
+    Returns:
+        Registro da busca: 'best_params' e 'best_mae' por alvo, candidatos avaliados e tempo
+    """
+    start = time.perf_counter()
+    history = load_history(backend)
+
+    forecaster = DemandForecaster(backend=backend)
+    stacked, X = forecaster.prepare_data(df)
+    splits = expanding_splits(stacked['date'].to_numpy(), n_splits)
+    X = X.to_numpy(dtype='float64')
+
+    # Sorteio diferente a cada busca, reproduzível pelo tamanho do histórico
+    sampled = [
+        {name: _plain(value) for name, value in params.items()}
+        for params in ParameterSampler(SEARCH_SPACES[backend], n_candidates, random_state=len(history))
+    ]
+
+    record: Dict[str, Any] = {
+        'searched_at': pd.Timestamp.now().isoformat(),
+        'backend': backend,
+        'dataset': df.attrs.get('feature_snapshot'),
+        'best_params': {},
+        'best_mae': {},
+        'candidates': {},
+    }
+
+    for target in TARGETS:
+        warm = warm_start_candidates(history, target)
+        unique = {json.dumps(p, sort_keys=True): p for p in warm + sampled}
+        candidates = list(unique.values())
+
+        print(f"   🎛️  {target}: {len(candidates)} candidatos ({len(warm)} do histórico) | "
+              f"{BUDGET_PARAMS[backend]} {MIN_BUDGET} → {MAX_BUDGET}")
+        search = _search_target(X, stacked[target].to_numpy(dtype='float64'), splits, candidates, backend, workers)
+
+        results = search.cv_results_
+        last_round = results['iter'].max()
+        budget = BUDGET_PARAMS[backend]
+        record['candidates'][target] = [
+            {
+                'params': {k: _plain(v) for k, v in params.items() if k != budget},
+                'round': int(rnd),
+                'budget': int(resources),
+                'mae': float(-score),
+                'finalist': bool(rnd == last_round),
+            }
+            for params, rnd, resources, score in zip(
+                results['params'], results['iter'], results['n_resources'], results['mean_test_score']
+            )
+        ]
+        record['best_params'][target] = {k: _plain(v) for k, v in search.best_params_.items()}
+        record['best_mae'][target] = float(-search.best_score_)
+
+        rounds = ", ".join(str(n) for n in search.n_candidates_)
+        print(f"      ✅ MAE {record['best_mae'][target]:,.2f} | candidatos por rodada: {rounds}")
+
+    record['seconds'] = time.perf_counter() - start
+    _save_history(backend, history + [record])
+
+    return record
+
+
+if __name__ == "__main__":
+    from feature_engineering import create_feature_dataset
+
+    print("🎛️  Busca de hiperparâmetros - Pirata Pizzaria")
+    print("=" * 60)
+
+    df = create_feature_dataset(columns=DemandForecaster().required_columns())
+    if df.empty:
+        print("❌ Sem dados para a busca")
+        exit(1)
+
+    result = tune(df)
+    print(f"\n⏱️  Busca em {result['seconds']:.1f}s")
+    for target, params in result['best_params'].items():
+        print(f"   {target}: {params}")
@@ -98,33 +98,43 @@ export async function GET(request: Request) {
       };
     }
 
-    // Previsões do modelo (se existirem)
+    // Previsões: serviço de previsão (se configurado) ou as salvas pelo pipeline
     if (type === "all" || type === "predictions") {
-      const predictions = await prisma.prediction.findMany({
-        where: {
-          date: {
-            gte: today,
-          },
-        },
-        orderBy: {
-          date: "asc",
-        },
-        take: 14,
-      });
+      const servicePredictions = await getServicePredictions();
 
-      // Se não há previsões do modelo, gerar previsões simples baseadas em histórico
-      if (predictions.length === 0) {
-        response.predictions = await generateSimplePredictions();
+      if (servicePredictions) {
+        response.predictions = servicePredictions;
       } else {
-        response.predictions = {
-          source: "ml_model",
-          data: predictions.map((p) => ({
-            date: p.date,
-            predictedOrders: p.predictedOrders,
-            predictedRevenue: Number(p.predictedRevenue),
-            confidence: p.confidence,
-          })),
-        };
+        const predictions = await prisma.prediction.findMany({
+          where: {
+            date: {
+              gte: today,
+            },
+          },
+          orderBy: {
+            date: "asc",
+          },
+          take: 14,
+        });
+
+        // Se não há previsões do modelo, gerar previsões simples baseadas em histórico
+        if (predictions.length === 0) {
+          response.predictions = await generateSimplePredictions();
+        } else {
+          response.predictions = {
+            source: "ml_model",
+            data: predictions.map((p) => ({
+              date: p.date,
+              predictedOrders: p.predictedOrders,
+              predictedRevenue: Number(p.predictedRevenue),
+              ordersLower: p.ordersLower,
+              ordersUpper: p.ordersUpper,
+              revenueLower: p.revenueLower,
+              revenueUpper: p.revenueUpper,
+              confidence: p.confidence,
+            })),
+          };
+        }
       }
     }
 
@@ -198,6 +208,49 @@ async function getWeatherForecast() {
   }
 }
 
+// Previsões do serviço local (analytics/forecast_service.py); null se não configurado ou fora do ar
+async function getServicePredictions() {
+  const serviceUrl = process.env.ANALYTICS_SERVICE_URL;
+  if (!serviceUrl) return null;
+
+  try {
+    const response = await fetch(`${serviceUrl}/forecast?days=14`, {
+      cache: "no-store",
+      signal: AbortSignal.timeout(2000),
+    });
+    if (!response.ok) return null;
+
+    const forecast = await response.json();
+    return {
+      source: "ml_service",
+      model: forecast.model,
+      data: forecast.predictions.map(
+        (p: {
+          date: string;
+          predictedOrders: number;
+          predictedRevenue: number;
+          ordersLower: number | null;
+          ordersUpper: number | null;
+          revenueLower: number | null;
+          revenueUpper: number | null;
+        }) => ({
+          date: p.date,
+          predictedOrders: Math.round(p.predictedOrders),
+          predictedRevenue: p.predictedRevenue,
+          ordersLower: p.ordersLower,
+          ordersUpper: p.ordersUpper,
+          revenueLower: p.revenueLower,
+          revenueUpper: p.revenueUpper,
+          confidence: forecast.confidence ?? null,
+        })
+      ),
+    };
+  } catch (error) {
+    console.error("Serviço de previsão indisponível:", error);
+    return null;
+  }
+}
+
 // Gerar previsões simples baseadas em histórico
 async function generateSimplePredictions() {
   const sixtyDaysAgo = new Date();